@@ -12,7 +12,7 @@ from migrations import run_migrations
 from bootstrap import ensure_database_indexes
 from extensions import csrf, db, limiter
 from logging_config import setup_logging
-from routes import admin_bp, auth_bp, cardio_bp, gym_bp, main_bp, nutrition_bp
+from routes import admin_bp, api_bp, auth_bp, cardio_bp, gym_bp, main_bp, nutrition_bp
 from routes.health import health_bp
 from security import init_security
 from utils import execute_query
@@ -113,6 +113,7 @@ def create_app() -> Flask:
     app.register_blueprint(cardio_bp)
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(health_bp)
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
 
     return app
 
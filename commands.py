@@ -5,12 +5,17 @@ import sys
 
 import bcrypt
 import click
+from flask import current_app
 from flask.cli import with_appcontext
 from sqlalchemy.exc import IntegrityError
 
 from bootstrap import ensure_database_indexes
 from extensions import db
 from migrations import run_migrations
+from services import food_dump_service, food_import_service
+from services.nutrition_service import reconcile_daily_totals
+from services.suggestion_service import benchmark_suggestions
+from services.sync_service import compact_change_log
 from utils import execute_query
 
 @click.command(name='create-admin')
@@ -64,6 +69,148 @@ def db_prepare_command():
     click.echo('Database pronto con schema e indici aggiornati.')
 
 
+@click.command(name='sync-compact')
+@click.option(
+    '--retention-days',
+    type=int,
+    default=None,
+    help='Giorni di conservazione delle eliminazioni (default: SYNC_TOMBSTONE_RETENTION_DAYS).',
+)
+@with_appcontext
+def sync_compact_command(retention_days):
+    """Compatta il registro delle modifiche usato dalla sincronizzazione."""
+
+    if retention_days is None:
+        retention_days = current_app.config.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30)
+
+    result = compact_change_log(retention_days)
+    click.echo(
+        'Registro compattato: '
+        f"{result['superseded']} versioni superate, "
+        f"{result['orphaned']} righe orfane, "
+        f"{result['expired_tombstones']} eliminazioni scadute rimosse."
+    )
+
+
+@click.command(name='reconcile-daily-totals')
+@click.option('--user-id', type=int, default=None, help='Limita la verifica a un singolo utente.')
+@click.option('--dry-run', is_flag=True, help='Conta le giornate non allineate senza correggerle.')
+@with_appcontext
+def reconcile_daily_totals_command(user_id, dry_run):
+    """Verifica e corregge i totali giornalieri dei macronutrienti."""
+
+    result = reconcile_daily_totals(user_id, repair=not dry_run)
+    if dry_run:
+        click.echo(f"Giornate non allineate: {result['drifted']}.")
+    else:
+        click.echo(f"Giornate corrette: {result['repaired']}.")
+
+
+@click.command(name='benchmark-suggestions')
+@click.option(
+    '--rows',
+    'sizes',
+    type=int,
+    multiple=True,
+    default=(1000, 50000, 500000),
+    show_default=True,
+    help='Dimensione del catalogo sintetico (ripetibile).',
+)
+@click.option('--repeats', type=int, default=20, show_default=True, help='Esecuzioni per termine.')
+@with_appcontext
+def benchmark_suggestions_command(sizes, repeats):
+    """Misura la latenza dei suggerimenti su cataloghi sintetici temporanei."""
+
+    for result in benchmark_suggestions(sizes, repeats=repeats):
+        click.echo(
+            f"{result['rows']:>8} righe  {result['term']!r:<12} "
+            f"p50 {result['p50_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms"
+        )
+
+
+@click.command(name='import-foods')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--format',
+    'fmt',
+    type=click.Choice(food_import_service.IMPORT_FORMATS),
+    default=None,
+    help="Formato del file (default: dedotto dall'estensione).",
+)
+@click.option('--user-id', type=int, default=None, help='Importa come alimenti personali di questo utente.')
+@click.option('--update-existing', is_flag=True, help='Aggiorna i valori degli alimenti già presenti.')
+@with_appcontext
+def import_foods_command(path, fmt, user_id, update_existing):
+    """Importa alimenti in blocco da un file CSV o JSON."""
+
+    try:
+        fmt = fmt or food_import_service.detect_format(path)
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            report = food_import_service.import_foods(
+                food_import_service.iter_food_records(stream, fmt),
+                user_id=user_id,
+                update_existing=update_existing,
+            )
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+
+    click.echo(
+        f"Righe lette: {report['read']}, aggiunte: {report['inserted']}, aggiornate: {report['updated']}, "
+        f"già presenti: {report['conflicts']}, duplicate nel file: {report['duplicates']}, "
+        f"non valide: {report['invalid']}."
+    )
+    for name in report['conflict_names']:
+        click.echo(f'  conflitto: {name}')
+    for error in report['errors']:
+        click.echo(f'  {error}', err=True)
+
+
+@click.command(name='import-food-dump')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--workers',
+    type=click.IntRange(1, 32),
+    default=food_dump_service.DEFAULT_WORKERS,
+    show_default=True,
+    help='Processi paralleli per il caricamento.',
+)
+@click.option(
+    '--chunk-lines',
+    type=click.IntRange(100),
+    default=food_dump_service.DEFAULT_CHUNK_LINES,
+    show_default=True,
+    help='Record per blocco (cambiarlo invalida il punto di ripresa).',
+)
+@click.option('--restart', is_flag=True, help='Ignora il punto di ripresa e ricomincia da capo.')
+@with_appcontext
+def import_food_dump_command(path, workers, chunk_lines, restart):
+    """Importa nel catalogo globale un dump di alimenti (JSONL o CSV, anche compresso)."""
+
+    try:
+        food_dump_service.dump_format(path)
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+
+    if restart:
+        food_dump_service.reset_checkpoint(food_dump_service.source_key(path, chunk_lines))
+
+    def progress(chunk_no, staged, invalid):
+        click.echo(f'Blocco {chunk_no}: {staged} righe caricate, {invalid} scartate.')
+
+    report = food_dump_service.import_food_dump(
+        path,
+        workers=workers,
+        chunk_lines=chunk_lines,
+        progress=progress,
+    )
+    if report['resumed_chunks']:
+        click.echo(f"Ripresa da checkpoint: {report['resumed_chunks']} blocchi già caricati.")
+    click.echo(
+        f"Righe valide: {report['staged']}, scartate: {report['invalid']}, "
+        f"nomi distinti: {report['distinct_names']}, nuovi alimenti: {report['inserted']}."
+    )
+
+
 @click.command(name='security-scan')
 @with_appcontext
 def security_scan_command():
@@ -108,4 +255,9 @@ def init_app(app):
     app.cli.add_command(db_upgrade_command)
     app.cli.add_command(db_prepare_command)
     app.cli.add_command(security_scan_command)
+    app.cli.add_command(sync_compact_command)
+    app.cli.add_command(reconcile_daily_totals_command)
+    app.cli.add_command(benchmark_suggestions_command)
+    app.cli.add_command(import_foods_command)
+    app.cli.add_command(import_food_dump_command)
 
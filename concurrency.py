@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional
+
+from flask import current_app, make_response
+
+
+class ConcurrencyClass:
+    """Bound how many requests of one class run at the same time.
+
+    Requests above ``limit`` wait on a queue of at most ``queue_size`` entries
+    for up to ``queue_timeout`` seconds; anything beyond that is rejected so the
+    worker and its database connections stay available for quick endpoints.
+    Limits apply per worker process.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = max(0.0, queue_timeout)
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self) -> bool:
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return True
+
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._condition.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+_registry: Dict[str, ConcurrencyClass] = {}
+_registry_lock = threading.Lock()
+
+
+def define_concurrency_class(
+    name: str,
+    *,
+    limit: int,
+    queue_size: int = 0,
+    queue_timeout: float = 0.0,
+) -> ConcurrencyClass:
+    """Register the limits of a class; endpoints then refer to it by name only."""
+
+    with _registry_lock:
+        if name in _registry:
+            raise ValueError(f'Concurrency class already defined: {name!r}')
+        klass = _registry[name] = ConcurrencyClass(name, limit, queue_size, queue_timeout)
+        return klass
+
+
+def get_concurrency_class(name: str) -> ConcurrencyClass:
+    """Return a class registered with :func:`define_concurrency_class`."""
+
+    with _registry_lock:
+        klass = _registry.get(name)
+    if klass is None:
+        raise ValueError(f'Unknown concurrency class: {name!r}')
+    return klass
+
+
+# Exports, imports and other long, database-heavy requests. Endpoints sharing
+# the class share its slots.
+define_concurrency_class('heavy', limit=2, queue_size=4, queue_timeout=5)
+
+
+def concurrency_snapshot() -> Dict[str, Dict[str, object]]:
+    """Return live counters (active, queue depth, rejections) per class."""
+
+    with _registry_lock:
+        classes = list(_registry.values())
+    return {klass.name: klass.snapshot() for klass in classes}
+
+
+def concurrency_class(name: str, *, retry_after: Optional[int] = 5):
+    """Run the decorated view inside the ``name`` concurrency class.
+
+    Over-limit requests get an immediate ``503`` with ``Retry-After`` once the
+    bounded queue is full or the wait times out.
+    """
+
+    klass = get_concurrency_class(name)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not klass.acquire():
+                current_app.logger.warning('Richiesta rifiutata: classe di concorrenza %s satura', name)
+                response = make_response('Servizio momentaneamente occupato. Riprova tra qualche secondo.', 503)
+                if retry_after is not None:
+                    response.headers['Retry-After'] = str(retry_after)
+                return response
+            try:
+                return f(*args, **kwargs)
+            finally:
+                klass.release()
+        return decorated_function
+    return decorator
@@ -64,6 +64,10 @@ class BaseConfig:
         os.environ.get('GENERAL_METRICS_ENTRY_LIMIT'),
         90,
     )
+    SYNC_TOMBSTONE_RETENTION_DAYS = _as_int(
+        os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS'),
+        30,
+    )
 
 
 class ProductionConfig(BaseConfig):
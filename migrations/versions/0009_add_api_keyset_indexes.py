@@ -0,0 +1,23 @@
+"""Add (user_id, date, id) indexes backing the JSON API keyset pagination."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0009_add_api_keyset_indexes"
+
+
+def upgrade() -> None:
+    statements = (
+        "CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date_id ON workout_sessions (user_id, record_date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_workout_log_user_date_id ON workout_log (user_id, record_date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_cardio_log_user_date_id ON cardio_log (user_id, record_date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_diet_log_user_date_id ON diet_log (user_id, log_date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_intake_log_user_date_id ON intake_log (user_id, record_date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_daily_data_user_date_id ON daily_data (user_id, record_date DESC, id DESC)",
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
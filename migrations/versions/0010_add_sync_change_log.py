@@ -0,0 +1,103 @@
+"""Create the change log used by the delta sync endpoint."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0010_add_sync_change_log"
+
+# Tables with a direct ``user_id`` column. ``template_exercises`` is handled
+# separately because ownership is inherited from ``workout_templates``.
+SYNC_TABLES = (
+    "workout_sessions",
+    "workout_log",
+    "workout_session_comments",
+    "cardio_log",
+    "diet_log",
+    "intake_log",
+    "daily_data",
+    "foods",
+    "exercises",
+    "workout_templates",
+)
+
+
+def upgrade() -> None:
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS sync_changes (
+            version BIGSERIAL PRIMARY KEY,
+            user_id INTEGER,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op CHAR(1) NOT NULL CHECK (op IN ('U', 'D')),
+            changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sync_changes_user_version ON sync_changes (user_id, version)",
+        "CREATE INDEX IF NOT EXISTS idx_sync_changes_global_version ON sync_changes (version) WHERE user_id IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_sync_changes_row ON sync_changes (table_name, row_id, version)",
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            tombstone_horizon BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT INTO sync_state (id, tombstone_horizon) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+        """
+        CREATE OR REPLACE FUNCTION log_sync_change() RETURNS trigger AS $$
+        DECLARE
+            changed RECORD;
+            owner_id INTEGER;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+
+            IF TG_TABLE_NAME = 'template_exercises' THEN
+                SELECT user_id INTO owner_id FROM workout_templates WHERE id = changed.template_id;
+                -- The parent template is gone: its own tombstone covers the children.
+                IF owner_id IS NULL THEN
+                    RETURN NULL;
+                END IF;
+            ELSE
+                owner_id := changed.user_id;
+            END IF;
+
+            INSERT INTO sync_changes (user_id, table_name, row_id, op)
+            VALUES (owner_id, TG_TABLE_NAME, changed.id, CASE WHEN TG_OP = 'DELETE' THEN 'D' ELSE 'U' END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+
+    for table in SYNC_TABLES + ("template_exercises",):
+        statements.append(f"DROP TRIGGER IF EXISTS trg_sync_{table} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER trg_sync_{table} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION log_sync_change()"
+        )
+
+    # Seed one upsert per existing row so that ``since=0`` yields a full snapshot.
+    for table in SYNC_TABLES:
+        statements.append(
+            f"INSERT INTO sync_changes (user_id, table_name, row_id, op) "
+            f"SELECT user_id, '{table}', id, 'U' FROM {table} ORDER BY id"
+        )
+    statements.append(
+        """
+        INSERT INTO sync_changes (user_id, table_name, row_id, op)
+        SELECT wt.user_id, 'template_exercises', te.id, 'U'
+        FROM template_exercises te
+        JOIN workout_templates wt ON wt.id = te.template_id
+        ORDER BY te.id
+        """
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,80 @@
+"""Maintain daily macro totals incrementally from diet_log changes."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0011_add_diet_totals_triggers"
+
+
+def upgrade() -> None:
+    statements = (
+        """
+        CREATE OR REPLACE FUNCTION apply_diet_log_totals() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE daily_data dd
+                SET total_protein = GREATEST(COALESCE(dd.total_protein, 0) - d.p, 0),
+                    total_carbs = GREATEST(COALESCE(dd.total_carbs, 0) - d.c, 0),
+                    total_fat = GREATEST(COALESCE(dd.total_fat, 0) - d.f, 0),
+                    calories = ROUND(
+                        GREATEST(COALESCE(dd.total_protein, 0) - d.p, 0) * 4
+                        + GREATEST(COALESCE(dd.total_carbs, 0) - d.c, 0) * 4
+                        + GREATEST(COALESCE(dd.total_fat, 0) - d.f, 0) * 9
+                    )
+                FROM (
+                    SELECT user_id, log_date, SUM(protein) AS p, SUM(carbs) AS c, SUM(fat) AS f
+                    FROM old_rows
+                    GROUP BY user_id, log_date
+                ) d
+                WHERE dd.user_id = d.user_id AND dd.record_date = d.log_date;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO daily_data (user_id, record_date, total_protein, total_carbs, total_fat, calories)
+                SELECT user_id, log_date, p, c, f, ROUND(p * 4 + c * 4 + f * 9)
+                FROM (
+                    SELECT user_id, log_date, SUM(protein) AS p, SUM(carbs) AS c, SUM(fat) AS f
+                    FROM new_rows
+                    GROUP BY user_id, log_date
+                ) d
+                ON CONFLICT (user_id, record_date) DO UPDATE SET
+                    total_protein = COALESCE(daily_data.total_protein, 0) + EXCLUDED.total_protein,
+                    total_carbs = COALESCE(daily_data.total_carbs, 0) + EXCLUDED.total_carbs,
+                    total_fat = COALESCE(daily_data.total_fat, 0) + EXCLUDED.total_fat,
+                    calories = ROUND(
+                        (COALESCE(daily_data.total_protein, 0) + EXCLUDED.total_protein) * 4
+                        + (COALESCE(daily_data.total_carbs, 0) + EXCLUDED.total_carbs) * 4
+                        + (COALESCE(daily_data.total_fat, 0) + EXCLUDED.total_fat) * 9
+                    );
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables require one trigger per event.
+        "DROP TRIGGER IF EXISTS trg_diet_log_totals_insert ON diet_log",
+        """
+        CREATE TRIGGER trg_diet_log_totals_insert AFTER INSERT ON diet_log
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_diet_log_totals()
+        """,
+        "DROP TRIGGER IF EXISTS trg_diet_log_totals_delete ON diet_log",
+        """
+        CREATE TRIGGER trg_diet_log_totals_delete AFTER DELETE ON diet_log
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_diet_log_totals()
+        """,
+        "DROP TRIGGER IF EXISTS trg_diet_log_totals_update ON diet_log",
+        """
+        CREATE TRIGGER trg_diet_log_totals_update AFTER UPDATE ON diet_log
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_diet_log_totals()
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
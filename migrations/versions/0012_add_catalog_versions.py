@@ -0,0 +1,74 @@
+"""Track a version per catalog scope so clients can cache catalogs safely."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0012_add_catalog_versions"
+
+CATALOG_TABLES = ("foods", "exercises")
+
+
+def upgrade() -> None:
+    statements = [
+        "CREATE SEQUENCE IF NOT EXISTS catalog_version_seq",
+        """
+        CREATE TABLE IF NOT EXISTS catalog_versions (
+            resource TEXT NOT NULL,
+            scope_id INTEGER NOT NULL,
+            version BIGINT NOT NULL,
+            PRIMARY KEY (resource, scope_id)
+        )
+        """,
+        # ``scope_id`` 0 is the global catalog (rows with ``user_id IS NULL``).
+        """
+        CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO catalog_versions (resource, scope_id, version)
+                SELECT TG_TABLE_NAME, scope_id, nextval('catalog_version_seq')
+                FROM (SELECT DISTINCT COALESCE(user_id, 0) AS scope_id FROM new_rows) s
+                ON CONFLICT (resource, scope_id) DO UPDATE SET version = EXCLUDED.version;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO catalog_versions (resource, scope_id, version)
+                SELECT TG_TABLE_NAME, scope_id, nextval('catalog_version_seq')
+                FROM (SELECT DISTINCT COALESCE(user_id, 0) AS scope_id FROM old_rows) s
+                ON CONFLICT (resource, scope_id) DO UPDATE SET version = EXCLUDED.version;
+            ELSE
+                INSERT INTO catalog_versions (resource, scope_id, version)
+                SELECT TG_TABLE_NAME, scope_id, nextval('catalog_version_seq')
+                FROM (
+                    SELECT COALESCE(user_id, 0) AS scope_id FROM new_rows
+                    UNION
+                    SELECT COALESCE(user_id, 0) FROM old_rows
+                ) s
+                ON CONFLICT (resource, scope_id) DO UPDATE SET version = EXCLUDED.version;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+
+    for table in CATALOG_TABLES:
+        statements.extend(
+            [
+                f"DROP TRIGGER IF EXISTS trg_{table}_version_insert ON {table}",
+                f"CREATE TRIGGER trg_{table}_version_insert AFTER INSERT ON {table} "
+                "REFERENCING NEW TABLE AS new_rows "
+                "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()",
+                f"DROP TRIGGER IF EXISTS trg_{table}_version_delete ON {table}",
+                f"CREATE TRIGGER trg_{table}_version_delete AFTER DELETE ON {table} "
+                "REFERENCING OLD TABLE AS old_rows "
+                "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()",
+                f"DROP TRIGGER IF EXISTS trg_{table}_version_update ON {table}",
+                f"CREATE TRIGGER trg_{table}_version_update AFTER UPDATE ON {table} "
+                "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+                "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()",
+            ]
+        )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,51 @@
+"""Add accent-insensitive search columns and trigram indexes to the catalogs."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0013_add_catalog_search_columns"
+
+# Latin-1 and Latin Extended-A letters folded to their base letter. This must
+# stay aligned with ``utils.normalize_search_text`` and ``safeNormalize`` in
+# ``static/js/catalog_suggestions.js``.
+ACCENTED = (
+    "ÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝàáâãäåçèéêëìíîïñòóôõöùúûüýÿĀāĂăĄąĆćĈĉĊċČčĎď"
+    "ĒēĔĕĖėĘęĚěĜĝĞğĠġĢģĤĥĨĩĪīĬĭĮįİĴĵĶķĹĺĻļĽľŃńŅņŇňŌōŎŏŐőŔŕŖŗŘřŚśŜŝŞşŠšŢţŤť"
+    "ŨũŪūŬŭŮůŰűŲųŴŵŶŷŸŹźŻżŽž"
+)
+UNACCENTED = (
+    "AAAAAACEEEEIIIINOOOOOUUUUYaaaaaaceeeeiiiinooooouuuuyyAaAaAaCcCcCcCcDd"
+    "EeEeEeEeEeGgGgGgGgHhIiIiIiIiIJjKkLlLlLlNnNnNnOoOoOoRrRrRrSsSsSsSsTtTt"
+    "UuUuUuUuUuUuWwYyYZzZzZz"
+)
+
+CATALOG_TABLES = ("foods", "exercises")
+
+
+def upgrade() -> None:
+    statements = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"""
+        CREATE OR REPLACE FUNCTION logbook_search_normalize(value TEXT) RETURNS TEXT AS $$
+            SELECT lower(btrim(translate(value, '{ACCENTED}', '{UNACCENTED}')))
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        """,
+    ]
+
+    for table in CATALOG_TABLES:
+        statements.extend(
+            [
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS name_search TEXT "
+                "GENERATED ALWAYS AS (logbook_search_normalize(name)) STORED",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_name_search_trgm ON {table} "
+                "USING GIN (name_search gin_trgm_ops)",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_name_search_prefix ON {table} "
+                "(name_search text_pattern_ops)",
+            ]
+        )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
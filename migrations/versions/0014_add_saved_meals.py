@@ -0,0 +1,37 @@
+"""Create saved meals (named lists of foods and weights)."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0014_add_saved_meals"
+
+
+def upgrade() -> None:
+    statements = (
+        """
+        CREATE TABLE IF NOT EXISTS saved_meals (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, name)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS saved_meal_items (
+            id SERIAL PRIMARY KEY,
+            meal_id INTEGER NOT NULL REFERENCES saved_meals (id) ON DELETE CASCADE,
+            food_id INTEGER NOT NULL REFERENCES foods (id) ON DELETE CASCADE,
+            weight REAL NOT NULL CHECK (weight > 0),
+            position INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_saved_meal_items_meal ON saved_meal_items (meal_id, position)",
+        "CREATE INDEX IF NOT EXISTS idx_saved_meal_items_food ON saved_meal_items (food_id)",
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
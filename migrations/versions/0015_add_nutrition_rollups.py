@@ -0,0 +1,132 @@
+"""Keep weekly and monthly nutrition rollups in sync with daily_data."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0015_add_nutrition_rollups"
+
+
+def upgrade() -> None:
+    statements = (
+        """
+        CREATE TABLE IF NOT EXISTS nutrition_rollups (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            period TEXT NOT NULL CHECK (period IN ('week', 'month')),
+            period_start DATE NOT NULL,
+            total_protein DOUBLE PRECISION NOT NULL DEFAULT 0,
+            total_carbs DOUBLE PRECISION NOT NULL DEFAULT 0,
+            total_fat DOUBLE PRECISION NOT NULL DEFAULT 0,
+            total_calories BIGINT NOT NULL DEFAULT 0,
+            logged_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, period, period_start)
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION apply_nutrition_rollups() RETURNS trigger AS $$
+        DECLARE
+            changed JSONB := '[]';
+        BEGIN
+            -- Transition tables only exist for their own events, so the signed
+            -- rows are collected per branch and bucketed once below.
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT changed || COALESCE(jsonb_agg(jsonb_build_object(
+                    'user_id', user_id, 'record_date', record_date, 'sign', -1,
+                    'p', COALESCE(total_protein, 0), 'c', COALESCE(total_carbs, 0),
+                    'f', COALESCE(total_fat, 0), 'cal', COALESCE(calories, 0)
+                )), '[]')
+                INTO changed
+                FROM old_rows;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT changed || COALESCE(jsonb_agg(jsonb_build_object(
+                    'user_id', user_id, 'record_date', record_date, 'sign', 1,
+                    'p', COALESCE(total_protein, 0), 'c', COALESCE(total_carbs, 0),
+                    'f', COALESCE(total_fat, 0), 'cal', COALESCE(calories, 0)
+                )), '[]')
+                INTO changed
+                FROM new_rows;
+            END IF;
+
+            -- A day counts as logged when it has any macro or calories, as in
+            -- the food diary. Rows that only changed weight, sleep, etc. give
+            -- zero deltas and are skipped.
+            WITH bucketed AS (
+                SELECT ch.user_id, b.period, b.period_start,
+                       SUM(ch.sign * ch.p) AS p, SUM(ch.sign * ch.c) AS c, SUM(ch.sign * ch.f) AS f,
+                       SUM(ch.sign * ch.cal) AS cal,
+                       SUM(CASE WHEN ch.p > 0 OR ch.c > 0 OR ch.f > 0 OR ch.cal > 0 THEN ch.sign ELSE 0 END) AS days
+                FROM jsonb_to_recordset(changed)
+                    AS ch (user_id INTEGER, record_date DATE, sign INTEGER,
+                           p DOUBLE PRECISION, c DOUBLE PRECISION, f DOUBLE PRECISION, cal BIGINT)
+                CROSS JOIN LATERAL (
+                    VALUES ('week', date_trunc('week', ch.record_date)::date),
+                           ('month', date_trunc('month', ch.record_date)::date)
+                ) AS b (period, period_start)
+                GROUP BY ch.user_id, b.period, b.period_start
+            )
+            INSERT INTO nutrition_rollups AS r
+                (user_id, period, period_start, total_protein, total_carbs, total_fat, total_calories, logged_days)
+            SELECT d.user_id, d.period, d.period_start, d.p, d.c, d.f, d.cal, d.days
+            FROM bucketed d
+            -- Cascaded deletes of a user fire this trigger after the user is gone.
+            WHERE (d.p <> 0 OR d.c <> 0 OR d.f <> 0 OR d.cal <> 0 OR d.days <> 0)
+              AND EXISTS (SELECT 1 FROM users u WHERE u.id = d.user_id)
+            ON CONFLICT (user_id, period, period_start) DO UPDATE SET
+                total_protein = GREATEST(r.total_protein + EXCLUDED.total_protein, 0),
+                total_carbs = GREATEST(r.total_carbs + EXCLUDED.total_carbs, 0),
+                total_fat = GREATEST(r.total_fat + EXCLUDED.total_fat, 0),
+                total_calories = GREATEST(r.total_calories + EXCLUDED.total_calories, 0),
+                logged_days = GREATEST(r.logged_days + EXCLUDED.logged_days, 0);
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables require one trigger per event.
+        "DROP TRIGGER IF EXISTS trg_daily_data_rollups_insert ON daily_data",
+        """
+        CREATE TRIGGER trg_daily_data_rollups_insert AFTER INSERT ON daily_data
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_nutrition_rollups()
+        """,
+        "DROP TRIGGER IF EXISTS trg_daily_data_rollups_delete ON daily_data",
+        """
+        CREATE TRIGGER trg_daily_data_rollups_delete AFTER DELETE ON daily_data
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_nutrition_rollups()
+        """,
+        "DROP TRIGGER IF EXISTS trg_daily_data_rollups_update ON daily_data",
+        """
+        CREATE TRIGGER trg_daily_data_rollups_update AFTER UPDATE ON daily_data
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_nutrition_rollups()
+        """,
+        # Backfill from the existing daily totals.
+        """
+        INSERT INTO nutrition_rollups
+            (user_id, period, period_start, total_protein, total_carbs, total_fat, total_calories, logged_days)
+        SELECT dd.user_id, b.period, b.period_start,
+               SUM(COALESCE(dd.total_protein, 0)), SUM(COALESCE(dd.total_carbs, 0)),
+               SUM(COALESCE(dd.total_fat, 0)), SUM(COALESCE(dd.calories, 0)), COUNT(*)
+        FROM daily_data dd
+        CROSS JOIN LATERAL (
+            VALUES ('week', date_trunc('week', dd.record_date)::date),
+                   ('month', date_trunc('month', dd.record_date)::date)
+        ) AS b (period, period_start)
+        WHERE dd.total_protein > 0 OR dd.total_carbs > 0 OR dd.total_fat > 0 OR dd.calories > 0
+        GROUP BY dd.user_id, b.period, b.period_start
+        ON CONFLICT (user_id, period, period_start) DO UPDATE SET
+            total_protein = EXCLUDED.total_protein,
+            total_carbs = EXCLUDED.total_carbs,
+            total_fat = EXCLUDED.total_fat,
+            total_calories = EXCLUDED.total_calories,
+            logged_days = EXCLUDED.logged_days
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,23 @@
+"""Index the days with logged macros for the paginated food diary."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0016_add_diet_diary_index"
+
+
+def upgrade() -> None:
+    statements = (
+        # The predicate must match services.nutrition_service.LOGGED_DAY_PREDICATE.
+        """
+        CREATE INDEX IF NOT EXISTS idx_daily_data_user_logged_date
+        ON daily_data (user_id, record_date DESC)
+        WHERE total_protein > 0 OR total_carbs > 0 OR total_fat > 0 OR calories > 0
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
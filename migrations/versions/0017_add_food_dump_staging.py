@@ -0,0 +1,43 @@
+"""Staging and checkpoint tables for resumable food dump imports."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0017_add_food_dump_staging"
+
+
+def upgrade() -> None:
+    statements = (
+        # Unlogged: staged rows are disposable and rebuilt from the dump after a crash.
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS food_dump_staging (
+            source TEXT NOT NULL,
+            chunk_no INTEGER NOT NULL,
+            line BIGINT NOT NULL,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            ref_weight REAL NOT NULL,
+            protein REAL NOT NULL,
+            carbs REAL NOT NULL,
+            fat REAL NOT NULL,
+            calories REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_food_dump_staging_source ON food_dump_staging (source, chunk_no)",
+        """
+        CREATE TABLE IF NOT EXISTS food_dump_chunks (
+            source TEXT NOT NULL,
+            chunk_no INTEGER NOT NULL,
+            staged INTEGER NOT NULL,
+            invalid INTEGER NOT NULL,
+            loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, chunk_no)
+        )
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,126 @@
+"""Recipes: foods whose macros are rolled up from ingredient foods."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0018_add_recipes"
+
+
+def upgrade() -> None:
+    statements = (
+        """
+        CREATE TABLE IF NOT EXISTS recipes (
+            food_id INTEGER PRIMARY KEY REFERENCES foods (id) ON DELETE CASCADE,
+            cooked_weight REAL CHECK (cooked_weight IS NULL OR cooked_weight > 0)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            id SERIAL PRIMARY KEY,
+            recipe_id INTEGER NOT NULL REFERENCES recipes (food_id) ON DELETE CASCADE,
+            ingredient_id INTEGER NOT NULL REFERENCES foods (id) ON DELETE CASCADE,
+            weight REAL NOT NULL CHECK (weight > 0),
+            position INTEGER NOT NULL DEFAULT 0,
+            CHECK (recipe_id <> ingredient_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe ON recipe_ingredients (recipe_id, position)",
+        # Reverse lookup used to find the recipes affected by an ingredient change.
+        "CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient ON recipe_ingredients (ingredient_id)",
+        """
+        CREATE OR REPLACE FUNCTION refresh_recipe_macros(recipe_ids INTEGER[]) RETURNS void AS $$
+        BEGIN
+            -- The food row stores the whole recipe's macros per ref_weight:
+            -- the cooked weight when known, otherwise the raw ingredient weight.
+            -- Only rows whose values change are updated, which also stops the
+            -- foods trigger from cascading through unchanged recipes.
+            UPDATE foods f
+            SET ref_weight = t.ref_weight,
+                protein = t.p,
+                carbs = t.c,
+                fat = t.f,
+                calories = t.p * 4 + t.c * 4 + t.f * 9
+            FROM (
+                SELECT r.food_id,
+                       COALESCE(r.cooked_weight, NULLIF(SUM(ri.weight), 0), 100) AS ref_weight,
+                       COALESCE(SUM(i.protein * ri.weight / i.ref_weight), 0) AS p,
+                       COALESCE(SUM(i.carbs * ri.weight / i.ref_weight), 0) AS c,
+                       COALESCE(SUM(i.fat * ri.weight / i.ref_weight), 0) AS f
+                FROM recipes r
+                LEFT JOIN recipe_ingredients ri ON ri.recipe_id = r.food_id
+                LEFT JOIN foods i ON i.id = ri.ingredient_id
+                WHERE r.food_id = ANY(recipe_ids)
+                GROUP BY r.food_id, r.cooked_weight
+            ) t
+            WHERE f.id = t.food_id
+              AND (f.ref_weight, f.protein, f.carbs, f.fat)
+                  IS DISTINCT FROM (t.ref_weight::REAL, t.p::REAL, t.c::REAL, t.f::REAL);
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION refresh_recipes_for_ingredient_rows() RETURNS trigger AS $$
+        DECLARE
+            affected INTEGER[] := '{}';
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                affected := affected || ARRAY(SELECT DISTINCT recipe_id FROM old_rows);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                affected := affected || ARRAY(SELECT DISTINCT recipe_id FROM new_rows);
+            END IF;
+            PERFORM refresh_recipe_macros(affected);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION refresh_recipes_for_food_changes() RETURNS trigger AS $$
+        BEGIN
+            -- Dependency tracking: only recipes that use a food whose macros
+            -- or reference weight actually changed are recomputed. Nested
+            -- recipes propagate through this same trigger.
+            PERFORM refresh_recipe_macros(ARRAY(
+                SELECT DISTINCT ri.recipe_id
+                FROM new_rows n
+                JOIN old_rows o ON o.id = n.id
+                JOIN recipe_ingredients ri ON ri.ingredient_id = n.id
+                WHERE (n.ref_weight, n.protein, n.carbs, n.fat)
+                      IS DISTINCT FROM (o.ref_weight, o.protein, o.carbs, o.fat)
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables require one trigger per event.
+        "DROP TRIGGER IF EXISTS trg_recipe_ingredients_insert ON recipe_ingredients",
+        """
+        CREATE TRIGGER trg_recipe_ingredients_insert AFTER INSERT ON recipe_ingredients
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_recipes_for_ingredient_rows()
+        """,
+        "DROP TRIGGER IF EXISTS trg_recipe_ingredients_delete ON recipe_ingredients",
+        """
+        CREATE TRIGGER trg_recipe_ingredients_delete AFTER DELETE ON recipe_ingredients
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_recipes_for_ingredient_rows()
+        """,
+        "DROP TRIGGER IF EXISTS trg_recipe_ingredients_update ON recipe_ingredients",
+        """
+        CREATE TRIGGER trg_recipe_ingredients_update AFTER UPDATE ON recipe_ingredients
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_recipes_for_ingredient_rows()
+        """,
+        "DROP TRIGGER IF EXISTS trg_foods_refresh_recipes ON foods",
+        """
+        CREATE TRIGGER trg_foods_refresh_recipes AFTER UPDATE ON foods
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_recipes_for_food_changes()
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
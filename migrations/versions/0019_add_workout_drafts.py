@@ -0,0 +1,45 @@
+"""Server-side drafts of in-progress gym sessions, autosaved one field at a time."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0019_add_workout_drafts"
+
+
+def upgrade() -> None:
+    statements = (
+        # Values are stored as typed so that a restored draft shows exactly
+        # what was entered; they are validated when the session is finalized.
+        """
+        CREATE TABLE IF NOT EXISTS workout_draft_sets (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            session_timestamp TEXT NOT NULL,
+            exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+            set_number INTEGER NOT NULL CHECK (set_number > 0),
+            record_date DATE NOT NULL,
+            reps TEXT NOT NULL DEFAULT '',
+            weight TEXT NOT NULL DEFAULT '',
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, session_timestamp, exercise_id, set_number)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS workout_draft_comments (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            session_timestamp TEXT NOT NULL,
+            exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+            record_date DATE NOT NULL,
+            comment TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, session_timestamp, exercise_id)
+        )
+        """,
+        # Lookup of the open draft when the session page is opened for a day.
+        "CREATE INDEX IF NOT EXISTS idx_workout_draft_sets_user_date ON workout_draft_sets (user_id, record_date)",
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
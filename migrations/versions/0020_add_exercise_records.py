@@ -0,0 +1,215 @@
+"""Personal records per user and exercise, maintained from workout_log by triggers."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0020_add_exercise_records"
+
+
+def upgrade() -> None:
+    statements = (
+        """
+        CREATE TABLE IF NOT EXISTS exercise_records (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+            e1rm_epley REAL,
+            e1rm_epley_date DATE,
+            e1rm_brzycki REAL,
+            e1rm_brzycki_date DATE,
+            best_volume DOUBLE PRECISION,
+            best_volume_date DATE,
+            PRIMARY KEY (user_id, exercise_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exercise_rep_records (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+            reps INTEGER NOT NULL CHECK (reps > 0),
+            weight REAL NOT NULL,
+            record_date DATE NOT NULL,
+            PRIMARY KEY (user_id, exercise_id, reps)
+        )
+        """,
+        # ``sets`` is a JSON array of workout_log rows (user_id, exercise_id,
+        # session_timestamp, record_date, reps, weight) holding whole sessions.
+        # Records only ever improve here; estimated 1RMs use sets of 1-12 reps,
+        # where the Epley and Brzycki formulas are reasonably accurate.
+        """
+        CREATE OR REPLACE FUNCTION merge_exercise_records(sets JSONB) RETURNS void AS $$
+        BEGIN
+            IF sets IS NULL THEN
+                RETURN;
+            END IF;
+
+            INSERT INTO exercise_rep_records (user_id, exercise_id, reps, weight, record_date)
+            SELECT DISTINCT ON (s.user_id, s.exercise_id, s.reps)
+                   s.user_id, s.exercise_id, s.reps, s.weight, s.record_date
+            FROM jsonb_to_recordset(sets) AS s(
+                user_id INTEGER, exercise_id INTEGER, session_timestamp TEXT, record_date DATE, reps INTEGER, weight REAL
+            )
+            WHERE s.reps > 0
+            ORDER BY s.user_id, s.exercise_id, s.reps, s.weight DESC, s.record_date
+            ON CONFLICT (user_id, exercise_id, reps) DO UPDATE
+            SET weight = EXCLUDED.weight, record_date = EXCLUDED.record_date
+            WHERE EXCLUDED.weight > exercise_rep_records.weight;
+
+            INSERT INTO exercise_records (
+                user_id, exercise_id, e1rm_epley, e1rm_epley_date, e1rm_brzycki, e1rm_brzycki_date,
+                best_volume, best_volume_date
+            )
+            WITH s AS (
+                SELECT *
+                FROM jsonb_to_recordset(sets) AS x(
+                    user_id INTEGER, exercise_id INTEGER, session_timestamp TEXT, record_date DATE, reps INTEGER, weight REAL
+                )
+                WHERE x.reps > 0
+            ),
+            epley AS (
+                SELECT DISTINCT ON (user_id, exercise_id) user_id, exercise_id,
+                       weight * (1 + reps / 30.0) AS value, record_date
+                FROM s
+                WHERE reps <= 12 AND weight > 0
+                ORDER BY user_id, exercise_id, value DESC, record_date
+            ),
+            brzycki AS (
+                SELECT DISTINCT ON (user_id, exercise_id) user_id, exercise_id,
+                       weight * 36.0 / (37 - reps) AS value, record_date
+                FROM s
+                WHERE reps <= 12 AND weight > 0
+                ORDER BY user_id, exercise_id, value DESC, record_date
+            ),
+            volume AS (
+                SELECT DISTINCT ON (user_id, exercise_id) user_id, exercise_id,
+                       SUM(weight * reps) AS value, MIN(record_date) AS record_date
+                FROM s
+                GROUP BY user_id, exercise_id, session_timestamp
+                ORDER BY user_id, exercise_id, SUM(weight * reps) DESC, MIN(record_date)
+            )
+            SELECT v.user_id, v.exercise_id, e.value, e.record_date, b.value, b.record_date, v.value, v.record_date
+            FROM volume v
+            LEFT JOIN epley e ON e.user_id = v.user_id AND e.exercise_id = v.exercise_id
+            LEFT JOIN brzycki b ON b.user_id = v.user_id AND b.exercise_id = v.exercise_id
+            ON CONFLICT (user_id, exercise_id) DO UPDATE
+            SET e1rm_epley = GREATEST(exercise_records.e1rm_epley, EXCLUDED.e1rm_epley),
+                e1rm_epley_date = CASE
+                    WHEN EXCLUDED.e1rm_epley > COALESCE(exercise_records.e1rm_epley, -1) THEN EXCLUDED.e1rm_epley_date
+                    ELSE exercise_records.e1rm_epley_date END,
+                e1rm_brzycki = GREATEST(exercise_records.e1rm_brzycki, EXCLUDED.e1rm_brzycki),
+                e1rm_brzycki_date = CASE
+                    WHEN EXCLUDED.e1rm_brzycki > COALESCE(exercise_records.e1rm_brzycki, -1) THEN EXCLUDED.e1rm_brzycki_date
+                    ELSE exercise_records.e1rm_brzycki_date END,
+                best_volume = GREATEST(exercise_records.best_volume, EXCLUDED.best_volume),
+                best_volume_date = CASE
+                    WHEN EXCLUDED.best_volume > COALESCE(exercise_records.best_volume, -1) THEN EXCLUDED.best_volume_date
+                    ELSE exercise_records.best_volume_date END;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # ``pairs`` is a JSON array of {user_id, exercise_id}: their records are
+        # rebuilt from the remaining log rows of those exercises only.
+        """
+        CREATE OR REPLACE FUNCTION recompute_exercise_records(pairs JSONB) RETURNS void AS $$
+        BEGIN
+            IF pairs IS NULL THEN
+                RETURN;
+            END IF;
+
+            DELETE FROM exercise_rep_records r
+            USING jsonb_to_recordset(pairs) AS p(user_id INTEGER, exercise_id INTEGER)
+            WHERE r.user_id = p.user_id AND r.exercise_id = p.exercise_id;
+
+            DELETE FROM exercise_records r
+            USING jsonb_to_recordset(pairs) AS p(user_id INTEGER, exercise_id INTEGER)
+            WHERE r.user_id = p.user_id AND r.exercise_id = p.exercise_id;
+
+            PERFORM merge_exercise_records((
+                SELECT jsonb_agg(jsonb_build_object(
+                    'user_id', wl.user_id, 'exercise_id', wl.exercise_id,
+                    'session_timestamp', wl.session_timestamp, 'record_date', wl.record_date,
+                    'reps', wl.reps, 'weight', wl.weight
+                ))
+                FROM (SELECT DISTINCT * FROM jsonb_to_recordset(pairs) AS p(user_id INTEGER, exercise_id INTEGER)) p
+                JOIN workout_log wl ON wl.user_id = p.user_id AND wl.exercise_id = p.exercise_id
+            ));
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # New sessions are merged incrementally (the app inserts all sets of a
+        # session in one statement); deletes and updates, including the
+        # delete-then-insert of an edited session, rebuild the affected
+        # exercises. Transition tables are referenced only in their own branch.
+        """
+        CREATE OR REPLACE FUNCTION apply_exercise_records() RETURNS trigger AS $$
+        DECLARE
+            pairs JSONB := '[]'::jsonb;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM merge_exercise_records((
+                    SELECT jsonb_agg(jsonb_build_object(
+                        'user_id', user_id, 'exercise_id', exercise_id,
+                        'session_timestamp', session_timestamp, 'record_date', record_date,
+                        'reps', reps, 'weight', weight
+                    ))
+                    FROM new_rows
+                ));
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                pairs := pairs || COALESCE((
+                    SELECT jsonb_agg(DISTINCT jsonb_build_object('user_id', user_id, 'exercise_id', exercise_id))
+                    FROM old_rows
+                ), '[]'::jsonb);
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                pairs := pairs || COALESCE((
+                    SELECT jsonb_agg(DISTINCT jsonb_build_object('user_id', user_id, 'exercise_id', exercise_id))
+                    FROM new_rows
+                ), '[]'::jsonb);
+            END IF;
+            PERFORM recompute_exercise_records(pairs);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_log_records_insert ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_records_insert AFTER INSERT ON workout_log
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_records()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_log_records_delete ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_records_delete AFTER DELETE ON workout_log
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_records()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_log_records_update ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_records_update AFTER UPDATE ON workout_log
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_records()
+        """,
+        # Backfill one user at a time to keep each JSON payload small.
+        """
+        DO $$
+        DECLARE
+            uid INTEGER;
+        BEGIN
+            FOR uid IN SELECT DISTINCT user_id FROM workout_log LOOP
+                PERFORM recompute_exercise_records((
+                    SELECT jsonb_agg(jsonb_build_object('user_id', uid, 'exercise_id', exercise_id))
+                    FROM (SELECT DISTINCT exercise_id FROM workout_log WHERE user_id = uid) e
+                ));
+            END LOOP;
+        END;
+        $$
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,24 @@
+"""Index workout_log by exercise and date for progression series and paging."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0021_add_exercise_progression_index"
+
+
+def upgrade() -> None:
+    statements = (
+        # Serves date-range progression queries and the keyset pages of
+        # esercizio_dettaglio; supersedes idx_workout_log_user_exercise.
+        """
+        CREATE INDEX IF NOT EXISTS idx_workout_log_user_exercise_date
+        ON workout_log (user_id, exercise_id, record_date DESC, session_timestamp DESC)
+        """,
+        "DROP INDEX IF EXISTS idx_workout_log_user_exercise",
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
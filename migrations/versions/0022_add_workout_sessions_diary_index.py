@@ -0,0 +1,23 @@
+"""Index workout_sessions by date and timestamp for the gym diary pages."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0022_add_workout_sessions_diary_index"
+
+
+def upgrade() -> None:
+    statements = (
+        # Serves the keyset pages of diario_palestra, ordered by
+        # (record_date, session_timestamp).
+        """
+        CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date_ts
+        ON workout_sessions (user_id, record_date DESC, session_timestamp DESC)
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
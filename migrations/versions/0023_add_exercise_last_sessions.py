@@ -0,0 +1,167 @@
+"""Snapshot of each exercise's latest sessions, maintained from workout_log by triggers."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0023_add_exercise_last_sessions"
+
+
+def upgrade() -> None:
+    statements = (
+        # ``sessions`` is a JSON array, newest first, of up to three
+        # {session_timestamp, record_date, sets, comment} objects; ``complete``
+        # is true when the exercise has no older sessions than those.
+        """
+        CREATE TABLE IF NOT EXISTS exercise_last_sessions (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+            sessions JSONB NOT NULL,
+            complete BOOLEAN NOT NULL,
+            PRIMARY KEY (user_id, exercise_id)
+        )
+        """,
+        # ``pairs`` is a JSON array of {user_id, exercise_id}. Each snapshot is
+        # rebuilt from the newest sessions on idx_workout_log_user_exercise_date,
+        # so the cost does not depend on the length of the history. Three
+        # sessions are kept so that a page opened on the day of the latest
+        # session still finds the two before it.
+        """
+        CREATE OR REPLACE FUNCTION refresh_exercise_last_sessions(pairs JSONB) RETURNS void AS $$
+        BEGIN
+            IF pairs IS NULL THEN
+                RETURN;
+            END IF;
+
+            DELETE FROM exercise_last_sessions s
+            USING jsonb_to_recordset(pairs) AS p(user_id INTEGER, exercise_id INTEGER)
+            WHERE s.user_id = p.user_id AND s.exercise_id = p.exercise_id;
+
+            INSERT INTO exercise_last_sessions (user_id, exercise_id, sessions, complete)
+            WITH p AS (
+                SELECT DISTINCT user_id, exercise_id
+                FROM jsonb_to_recordset(pairs) AS x(user_id INTEGER, exercise_id INTEGER)
+            ),
+            recent AS (
+                SELECT p.user_id, p.exercise_id, k.record_date, k.session_timestamp,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY p.user_id, p.exercise_id
+                           ORDER BY k.record_date DESC, k.session_timestamp DESC
+                       ) AS position
+                FROM p
+                CROSS JOIN LATERAL (
+                    SELECT DISTINCT wl.record_date, wl.session_timestamp
+                    FROM workout_log wl
+                    WHERE wl.user_id = p.user_id AND wl.exercise_id = p.exercise_id
+                    ORDER BY wl.record_date DESC, wl.session_timestamp DESC
+                    LIMIT 4
+                ) k
+            )
+            SELECT r.user_id, r.exercise_id,
+                   jsonb_agg(jsonb_build_object(
+                       'session_timestamp', r.session_timestamp,
+                       'record_date', r.record_date,
+                       'sets', (
+                           SELECT jsonb_agg(jsonb_build_object(
+                               'set_number', wl.set_number, 'reps', wl.reps, 'weight', wl.weight
+                           ) ORDER BY wl.set_number)
+                           FROM workout_log wl
+                           WHERE wl.user_id = r.user_id AND wl.exercise_id = r.exercise_id
+                             AND wl.record_date = r.record_date AND wl.session_timestamp = r.session_timestamp
+                       ),
+                       'comment', (
+                           SELECT c.comment
+                           FROM workout_session_comments c
+                           WHERE c.user_id = r.user_id AND c.session_timestamp = r.session_timestamp
+                             AND c.exercise_id = r.exercise_id
+                       )
+                   ) ORDER BY r.position) FILTER (WHERE r.position <= 3),
+                   COUNT(*) <= 3
+            FROM recent r
+            GROUP BY r.user_id, r.exercise_id;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Shared by workout_log and workout_session_comments: both carry
+        # user_id and exercise_id. Saving, editing or deleting a session (its
+        # rows cascade from workout_sessions) refreshes the exercises it touched.
+        """
+        CREATE OR REPLACE FUNCTION apply_exercise_last_sessions() RETURNS trigger AS $$
+        DECLARE
+            pairs JSONB := '[]'::jsonb;
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                pairs := pairs || COALESCE((
+                    SELECT jsonb_agg(DISTINCT jsonb_build_object('user_id', user_id, 'exercise_id', exercise_id))
+                    FROM old_rows
+                ), '[]'::jsonb);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                pairs := pairs || COALESCE((
+                    SELECT jsonb_agg(DISTINCT jsonb_build_object('user_id', user_id, 'exercise_id', exercise_id))
+                    FROM new_rows
+                ), '[]'::jsonb);
+            END IF;
+            PERFORM refresh_exercise_last_sessions(pairs);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables require one trigger per event.
+        "DROP TRIGGER IF EXISTS trg_workout_log_last_sessions_insert ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_last_sessions_insert AFTER INSERT ON workout_log
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_log_last_sessions_delete ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_last_sessions_delete AFTER DELETE ON workout_log
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_log_last_sessions_update ON workout_log",
+        """
+        CREATE TRIGGER trg_workout_log_last_sessions_update AFTER UPDATE ON workout_log
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_comments_last_sessions_insert ON workout_session_comments",
+        """
+        CREATE TRIGGER trg_workout_comments_last_sessions_insert AFTER INSERT ON workout_session_comments
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_comments_last_sessions_delete ON workout_session_comments",
+        """
+        CREATE TRIGGER trg_workout_comments_last_sessions_delete AFTER DELETE ON workout_session_comments
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        "DROP TRIGGER IF EXISTS trg_workout_comments_last_sessions_update ON workout_session_comments",
+        """
+        CREATE TRIGGER trg_workout_comments_last_sessions_update AFTER UPDATE ON workout_session_comments
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_exercise_last_sessions()
+        """,
+        # Backfill one user at a time to keep each JSON payload small.
+        """
+        DO $$
+        DECLARE
+            uid INTEGER;
+        BEGIN
+            FOR uid IN SELECT DISTINCT user_id FROM workout_log LOOP
+                PERFORM refresh_exercise_last_sessions((
+                    SELECT jsonb_agg(jsonb_build_object('user_id', uid, 'exercise_id', exercise_id))
+                    FROM (SELECT DISTINCT exercise_id FROM workout_log WHERE user_id = uid) e
+                ));
+            END LOOP;
+        END;
+        $$
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -0,0 +1,122 @@
+"""Per-user session keys: integer session_id foreign keys and a real start time.
+
+``workout_sessions.session_timestamp`` stays as the client-generated key used
+in URLs and drafts, but it is now unique per user instead of globally.
+``workout_log`` and ``workout_session_comments`` reference the session by its
+integer id through indexed foreign keys, and ``started_at`` holds the start
+time as a ``TIMESTAMP``.
+
+The backfill runs in id ranges with a commit per batch, so it never holds
+long locks or builds a huge transaction on large tables, and it can resume
+after an interruption.
+"""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0024_add_workout_session_ids"
+
+BATCH_SIZE = 5000
+
+# Statement-level triggers that rebuild derived data from changed rows. The
+# backfill only fills the new columns, so they are disabled while it runs.
+_DERIVED_TRIGGERS = {
+    "workout_log": ("trg_workout_log_records_update", "trg_workout_log_last_sessions_update"),
+    "workout_session_comments": ("trg_workout_comments_last_sessions_update",),
+}
+
+_BACKFILLS = (
+    """
+    UPDATE workout_sessions
+    SET started_at = CASE
+        WHEN session_timestamp ~ '^[0-9]{14}$'
+            THEN to_timestamp(session_timestamp, 'YYYYMMDDHH24MISS')::timestamp
+        ELSE record_date::timestamp
+    END
+    WHERE id > :start AND id <= :stop AND started_at IS NULL
+    """,
+    """
+    UPDATE workout_log wl
+    SET session_id = ws.id
+    FROM workout_sessions ws
+    WHERE wl.id > :start AND wl.id <= :stop AND wl.session_id IS NULL
+      AND ws.user_id = wl.user_id AND ws.session_timestamp = wl.session_timestamp
+    """,
+    """
+    UPDATE workout_session_comments c
+    SET session_id = ws.id
+    FROM workout_sessions ws
+    WHERE c.id > :start AND c.id <= :stop AND c.session_id IS NULL
+      AND ws.user_id = c.user_id AND ws.session_timestamp = c.session_timestamp
+    """,
+)
+
+
+def _execute(statements) -> None:
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def _set_derived_triggers(enabled: bool) -> None:
+    action = "ENABLE" if enabled else "DISABLE"
+    _execute(
+        f"ALTER TABLE {table} " + ", ".join(f"{action} TRIGGER {name}" for name in names)
+        for table, names in _DERIVED_TRIGGERS.items()
+    )
+
+
+def _backfill(statement: str) -> None:
+    table = statement.split()[1]
+    max_id = db.session.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+    for start in range(0, max_id, BATCH_SIZE):
+        db.session.execute(text(statement), {"start": start, "stop": start + BATCH_SIZE})
+        db.session.commit()
+
+
+def upgrade() -> None:
+    _execute((
+        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS started_at TIMESTAMP",
+        "ALTER TABLE workout_log ADD COLUMN IF NOT EXISTS session_id INTEGER",
+        "ALTER TABLE workout_session_comments ADD COLUMN IF NOT EXISTS session_id INTEGER",
+    ))
+
+    _set_derived_triggers(False)
+    try:
+        for statement in _BACKFILLS:
+            _backfill(statement)
+    finally:
+        # A failed batch leaves the session in an aborted transaction.
+        db.session.rollback()
+        _set_derived_triggers(True)
+
+    _execute((
+        "ALTER TABLE workout_sessions ALTER COLUMN started_at SET NOT NULL",
+        # Comments had no foreign key, so those of deleted sessions were left behind.
+        "DELETE FROM workout_session_comments WHERE session_id IS NULL",
+        "ALTER TABLE workout_log ALTER COLUMN session_id SET NOT NULL",
+        "ALTER TABLE workout_session_comments ALTER COLUMN session_id SET NOT NULL",
+        "ALTER TABLE workout_log DROP CONSTRAINT IF EXISTS workout_log_session_id_fkey",
+        """
+        ALTER TABLE workout_log ADD CONSTRAINT workout_log_session_id_fkey
+        FOREIGN KEY (session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
+        """,
+        "ALTER TABLE workout_session_comments DROP CONSTRAINT IF EXISTS workout_session_comments_session_id_fkey",
+        """
+        ALTER TABLE workout_session_comments ADD CONSTRAINT workout_session_comments_session_id_fkey
+        FOREIGN KEY (session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
+        """,
+        # Cascading deletes and per-session reads use these instead of a scan.
+        "CREATE INDEX IF NOT EXISTS idx_workout_log_session ON workout_log (session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_workout_session_comments_session ON workout_session_comments (session_id)",
+        # The TEXT key is now unique per user: two users saving in the same
+        # second no longer collide.
+        "ALTER TABLE workout_log DROP CONSTRAINT IF EXISTS workout_log_session_timestamp_fkey",
+        "ALTER TABLE workout_sessions DROP CONSTRAINT IF EXISTS workout_sessions_session_timestamp_key",
+        "ALTER TABLE workout_sessions DROP CONSTRAINT IF EXISTS workout_sessions_user_timestamp_key",
+        """
+        ALTER TABLE workout_sessions ADD CONSTRAINT workout_sessions_user_timestamp_key
+        UNIQUE (user_id, session_timestamp)
+        """,
+    ))
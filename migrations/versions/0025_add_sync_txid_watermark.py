@@ -0,0 +1,63 @@
+"""Order the sync change log by writing transaction and summarize bulk writes."""
+
+from sqlalchemy import text
+
+from extensions import db
+
+revision = "0025_add_sync_txid_watermark"
+
+
+def upgrade() -> None:
+    statements = (
+        # Versions come from a sequence and become visible at commit, in any
+        # order. The writing transaction id lets readers stop below the oldest
+        # transaction still running, however long it stays open.
+        "ALTER TABLE sync_changes ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT txid_current()",
+        "ALTER TABLE sync_state ADD COLUMN IF NOT EXISTS tombstone_horizon_txid BIGINT NOT NULL DEFAULT 0",
+        # 'C': the whole table changed in bulk and must be fetched again.
+        "ALTER TABLE sync_changes DROP CONSTRAINT IF EXISTS sync_changes_op_check",
+        "ALTER TABLE sync_changes ADD CONSTRAINT sync_changes_op_check CHECK (op IN ('U', 'D', 'C'))",
+        "CREATE INDEX IF NOT EXISTS idx_sync_changes_user_txid ON sync_changes (user_id, txid, version)",
+        "CREATE INDEX IF NOT EXISTS idx_sync_changes_global_txid ON sync_changes (txid, version) WHERE user_id IS NULL",
+        "DROP INDEX IF EXISTS idx_sync_changes_user_version",
+        "DROP INDEX IF EXISTS idx_sync_changes_global_version",
+        # Bulk writers set logbook.bulk_sync for their transaction and record a
+        # single 'C' change instead of one change per row.
+        """
+        CREATE OR REPLACE FUNCTION log_sync_change() RETURNS trigger AS $$
+        DECLARE
+            changed RECORD;
+            owner_id INTEGER;
+        BEGIN
+            IF current_setting('logbook.bulk_sync', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+
+            IF TG_TABLE_NAME = 'template_exercises' THEN
+                SELECT user_id INTO owner_id FROM workout_templates WHERE id = changed.template_id;
+                -- The parent template is gone: its own tombstone covers the children.
+                IF owner_id IS NULL THEN
+                    RETURN NULL;
+                END IF;
+            ELSE
+                owner_id := changed.user_id;
+            END IF;
+
+            INSERT INTO sync_changes (user_id, table_name, row_id, op)
+            VALUES (owner_id, TG_TABLE_NAME, changed.id, CASE WHEN TG_OP = 'DELETE' THEN 'D' ELSE 'U' END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    )
+
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    db.session.commit()
@@ -7,3 +7,4 @@ from .gym import gym_bp
 from .cardio import cardio_bp
 from .admin import admin_bp
 from .health import health_bp
+from .api import api_bp
@@ -1,16 +1,21 @@
 # routes/admin.py
 
+import csv
+import io
+
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, current_app
 import bcrypt
 from datetime import datetime, timedelta, date
 from sqlalchemy.exc import IntegrityError
 from collections import defaultdict
 from .auth import login_required, admin_required
+from concurrency import concurrency_class
 from extensions import db
 from utils import execute_query
 from services.admin_service import build_user_export_archive
-from services import privacy_service
+from services import catalog_service, food_import_service, privacy_service
 from services.communication_service import get_welcome_message, update_welcome_message
+from services.suggestion_service import invalidate_suggestion_cache
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -142,6 +147,7 @@ def admin_utente_dettaglio(user_id):
 @admin_bp.route('/utente/<int:user_id>/export', methods=['POST'])
 @login_required
 @admin_required
+@concurrency_class('heavy')
 def admin_utente_export(user_id):
     user = execute_query('SELECT username FROM users WHERE id = :id AND is_admin = 0', {'id': user_id}, fetchone=True)
     if not user:
@@ -199,7 +205,7 @@ def admin_utente_scheda_modifica(user_id, template_id):
         return redirect(url_for('admin.admin_utente_scheda_modifica', user_id=user_id, template_id=template_id))
 
     template_exercises = execute_query('SELECT te.id, e.name, te.sets FROM template_exercises te JOIN exercises e ON te.exercise_id = e.id WHERE te.template_id = :tid ORDER BY te.id', {'tid': template_id}, fetchall=True)
-    all_exercises = execute_query('SELECT * FROM exercises WHERE user_id IS NULL OR user_id = :user_id ORDER BY name', {'user_id': user_id}, fetchall=True)
+    all_exercises = catalog_service.list_catalog('exercises', user_id)
     
     return render_template('admin_utente_scheda_modifica.html', title=f'Modifica {template["name"]}', user=user, template=template, template_exercises=template_exercises, all_exercises=all_exercises)
 
@@ -225,6 +231,7 @@ def admin_utente_alimenti(user_id):
             food_id = request.form.get('food_id')
             execute_query('DELETE FROM foods WHERE id = :id AND user_id = :user_id', {'id': food_id, 'user_id': user_id}, commit=True)
             flash('Alimento personale eliminato.', 'success')
+        invalidate_suggestion_cache('foods', user_id)
         return redirect(url_for('admin.admin_utente_alimenti', user_id=user_id))
 
     alimenti = execute_query('SELECT * FROM foods WHERE user_id = :user_id ORDER BY name', {'user_id': user_id}, fetchall=True)
@@ -256,12 +263,13 @@ def admin_utente_accessi(user_id):
 @admin_bp.route('/utente/<int:user_id>/diario_palestra')
 @login_required
 @admin_required
+@concurrency_class('heavy')
 def admin_utente_diario_palestra(user_id):
     user = execute_query('SELECT * FROM users WHERE id = :id', {'id': user_id}, fetchone=True)
     if not user: return redirect(url_for('admin.admin_utenti'))
     
     logs_raw = execute_query('SELECT wl.record_date, wl.session_timestamp, e.name as exercise_name, wl.set_number, wl.reps, wl.weight FROM workout_log wl JOIN exercises e ON wl.exercise_id = e.id WHERE wl.user_id = :user_id ORDER BY wl.record_date DESC, wl.session_timestamp DESC, wl.id ASC', {'user_id': user_id}, fetchall=True)
-    sessions_raw = execute_query('SELECT session_timestamp, duration_minutes, template_name, session_note, session_rating FROM workout_sessions WHERE user_id = :user_id', {'user_id': user_id}, fetchall=True)
+    sessions_raw = execute_query('SELECT session_timestamp, started_at, duration_minutes, template_name, session_note, session_rating FROM workout_sessions WHERE user_id = :user_id', {'user_id': user_id}, fetchall=True)
     sessions_info = {session['session_timestamp']: dict(session) for session in sessions_raw}
 
     workouts_by_day = defaultdict(
@@ -286,7 +294,7 @@ def admin_utente_diario_palestra(user_id):
         workouts_by_day[day]['date_formatted'] = day.strftime('%d %b %y')
         session_details = sessions_info.get(ts, {})
         session_data = workouts_by_day[day]['sessions'][ts]
-        session_data['time_formatted'] = datetime.strptime(ts, '%Y%m%d%H%M%S').strftime('%H:%M')
+        session_data['time_formatted'] = session_details['started_at'].strftime('%H:%M')
         session_data['duration'] = session_details.get('duration_minutes')
         template_name = session_details.get('template_name') or 'Allenamento Libero'
         session_data['template_name'] = template_name
@@ -338,8 +346,10 @@ def admin_esercizi():
             exercise_id = request.form.get('exercise_id')
             execute_query('DELETE FROM exercises WHERE id = :id AND user_id IS NULL', {'id': exercise_id}, commit=True)
             flash('Esercizio globale eliminato.', 'success')
+        invalidate_suggestion_cache('exercises')
+        catalog_service.invalidate_global_catalog('exercises')
         return redirect(url_for('admin.admin_esercizi'))
-    exercises = execute_query('SELECT * FROM exercises WHERE user_id IS NULL ORDER BY name', fetchall=True)
+    exercises = catalog_service.get_global_catalog('exercises').rows()
     return render_template('admin_esercizi.html', title='Admin Esercizi', exercises=exercises)
 
 @admin_bp.route('/esercizio/<int:exercise_id>/consigli', methods=['GET', 'POST'])
@@ -360,6 +370,38 @@ def admin_esercizio_consigli(exercise_id):
     return render_template('admin_esercizio_consigli.html', title='Gestisci Consigli', exercise=exercise)
 
 
+def _import_global_foods() -> None:
+    upload = request.files.get('foods_file')
+    if not upload or not upload.filename:
+        flash('Seleziona un file CSV o JSON da importare.', 'danger')
+        return
+    try:
+        fmt = food_import_service.detect_format(upload.filename)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = food_import_service.import_foods(
+            food_import_service.iter_food_records(stream, fmt),
+            update_existing=request.form.get('update_existing') == '1',
+        )
+    except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+        flash(f'Importazione non riuscita: {exc}', 'danger')
+        return
+
+    current_app.logger.info(
+        'Importazione alimenti globali: %s lette, %s aggiunte, %s aggiornate, %s in conflitto',
+        report['read'], report['inserted'], report['updated'], report['conflicts'],
+    )
+    flash(
+        f"Importazione completata: {report['inserted']} aggiunti, {report['updated']} aggiornati, "
+        f"{report['conflicts']} già presenti, {report['duplicates']} duplicati nel file, "
+        f"{report['invalid']} righe non valide.",
+        'success',
+    )
+    if report['conflict_names'] and not report['updated']:
+        flash('Già presenti (non modificati): ' + ', '.join(report['conflict_names']), 'warning')
+    if report['errors']:
+        flash('Righe scartate: ' + ' '.join(report['errors']), 'warning')
+
+
 @admin_bp.route('/alimenti', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -377,8 +419,12 @@ def admin_alimenti():
             food_id = request.form.get('food_id')
             execute_query('DELETE FROM foods WHERE id = :id AND user_id IS NULL', {'id': food_id}, commit=True)
             flash('Alimento globale eliminato.', 'success')
+        elif action == 'import':
+            _import_global_foods()
+        invalidate_suggestion_cache('foods')
+        catalog_service.invalidate_global_catalog('foods')
         return redirect(url_for('admin.admin_alimenti'))
-    foods = execute_query('SELECT * FROM foods WHERE user_id IS NULL ORDER BY name', fetchall=True)
+    foods = catalog_service.get_global_catalog('foods').rows()
     return render_template('admin_alimenti.html', title='Admin Alimenti', foods=foods)
 
 @admin_bp.route('/note_condivise')
@@ -0,0 +1,96 @@
+# routes/api.py
+
+from __future__ import annotations
+
+from flask import Blueprint, jsonify, request, session
+
+from .auth import login_required
+from services import api_service, nutrition_service, sync_service
+from services.nutrition_service import TRACKER_DEFINITIONS
+
+api_bp = Blueprint('api', __name__)
+
+
+def _error(message: str, status: int = 400):
+    return jsonify({'error': message}), status
+
+
+def _requested_fields() -> list[str]:
+    raw = request.args.get('fields') or ''
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+@api_bp.get('/sync')
+@login_required
+def sync():
+    try:
+        since = sync_service.parse_since(request.args.get('since'))
+    except ValueError as exc:
+        return _error(str(exc))
+
+    changes = sync_service.get_changes(
+        session['user_id'],
+        since,
+        limit=request.args.get('limit', sync_service.DEFAULT_SYNC_LIMIT),
+    )
+    return jsonify(changes)
+
+
+@api_bp.get('/nutrition/rollups')
+@login_required
+def nutrition_rollups():
+    period = request.args.get('period', 'week')
+    if period not in nutrition_service.ROLLUP_PERIODS:
+        return _error('Periodo non valido.')
+
+    try:
+        buckets = nutrition_service.fetch_nutrition_rollups(
+            session['user_id'],
+            period,
+            date_from=api_service.parse_date(request.args.get('from')),
+            date_to=api_service.parse_date(request.args.get('to')),
+        )
+    except ValueError as exc:
+        return _error(str(exc))
+
+    return jsonify({'period': period, 'buckets': buckets})
+
+
+@api_bp.get('/intake/summary')
+@login_required
+def intake_summary():
+    try:
+        summary = nutrition_service.fetch_intake_summary(
+            session['user_id'],
+            [tracker['key'] for tracker in TRACKER_DEFINITIONS],
+            days=request.args.get('days', nutrition_service.DEFAULT_INTAKE_SUMMARY_DAYS),
+            date_to=api_service.parse_date(request.args.get('to')),
+        )
+    except ValueError as exc:
+        return _error(str(exc))
+
+    summary['units'] = {tracker['key']: tracker['unit'] for tracker in TRACKER_DEFINITIONS}
+    return jsonify(summary)
+
+
+@api_bp.get('/<resource>')
+@login_required
+def list_resource(resource):
+    if resource not in api_service.RESOURCE_NAMES:
+        return _error('Risorsa non trovata.', 404)
+
+    try:
+        page = api_service.fetch_page(
+            resource,
+            session['user_id'],
+            cursor=request.args.get('cursor'),
+            fields=_requested_fields(),
+            date_from=api_service.parse_date(request.args.get('from')),
+            date_to=api_service.parse_date(request.args.get('to')),
+            limit=request.args.get('limit', api_service.DEFAULT_PAGE_SIZE),
+            ascending=request.args.get('order') == 'asc',
+        )
+    except ValueError as exc:
+        return _error(str(exc))
+
+    return jsonify(page)
@@ -1,14 +1,31 @@
 # routes/gym.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app
+from flask import Blueprint, make_response, render_template, request, redirect, url_for, session, flash, jsonify, current_app
 from datetime import date, datetime, timedelta
 from collections import defaultdict
 from .auth import login_required
+from concurrency import concurrency_class
 from utils import execute_query
 from sqlalchemy.exc import IntegrityError
 from extensions import db
-from services.workout_service import get_templates_with_history, get_session_log_data
-from services.suggestion_service import get_catalog_suggestions, resolve_catalog_item
+from services.workout_service import (
+    SESSION_TIMESTAMP_PATTERN,
+    autosave_draft,
+    discard_draft,
+    fetch_exercise_progression,
+    fetch_exercise_sessions_page,
+    fetch_gym_diary_page,
+    finalize_workout_draft,
+    get_exercise_records,
+    get_session_log_data,
+    get_templates_with_history,
+    load_open_draft,
+    parse_session_cursor,
+    parse_workout_form,
+    save_workout_session,
+)
+from services.suggestion_service import get_catalog_suggestions, invalidate_suggestion_cache, resolve_catalog_item
+from services import catalog_service
 
 gym_bp = Blueprint('gym', __name__)
 
@@ -98,10 +115,17 @@ def esercizi():
                     except IntegrityError:
                         db.session.rollback()
                         flash(f"Errore: Esiste già un esercizio con il nome '{new_name}'.", 'danger')
+        invalidate_suggestion_cache('exercises', None if is_superuser else user_id)
+        if is_superuser:
+            catalog_service.invalidate_global_catalog('exercises')
         return redirect(url_for('gym.esercizi'))
 
-    query = "SELECT e.id, e.name, e.user_id, uen.notes FROM exercises e LEFT JOIN user_exercise_notes uen ON e.id = uen.exercise_id AND uen.user_id = :user_id WHERE e.user_id IS NULL OR e.user_id = :user_id ORDER BY e.name"
-    exercises = execute_query(query, {'user_id': user_id}, fetchall=True)
+    notes_rows = execute_query('SELECT exercise_id, notes FROM user_exercise_notes WHERE user_id = :user_id', {'user_id': user_id}, fetchall=True) or []
+    notes_by_exercise = {row['exercise_id']: row['notes'] for row in notes_rows}
+    exercises = [
+        {**exercise, 'notes': notes_by_exercise.get(exercise['id'])}
+        for exercise in catalog_service.list_catalog('exercises', user_id)
+    ]
     return render_template('esercizi.html', title='Esercizi', exercises=exercises, is_superuser=is_superuser)
 
 @gym_bp.route('/scheda', methods=['GET', 'POST'])
@@ -194,7 +218,7 @@ def modifica_scheda_dettaglio(template_id):
         return redirect(url_for('gym.modifica_scheda_dettaglio', template_id=template_id))
 
     current_exercises = execute_query('SELECT te.id, e.id as exercise_id, e.name, te.sets FROM template_exercises te JOIN exercises e ON te.exercise_id = e.id WHERE te.template_id = :tid ORDER BY te.display_order, te.id', {'tid': template_id}, fetchall=True)
-    all_exercises = execute_query('SELECT id, name, user_id FROM exercises WHERE user_id IS NULL OR user_id = :uid ORDER BY name', {'uid': user_id}, fetchall=True)
+    all_exercises = catalog_service.list_catalog('exercises', user_id)
 
     return render_template('modifica_scheda.html', 
                            title=f'Modifica {template["name"]}', 
@@ -218,6 +242,14 @@ def esercizio_info(exercise_id):
     return render_template('esercizio_info.html', title=exercise['name'], exercise=exercise)
 
 
+def _exercise_sessions_page(user_id, exercise_id):
+    try:
+        before = parse_session_cursor(request.args.get('before'))
+    except ValueError:
+        before = None
+    return fetch_exercise_sessions_page(user_id, exercise_id, before)
+
+
 @gym_bp.route('/esercizio/<int:exercise_id>')
 @login_required
 def esercizio_dettaglio(exercise_id):
@@ -226,17 +258,110 @@ def esercizio_dettaglio(exercise_id):
     if not exercise:
         return redirect(url_for('gym.esercizi'))
 
-    query = "SELECT wl.record_date, wl.session_timestamp, wl.set_number, wl.reps, wl.weight FROM workout_log wl WHERE wl.user_id = :user_id AND wl.exercise_id = :eid ORDER BY wl.record_date DESC, wl.session_timestamp DESC, wl.id ASC"
-    history_raw = execute_query(query, {'user_id': user_id, 'eid': exercise_id}, fetchall=True)
+    sessions, next_cursor = _exercise_sessions_page(user_id, exercise_id)
+    records = get_exercise_records(user_id, exercise_id)
+    return render_template('esercizio_dettaglio.html', title=f"Progressione - {exercise['name']}", exercise=exercise, sessions=sessions, next_cursor=next_cursor, is_first_page=not request.args.get('before'), records=records)
+
+
+@gym_bp.get('/esercizio/<int:exercise_id>/sessioni')
+@login_required
+def esercizio_dettaglio_sessioni(exercise_id):
+    sessions, next_cursor = _exercise_sessions_page(session['user_id'], exercise_id)
+    response = make_response(render_template('esercizio_dettaglio_sessioni.html', sessions=sessions))
+    if next_cursor:
+        response.headers['X-Next-Url'] = url_for('gym.esercizio_dettaglio_sessioni', exercise_id=exercise_id, before=next_cursor)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@gym_bp.get('/api/exercises/<int:exercise_id>/progression')
+@login_required
+def exercise_progression(exercise_id):
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Data non valida.'}), 400
+    bucket = request.args.get('bucket') or None
+    try:
+        series = fetch_exercise_progression(session['user_id'], exercise_id, date_from=date_from, date_to=date_to, bucket=bucket)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify({'exercise_id': exercise_id, 'bucket': bucket, 'series': series})
+
+def _parse_session_details(values):
+    """Read the session fields shared by the form and the finalize endpoint."""
+    duration_minutes = None
+    manual_duration_value = str(values.get('duration_minutes_manual') or '').strip()
+    if manual_duration_value:
+        try:
+            manual_duration = int(manual_duration_value)
+            if manual_duration >= 0: duration_minutes = manual_duration
+        except (ValueError, TypeError):
+            pass
+    if duration_minutes is None:
+        duration_minutes = 0
+        start_timestamp_ms = values.get('start_timestamp')
+        if start_timestamp_ms:
+            try:
+                start_time = datetime.fromtimestamp(int(start_timestamp_ms) / 1000)
+                duration_minutes = max(0, int((datetime.now() - start_time).total_seconds() / 60))
+            except (ValueError, TypeError): pass
+    session_rating = None
+    session_rating_value = str(values.get('session_rating') or '').strip()
+    if session_rating_value:
+        try:
+            parsed_rating = int(session_rating_value)
+            if 1 <= parsed_rating <= 10: session_rating = parsed_rating
+        except (ValueError, TypeError):
+            pass
+    return {
+        'template_name': values.get('template_name', 'Allenamento Libero'),
+        'duration_minutes': duration_minutes,
+        'session_note': str(values.get('session_note') or '').strip() or None,
+        'session_rating': session_rating,
+    }
 
-    sessions = defaultdict(lambda: {'date_formatted': '', 'sets': []})
-    for row in history_raw:
-        ts = row['session_timestamp']
-        if not sessions[ts]['date_formatted']:
-            sessions[ts]['date_formatted'] = row['record_date'].strftime('%d %b %y')
-        sessions[ts]['sets'].append(dict(row))
 
-    return render_template('esercizio_dettaglio.html', title=f"Progressione - {exercise['name']}", exercise=exercise, sessions=sessions)
+@gym_bp.route('/api/gym/sessions/<session_ts>/draft', methods=['PATCH', 'DELETE'])
+@login_required
+def workout_draft(session_ts):
+    user_id = session['user_id']
+    if not SESSION_TIMESTAMP_PATTERN.match(session_ts):
+        return jsonify({'error': 'Sessione non valida.'}), 400
+    if request.method == 'DELETE':
+        discard_draft(user_id, session_ts)
+        return '', 204
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        record_date = datetime.strptime(str(payload.get('record_date') or ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Data non valida.'}), 400
+    try:
+        if not autosave_draft(user_id, session_ts, record_date.isoformat(), payload):
+            return jsonify({'error': 'Allenamento già salvato.'}), 409
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    except IntegrityError:
+        return jsonify({'error': 'Esercizio non valido.'}), 400
+    return '', 204
+
+
+@gym_bp.post('/api/gym/sessions/<session_ts>/finalize')
+@login_required
+def finalize_workout(session_ts):
+    if not SESSION_TIMESTAMP_PATTERN.match(session_ts):
+        return jsonify({'error': 'Sessione non valida.'}), 400
+    details = _parse_session_details(request.get_json(silent=True) or {})
+    try:
+        session_id = finalize_workout_draft(session['user_id'], session_ts, details)
+    except (IntegrityError, ValueError):
+        return jsonify({'error': 'Si è verificato un errore durante il salvataggio.'}), 400
+    if session_id is None:
+        return jsonify({'error': 'Nessuna bozza da salvare.'}), 404
+    return jsonify({'id': session_id}), 201
+
 
 @gym_bp.route('/sessione_palestra', defaults={'date_param': None}, methods=['GET', 'POST'])
 @gym_bp.route('/sessione_palestra/<date_param>', methods=['GET', 'POST'])
@@ -254,65 +379,35 @@ def sessione_palestra(date_param, session_ts=None):
     is_today = (current_date == date.today())
 
     if request.method == 'POST':
-        session_timestamp = session_ts if session_ts else datetime.now().strftime('%Y%m%d%H%M%S')
-        template_name = request.form.get('template_name', 'Allenamento Libero')
-        start_timestamp_ms = request.form.get('start_timestamp')
-        manual_duration_value = (request.form.get('duration_minutes_manual') or '').strip()
-        duration_minutes = None
-        if manual_duration_value:
-            try:
-                manual_duration = int(manual_duration_value)
-                if manual_duration >= 0: duration_minutes = manual_duration
-            except (ValueError, TypeError):
-                manual_duration = None
-        if duration_minutes is None:
-            duration_minutes = 0
-            if start_timestamp_ms:
-                try:
-                    start_time = datetime.fromtimestamp(int(start_timestamp_ms) / 1000)
-                    duration_minutes = max(0, int((datetime.now() - start_time).total_seconds() / 60))
-                except (ValueError, TypeError): pass
-        session_note = (request.form.get('session_note') or '').strip()
-        session_rating_value = (request.form.get('session_rating') or '').strip()
-        session_rating = None
-        if session_rating_value:
-            try:
-                parsed_rating = int(session_rating_value)
-                if 1 <= parsed_rating <= 10: session_rating = parsed_rating
-            except (ValueError, TypeError):
-                parsed_rating = None
-        session_query = "INSERT INTO workout_sessions (user_id, session_timestamp, record_date, template_name, duration_minutes, session_note, session_rating) VALUES (:uid, :ts, :rd, :tn, :dur, :note, :rating) ON CONFLICT(session_timestamp) DO UPDATE SET template_name = EXCLUDED.template_name, duration_minutes = EXCLUDED.duration_minutes, session_note = EXCLUDED.session_note, session_rating = EXCLUDED.session_rating"
-        execute_query(session_query, {'uid': user_id, 'ts': session_timestamp, 'rd': record_date, 'tn': template_name, 'dur': duration_minutes, 'note': session_note or None, 'rating': session_rating}, commit=True)
+        draft_session = request.form.get('draft_session') or ''
         if session_ts:
-            execute_query('DELETE FROM workout_log WHERE user_id = :user_id AND session_timestamp = :ts', {'user_id': user_id, 'ts': session_ts}, commit=True)
-            execute_query('DELETE FROM workout_session_comments WHERE user_id = :user_id AND session_timestamp = :ts', {'user_id': user_id, 'ts': session_ts}, commit=True)
-        latest_weight_data = execute_query('SELECT weight FROM daily_data WHERE user_id = :user_id AND weight IS NOT NULL ORDER BY record_date DESC LIMIT 1', {'user_id': user_id}, fetchone=True)
-        latest_weight = latest_weight_data['weight'] if latest_weight_data else 0
-        has_data = False
-        for key, reps_str in request.form.items():
-            if key.startswith('reps_'):
-                if not reps_str: continue
-                parts = key.split('_'); exercise_id = int(parts[1]); set_number = int(parts[2])
-                weight_str = request.form.get(f'weight_{exercise_id}_{set_number}', '').lower()
-                final_weight = latest_weight if weight_str in ['io', 'me'] and latest_weight > 0 else 0
-                if weight_str not in ['io', 'me']:
-                    try: final_weight = float(weight_str)
-                    except (ValueError, TypeError): final_weight = 0
-                try: final_reps = int(reps_str)
-                except (ValueError, TypeError): final_reps = 0
-                if final_reps > 0 and final_weight >= 0:
-                    has_data = True
-                    execute_query('INSERT INTO workout_log (user_id, exercise_id, record_date, session_timestamp, set_number, reps, weight) VALUES (:uid, :eid, :rd, :ts, :set, :reps, :w)', {'uid': user_id, 'eid': exercise_id, 'rd': record_date, 'ts': session_timestamp, 'set': set_number, 'reps': final_reps, 'w': final_weight}, commit=True)
-        if not has_data:
+            session_timestamp = session_ts
+        elif SESSION_TIMESTAMP_PATTERN.match(draft_session):
+            session_timestamp = draft_session
+        else:
+            session_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        details = _parse_session_details(request.form)
+        sets, comments = parse_workout_form(request.form)
+        # A form without sets can still finalize the autosaved draft.
+        from_draft = not sets and not session_ts and draft_session == session_timestamp
+        if not sets and not from_draft:
             flash('Nessun dato valido inserito. Allenamento non salvato.', 'warning')
-            execute_query('DELETE FROM workout_sessions WHERE session_timestamp = :ts', {'ts': session_timestamp}, commit=True)
             return redirect(url_for('gym.sessione_palestra', date_param=record_date))
-        for key, comment in request.form.items():
-            if key.startswith('comment_'):
-                exercise_id = int(key.split('_')[1])
-                if comment:
-                    comment_query = "INSERT INTO workout_session_comments (user_id, session_timestamp, exercise_id, comment) VALUES (:uid, :ts, :eid, :comm) ON CONFLICT(user_id, session_timestamp, exercise_id) DO UPDATE SET comment=EXCLUDED.comment"
-                    execute_query(comment_query, {'uid': user_id, 'ts': session_timestamp, 'eid': exercise_id, 'comm': comment}, commit=True)
+        try:
+            if from_draft:
+                saved = finalize_workout_draft(user_id, session_timestamp, details)
+            else:
+                saved = save_workout_session(user_id, session_timestamp, record_date, details, sets, comments, replace=bool(session_ts))
+        except (IntegrityError, ValueError):
+            current_app.logger.warning('Salvataggio allenamento %s non riuscito', session_timestamp, exc_info=True)
+            saved = None
+            from_draft = False
+        if saved is None:
+            if from_draft:
+                flash('Nessun dato valido inserito. Allenamento non salvato.', 'warning')
+            else:
+                flash('Si è verificato un errore durante il salvataggio.', 'danger')
+            return redirect(url_for('gym.sessione_palestra', date_param=record_date))
         flash('Allenamento salvato con successo!', 'success')
         return redirect(url_for('gym.diario_palestra'))
 
@@ -332,12 +427,27 @@ def sessione_palestra(date_param, session_ts=None):
     elif selected_template_id is None and requested_template_id is not None:
         selected_template_id = requested_template_id
     log_data = get_session_log_data(user_id, session_ts) if session_ts else {}
+    # New sessions resume the day's autosaved draft, possibly from another device.
+    open_draft = None if session_ts else load_open_draft(user_id, record_date)
+    if open_draft:
+        session_timestamp, log_data = open_draft
+    else:
+        session_timestamp = session_ts if session_ts else datetime.now().strftime('%Y%m%d%H%M%S')
     cancel_url = url_for('gym.diario_palestra') if session_ts else url_for('gym.palestra')
 
-    return render_template('sessione_palestra.html', title='Sessione Palestra', templates=templates, log_data=log_data, record_date=record_date, date_formatted=date_formatted, prev_day=prev_day, next_day=next_day, is_today=is_today, is_editing=(session_ts is not None), session_timestamp=session_ts if session_ts else datetime.now().strftime('%Y%m%d%H%M%S'), selected_template_id=selected_template_id, selected_template_name=selected_template_name, session_duration_minutes=stored_duration_minutes, cancel_url=cancel_url)
+    return render_template('sessione_palestra.html', title='Sessione Palestra', templates=templates, log_data=log_data, record_date=record_date, date_formatted=date_formatted, prev_day=prev_day, next_day=next_day, is_today=is_today, is_editing=(session_ts is not None), session_timestamp=session_timestamp, draft_restored=bool(open_draft), selected_template_id=selected_template_id, selected_template_name=selected_template_name, session_duration_minutes=stored_duration_minutes, cancel_url=cancel_url)
+
+def _gym_diary_page(user_id):
+    try:
+        before = parse_session_cursor(request.args.get('before'))
+    except ValueError:
+        before = None
+    return fetch_gym_diary_page(user_id, before)
+
 
 @gym_bp.route('/diario_palestra', methods=['GET', 'POST'])
 @login_required
+@concurrency_class('heavy')
 def diario_palestra():
     user_id = session['user_id']
     if request.method == 'POST':
@@ -346,33 +456,16 @@ def diario_palestra():
         flash('Allenamento eliminato con successo.', 'success')
         return redirect(url_for('gym.diario_palestra'))
 
-    logs_raw = execute_query('SELECT wl.record_date, wl.session_timestamp, e.name as exercise_name, wl.set_number, wl.reps, wl.weight FROM workout_log wl JOIN exercises e ON wl.exercise_id = e.id WHERE wl.user_id = :uid ORDER BY wl.record_date DESC, wl.session_timestamp DESC, wl.id ASC', {'uid': user_id}, fetchall=True)
-    sessions_raw = execute_query('SELECT session_timestamp, duration_minutes, template_name, session_note, session_rating FROM workout_sessions WHERE user_id = :uid', {'uid': user_id}, fetchall=True)
-    sessions_info = {s['session_timestamp']: dict(s) for s in sessions_raw}
-
-    workouts_by_day = defaultdict(lambda: {'date_formatted': '', 'template_names': [], 'sessions': defaultdict(lambda: {'time_formatted': '', 'duration': None, 'template_name': 'Allenamento Libero', 'session_note': None, 'session_rating': None, 'exercises': defaultdict(list)})})
-    for row in logs_raw:
-        day, ts, ex_name = row['record_date'], row['session_timestamp'], row['exercise_name']
-        workouts_by_day[day]['date_formatted'] = day.strftime('%d %b %y')
-        session_details = sessions_info.get(ts, {})
-        s_data = workouts_by_day[day]['sessions'][ts]
-        s_data['time_formatted'] = datetime.strptime(ts, '%Y%m%d%H%M%S').strftime('%H:%M')
-        s_data['duration'] = session_details.get('duration_minutes')
-        template_name = session_details.get('template_name') or 'Allenamento Libero'
-        s_data['template_name'] = template_name
-        s_data['session_note'] = session_details.get('session_note')
-        s_data['session_rating'] = session_details.get('session_rating')
-        if template_name not in workouts_by_day[day]['template_names']:
-            workouts_by_day[day]['template_names'].append(template_name)
-        s_data['exercises'][ex_name].append({'set': row['set_number'], 'reps': row['reps'], 'weight': row['weight']})
-    
-    final_workouts = {}
-    for day, data in workouts_by_day.items():
-        sessions_payload = {}
-        for ts, s_data in data['sessions'].items():
-            session_dict = dict(s_data)
-            session_dict['exercises'] = {name: sets for name, sets in s_data['exercises'].items()}
-            sessions_payload[ts] = session_dict
-        final_workouts[day] = {'date_formatted': data['date_formatted'], 'template_names': data['template_names'], 'sessions': sessions_payload}
-        
-    return render_template('diario_palestra.html', title='Diario Palestra', workouts_by_day=final_workouts)
\ No newline at end of file
+    days, next_cursor = _gym_diary_page(user_id)
+    return render_template('diario_palestra.html', title='Diario Palestra', days=days, next_cursor=next_cursor, is_first_page=not request.args.get('before'))
+
+
+@gym_bp.get('/diario_palestra/giorni')
+@login_required
+def diario_palestra_giorni():
+    days, next_cursor = _gym_diary_page(session['user_id'])
+    response = make_response(render_template('diario_palestra_giorni.html', days=days))
+    if next_cursor:
+        response.headers['X-Next-Url'] = url_for('gym.diario_palestra_giorni', before=next_cursor)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
\ No newline at end of file
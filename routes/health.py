@@ -3,6 +3,8 @@ from __future__ import annotations
 from flask import Blueprint, jsonify, current_app
 from sqlalchemy import text
 
+from .auth import admin_required, login_required
+from concurrency import concurrency_snapshot
 from extensions import db
 
 health_bp = Blueprint('health', __name__)
@@ -19,3 +21,10 @@ def healthcheck():
         return jsonify({'status': 'error'}), 500
 
     return jsonify({'status': 'ok'}), 200
+
+
+@health_bp.route('/healthz/concurrency', methods=['GET'])
+@login_required
+@admin_required
+def concurrency_metrics():
+    return jsonify({'classes': concurrency_snapshot()}), 200
@@ -1,10 +1,12 @@
 # routes/main.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_from_directory, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_from_directory, current_app, make_response
 from datetime import datetime, date, timedelta
+import hashlib
 import math
 from collections import defaultdict
 from .auth import login_required
+from concurrency import concurrency_class
 from utils import execute_query, is_valid_time_format
 from services import user_service, data_service
 from services import privacy_service
@@ -31,6 +33,10 @@ def home():
     if session.get('is_admin'): return redirect(url_for('admin.admin_generale'))
     return render_template('home.html', title='Home')
 
+@concurrency_class('heavy')
+def _export_user_data(user_id):
+    return data_service.export_user_data(user_id)
+
 @main_bp.route('/impostazioni', methods=['GET', 'POST'])
 @login_required
 def impostazioni():
@@ -43,7 +49,7 @@ def impostazioni():
             return redirect(url_for('main.impostazioni'))
         
         elif action == 'export_data':
-            return data_service.export_user_data(user_id)
+            return _export_user_data(user_id)
         
         elif action == 'delete_account':
             return user_service.handle_account_deletion(user_id, request.form.get('password_confirm'))
@@ -54,8 +60,16 @@ def impostazioni():
 @main_bp.route('/privacy')
 @login_required
 def privacy():
-    privacy_text = privacy_service.get_privacy_text()
-    return render_template('privacy.html', title='Privacy', privacy_text=privacy_text)
+    version = privacy_service.get_privacy_version()
+    etag = hashlib.sha256(f"{current_app.config.get('APP_VERSION', '')}:{version}".encode()).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        privacy_text = privacy_service.get_privacy_text()
+        response = make_response(render_template('privacy.html', title='Privacy', privacy_text=privacy_text))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @main_bp.route('/utente', methods=['GET', 'POST'])
 @login_required
@@ -1,16 +1,18 @@
 # routes/nutrition.py
 from __future__ import annotations
 
+import math
 from datetime import date, datetime, timedelta
 from typing import Iterable, Optional
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from sqlalchemy import inspect, text
+from flask import Blueprint, current_app, make_response, render_template, request, redirect, url_for, session, flash, jsonify
 from sqlalchemy.exc import IntegrityError
 
 from .auth import login_required
 from extensions import db
-from services.suggestion_service import get_catalog_suggestions, resolve_catalog_item
+from services import adherence_service, catalog_service, nutrition_service, recipe_service
+from services.nutrition_service import TRACKER_DEFINITIONS, TRACKER_LOOKUP
+from services.suggestion_service import get_catalog_suggestions, invalidate_suggestion_cache, resolve_catalog_item
 from utils import execute_query
 
 nutrition_bp = Blueprint('nutrition', __name__)
@@ -26,49 +28,24 @@ def suggest_foods():
     return jsonify({'results': suggestions})
 
 
-TRACKER_DEFINITIONS = [
-    {
-        'key': 'water',
-        'label': 'Acqua',
-        'unit': 'ml',
-        'unit_singular': 'ml',
-        'unit_plural': 'ml',
-        'icon': 'bi-droplet',
-        'description': 'Monitora rapidamente quanta acqua bevi durante la giornata.',
-        'quick_add': [250, 500, 750],
-        'input_step': 50,
-        'placeholder': 'Quantità in ml',
-        'goal_hint': 'Suggerimento: punta a 2-3 litri al giorno.'
-    },
-    {
-        'key': 'coffee',
-        'label': 'Caffè',
-        'unit': 'tazze',
-        'unit_singular': 'tazza',
-        'unit_plural': 'tazze',
-        'icon': 'bi-cup-hot',
-        'description': 'Tieni sotto controllo il numero di caffè che assumi.',
-        'quick_add': [1, 2],
-        'input_step': 1,
-        'placeholder': 'Numero di tazze',
-        'goal_hint': 'Suggerimento: limita il consumo serale.'
-    },
-    {
-        'key': 'supplements',
-        'label': 'Integratori',
-        'unit': 'dosi',
-        'unit_singular': 'dose',
-        'unit_plural': 'dosi',
-        'icon': 'bi-capsule',
-        'description': 'Segna se hai assunto i tuoi integratori quotidiani.',
-        'quick_add': [1],
-        'input_step': 1,
-        'placeholder': 'Numero di dosi',
-        'goal_hint': 'Aggiungi una nota per ricordare quali integratori hai preso.'
-    },
-]
-
-TRACKER_LOOKUP = {tracker['key']: tracker for tracker in TRACKER_DEFINITIONS}
+@nutrition_bp.get('/api/catalog/foods')
+@login_required
+def food_catalog():
+    user_id = session['user_id']
+    version = catalog_service.get_catalog_version('foods', user_id)
+
+    if request.if_none_match.contains(version):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({'version': version, 'items': catalog_service.fetch_catalog('foods', user_id)})
+    response.set_etag(version)
+    # Pages reference the catalog with ``?v=<version>``; such URLs never change content.
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 
 DEFAULT_TARGETS = {
     'days_on': 3,
@@ -82,46 +59,6 @@ DEFAULT_TARGETS = {
 }
 
 
-_INTAKE_LOG_READY = False
-
-
-def ensure_intake_log_table() -> None:
-    """Guarantee the intake_log table exists before interacting with it."""
-
-    global _INTAKE_LOG_READY
-
-    if _INTAKE_LOG_READY:
-        return
-
-    inspector = inspect(db.engine)
-
-    if inspector.has_table('intake_log'):
-        _INTAKE_LOG_READY = True
-        return
-
-    statements = (
-        """
-        CREATE TABLE IF NOT EXISTS intake_log (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
-            record_date DATE NOT NULL,
-            tracker_type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            unit TEXT NOT NULL,
-            note TEXT,
-            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        )
-        """,
-        "CREATE INDEX IF NOT EXISTS idx_intake_log_user_date ON intake_log (user_id, record_date)",
-    )
-
-    with db.engine.begin() as connection:
-        for statement in statements:
-            connection.execute(text(statement))
-
-    _INTAKE_LOG_READY = True
-
-
 def _format_number(value: Optional[float]):
     if value is None:
         return '0'
@@ -229,15 +166,6 @@ def _fetch_intake_entries(user_id: int, date_str: str) -> list[dict]:
     return rows or []
 
 
-def _calculate_tracker_totals(entries: Iterable[dict]) -> dict[str, float]:
-    totals = {tracker['key']: 0.0 for tracker in TRACKER_DEFINITIONS}
-    for row in entries:
-        tracker_key = row.get('tracker_type')
-        if tracker_key in totals:
-            totals[tracker_key] += row.get('amount') or 0
-    return totals
-
-
 def _parse_amount(quick_amount: Optional[str], amount_value: Optional[str]) -> float:
     try:
         return float(quick_amount or amount_value or 0)
@@ -293,29 +221,6 @@ def _fetch_diet_log(user_id: int, date_str: str) -> list[dict]:
     ) or []
 
 
-def _fetch_food_options(user_id: int) -> list[dict]:
-    raw_food_options = execute_query(
-        """
-        SELECT id, name, user_id IS NULL AS is_global
-        FROM foods
-        WHERE user_id IS NULL OR user_id = :uid
-        ORDER BY CASE WHEN user_id IS NULL THEN 0 ELSE 1 END,
-                 LOWER(name) ASC,
-                 name ASC
-        """,
-        {'uid': user_id},
-        fetchall=True,
-    ) or []
-    return [
-        {
-            'id': row['id'],
-            'name': row['name'],
-            'is_global': bool(row['is_global']),
-        }
-        for row in raw_food_options
-    ]
-
-
 def _calculate_diet_totals(entries: Iterable[dict]) -> dict[str, float]:
     totals = {'protein': 0.0, 'carbs': 0.0, 'fat': 0.0, 'calories': 0.0}
     for item in entries:
@@ -396,67 +301,34 @@ def _calculate_macro_overview(latest_weight: float, targets: dict) -> dict[str,
 
     return calcs
 
-def update_daily_totals(user_id, date_str):
-    totals_query = """
-        SELECT SUM(protein) as p, SUM(carbs) as c, SUM(fat) as f, SUM(calories) as cal
-        FROM diet_log WHERE user_id = :user_id AND log_date = :date_str
-    """
-    totals = execute_query(totals_query, {'user_id': user_id, 'date_str': date_str}, fetchone=True)
-    
-    total_protein = totals.get('p') or 0
-    total_carbs = totals.get('c') or 0
-    total_fat = totals.get('f') or 0
-    total_calories = totals.get('cal') or 0
-    
-    upsert_query = """
-        INSERT INTO daily_data (user_id, record_date, total_protein, total_carbs, total_fat, calories) 
-        VALUES (:user_id, :date_str, :tp, :tc, :tf, :cal)
-        ON CONFLICT(user_id, record_date) DO UPDATE SET 
-        total_protein = EXCLUDED.total_protein, total_carbs = EXCLUDED.total_carbs, 
-        total_fat = EXCLUDED.total_fat, calories = EXCLUDED.calories
-    """
-    execute_query(upsert_query, {'user_id': user_id, 'date_str': date_str, 'tp': total_protein, 'tc': total_carbs, 'tf': total_fat, 'cal': total_calories}, commit=True)
+def _insert_diet_entry(user_id: int, food_id, weight: float, log_date: str) -> bool:
+    try:
+        food_id = int(food_id)
+    except (TypeError, ValueError):
+        return False
+    return nutrition_service.add_diet_entries(user_id, log_date, [(food_id, weight)]) > 0
 
 
 def _handle_dieta_post(user_id: int, current_date_str: str) -> tuple[Optional[str], Optional[str]]:
     action = request.form.get('action')
 
     if action == 'add_food':
-        food_data = resolve_catalog_item(
-            'foods',
-            user_id,
-            entry_id=request.form.get('food_id'),
-            name=request.form.get('food_name'),
-        )
         try:
             weight = float(request.form.get('weight', 0))
         except (ValueError, TypeError):
             weight = 0
 
-        if not (food_data and weight > 0):
-            return 'danger', "Seleziona un alimento valido dall'archivio e inserisci un peso maggiore di zero."
+        error = "Seleziona un alimento valido dall'archivio e inserisci un peso maggiore di zero."
+        if not math.isfinite(weight) or weight <= 0:
+            return 'danger', error
 
-        factor = weight / food_data['ref_weight']
-        protein = food_data['protein'] * factor
-        carbs = food_data['carbs'] * factor
-        fat = food_data['fat'] * factor
-        calories = (protein * 4) + (carbs * 4) + (fat * 9)
-        execute_query(
-            'INSERT INTO diet_log (user_id, food_id, weight, protein, carbs, fat, calories, log_date) '
-            'VALUES (:uid, :fid, :w, :p, :c, :f, :cal, :ld)',
-            {
-                'uid': user_id,
-                'fid': food_data['id'],
-                'w': weight,
-                'p': protein,
-                'c': carbs,
-                'f': fat,
-                'cal': calories,
-                'ld': current_date_str,
-            },
-            commit=True,
-        )
-        update_daily_totals(user_id, current_date_str)
+        # The daily totals are updated by the diet_log triggers in the same statement.
+        if _insert_diet_entry(user_id, request.form.get('food_id'), weight, current_date_str):
+            return None, None
+
+        food_data = resolve_catalog_item('foods', user_id, name=request.form.get('food_name'))
+        if not (food_data and _insert_diet_entry(user_id, food_data['id'], weight, current_date_str)):
+            return 'danger', error
         return None, None
 
     if action == 'delete_entry':
@@ -466,9 +338,71 @@ def _handle_dieta_post(user_id: int, current_date_str: str) -> tuple[Optional[st
             {'id': entry_id, 'uid': user_id},
             commit=True,
         )
-        update_daily_totals(user_id, current_date_str)
         return None, None
 
+    if action == 'log_meal':
+        try:
+            meal_id = int(request.form.get('meal_id'))
+        except (TypeError, ValueError):
+            return 'danger', 'Pasto non valido.'
+        if not nutrition_service.log_saved_meal(user_id, meal_id, current_date_str):
+            return 'danger', 'Pasto non trovato o senza alimenti.'
+        return None, None
+
+    if action == 'save_meal':
+        name = (request.form.get('meal_name') or '').strip()
+        if not name:
+            return 'danger', 'Inserisci un nome per il pasto.'
+        try:
+            entry_ids = [int(entry_id) for entry_id in request.form.getlist('entry_ids')]
+        except ValueError:
+            return 'danger', 'Selezione non valida.'
+        if not nutrition_service.save_meal_from_entries(user_id, name, entry_ids):
+            return 'danger', 'Seleziona almeno un alimento da salvare nel pasto.'
+        return 'success', f"Pasto '{name}' salvato."
+
+    if action == 'save_recipe':
+        name = (request.form.get('meal_name') or '').strip()
+        if not name:
+            return 'danger', 'Inserisci un nome per la ricetta.'
+        try:
+            entry_ids = [int(entry_id) for entry_id in request.form.getlist('entry_ids')]
+        except ValueError:
+            return 'danger', 'Selezione non valida.'
+        try:
+            cooked_weight = recipe_service.parse_cooked_weight(request.form.get('cooked_weight'))
+            recipe_id = recipe_service.create_recipe_from_entries(
+                user_id, name, entry_ids, current_date_str, cooked_weight
+            )
+        except ValueError as exc:
+            return 'danger', str(exc)
+        if recipe_id is None:
+            return 'danger', 'Seleziona almeno un alimento da usare come ingrediente.'
+        invalidate_suggestion_cache('foods', user_id)
+        return 'success', f"Ricetta '{name}' salvata nel tuo archivio alimenti."
+
+    if action == 'delete_meal':
+        try:
+            meal_id = int(request.form.get('meal_id'))
+        except (TypeError, ValueError):
+            return 'danger', 'Pasto non valido.'
+        if nutrition_service.delete_saved_meal(user_id, meal_id):
+            return 'success', 'Pasto eliminato.'
+        return 'danger', 'Pasto non trovato.'
+
+    if action == 'copy_day':
+        try:
+            source_date = datetime.strptime(request.form.get('source_date') or '', '%Y-%m-%d').date()
+        except ValueError:
+            return 'danger', 'Data non valida.'
+        try:
+            copied = nutrition_service.copy_diet_day(user_id, source_date.isoformat(), current_date_str)
+        except ValueError as exc:
+            return 'danger', str(exc)
+        if not copied:
+            return 'warning', 'Nessun alimento registrato nel giorno selezionato.'
+        return 'success', f"Copiati {copied} alimenti dal {source_date.strftime('%d/%m/%Y')}."
+
     if action == 'set_day_type':
         day_type = request.form.get('day_type')
         query = """
@@ -480,6 +414,104 @@ def _handle_dieta_post(user_id: int, current_date_str: str) -> tuple[Optional[st
 
     return None, None
 
+@nutrition_bp.post('/api/diet/<date_str>/entries')
+@login_required
+def add_diet_entries(date_str):
+    try:
+        log_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Data non valida.'}), 400
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        items = nutrition_service.parse_meal_items(payload.get('items') or [])
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    inserted = nutrition_service.add_diet_entries(session['user_id'], log_date.isoformat(), items)
+    if inserted != len(items):
+        current_app.logger.info('Batch dieta: %s alimenti su %s ignorati', len(items) - inserted, len(items))
+    return jsonify({'inserted': inserted, 'skipped': len(items) - inserted}), 201
+
+
+@nutrition_bp.post('/api/diet/<date_str>/copy')
+@login_required
+def copy_diet_day(date_str):
+    payload = request.get_json(silent=True) or {}
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        source_date = datetime.strptime(str(payload.get('from') or ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Data non valida.'}), 400
+
+    food_ids = payload.get('food_ids')
+    if food_ids is not None:
+        try:
+            food_ids = [int(food_id) for food_id in food_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Alimenti non validi.'}), 400
+
+    try:
+        copied = nutrition_service.copy_diet_day(
+            session['user_id'], source_date.isoformat(), target_date.isoformat(), food_ids
+        )
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify({'copied': copied}), 201
+
+
+def _parse_recipe_payload() -> tuple[list, Optional[float]]:
+    payload = request.get_json(silent=True) or {}
+    items = nutrition_service.parse_meal_items(payload.get('items') or [])
+    return items, recipe_service.parse_cooked_weight(payload.get('cooked_weight'))
+
+
+@nutrition_bp.post('/api/recipes')
+@login_required
+def create_recipe():
+    user_id = session['user_id']
+    name = ((request.get_json(silent=True) or {}).get('name') or '').strip()
+    if not name:
+        return jsonify({'error': 'Inserisci un nome per la ricetta.'}), 400
+    try:
+        items, cooked_weight = _parse_recipe_payload()
+        recipe_id = recipe_service.create_recipe(user_id, name, items, cooked_weight)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    invalidate_suggestion_cache('foods', user_id)
+    return jsonify({'id': recipe_id}), 201
+
+
+@nutrition_bp.put('/api/recipes/<int:recipe_id>')
+@login_required
+def update_recipe(recipe_id):
+    user_id = session['user_id']
+    try:
+        items, cooked_weight = _parse_recipe_payload()
+        updated = recipe_service.update_recipe(user_id, recipe_id, items, cooked_weight)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    if not updated:
+        return jsonify({'error': 'Ricetta non trovata.'}), 404
+    invalidate_suggestion_cache('foods', user_id)
+    return jsonify({'id': recipe_id})
+
+
+@nutrition_bp.get('/api/nutrition/adherence')
+@login_required
+def macro_adherence():
+    user_id = session['user_id']
+    try:
+        report = adherence_service.build_adherence_report(
+            user_id,
+            _fetch_macro_targets(user_id),
+            series_days=request.args.get('days', adherence_service.DEFAULT_SERIES_DAYS),
+        )
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify(report)
+
+
 @nutrition_bp.route('/alimentazione')
 @login_required
 def alimentazione():
@@ -491,7 +523,6 @@ def alimentazione():
 @login_required
 def tracking(date_str):
     user_id = session['user_id']
-    ensure_intake_log_table()
     current_date, current_date_str, prev_day, next_day, is_today = _parse_date_or_today(date_str)
 
     if request.method == 'POST':
@@ -501,7 +532,7 @@ def tracking(date_str):
         return redirect(url_for('nutrition.tracking', date_str=current_date_str))
 
     rows = _fetch_intake_entries(user_id, current_date_str)
-    totals = _calculate_tracker_totals(rows)
+    totals = nutrition_service.fetch_intake_totals(user_id, current_date_str, TRACKER_LOOKUP)
     tracker_cards = _build_tracker_cards(rows, totals)
 
     return render_template(
@@ -516,20 +547,40 @@ def tracking(date_str):
         is_date_sensitive_page=True,
     )
 
+def _fetch_diary_entries(user_id: int) -> tuple[list[dict], Optional[str]]:
+    try:
+        before = datetime.strptime(request.args['before'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        before = None
+    rows, next_cursor = nutrition_service.fetch_diary_page(user_id, before)
+    entries = [{'date_formatted': row['record_date'].strftime('%d %b %y'), **row} for row in rows]
+    return entries, next_cursor
+
+
 @nutrition_bp.route('/diario_alimentare')
 @login_required
 def diario_alimentare():
-    user_id = session['user_id']
-    query = """
-        SELECT record_date, total_protein, total_carbs, total_fat, calories, day_type 
-        FROM daily_data WHERE user_id = :user_id AND (total_protein > 0 OR total_carbs > 0 OR total_fat > 0 OR calories > 0) 
-        ORDER BY record_date DESC
-    """
-    daily_summary = execute_query(query, {'user_id': user_id}, fetchall=True)
-    
-    entries = [{'date_formatted': row['record_date'].strftime('%d %b %y'), **row} for row in daily_summary]
-    return render_template('diario_alimentare.html', title='Diario Alimentare', entries=entries)
-    
+    entries, next_cursor = _fetch_diary_entries(session['user_id'])
+    return render_template(
+        'diario_alimentare.html',
+        title='Diario Alimentare',
+        entries=entries,
+        next_cursor=next_cursor,
+        is_first_page=not request.args.get('before'),
+    )
+
+
+@nutrition_bp.get('/diario_alimentare/righe')
+@login_required
+def diario_alimentare_righe():
+    entries, next_cursor = _fetch_diary_entries(session['user_id'])
+    response = make_response(render_template('diario_alimentare_righe.html', entries=entries))
+    if next_cursor:
+        response.headers['X-Next-Url'] = url_for('nutrition.diario_alimentare_righe', before=next_cursor)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
 @nutrition_bp.route('/dieta', defaults={'date_str': None}, methods=['GET', 'POST'])
 @nutrition_bp.route('/dieta/<date_str>', methods=['GET', 'POST'])
 @login_required
@@ -544,7 +595,8 @@ def dieta(date_str):
         return redirect(url_for('nutrition.dieta', date_str=current_date_str))
 
     diet_log = _fetch_diet_log(user_id, current_date_str)
-    food_options = _fetch_food_options(user_id)
+    food_catalog_version = catalog_service.get_catalog_version('foods', user_id)
+    saved_meals = nutrition_service.list_saved_meals(user_id)
     totals = _calculate_diet_totals(diet_log)
     targets_config = _fetch_macro_targets(user_id)
     latest_weight = _latest_weight(user_id)
@@ -565,7 +617,8 @@ def dieta(date_str):
         prev_day=prev_day,
         next_day=next_day,
         is_today=is_today,
-        food_options=food_options,
+        food_catalog_version=food_catalog_version,
+        saved_meals=saved_meals,
         is_date_sensitive_page=True,
     )
 
@@ -638,11 +691,14 @@ def alimenti():
             else:
                 flash('Inserisci un nome valido per rinominare l\'alimento.', 'danger')
 
+        invalidate_suggestion_cache('foods', None if is_superuser else user_id)
+        if is_superuser:
+            catalog_service.invalidate_global_catalog('foods')
         if food_id:
             return redirect(url_for('nutrition.alimenti', _anchor=f"food-{food_id}"))
         return redirect(url_for('nutrition.alimenti'))
 
-    foods = execute_query('SELECT * FROM foods WHERE user_id IS NULL OR user_id = :uid ORDER BY name', {'uid': user_id}, fetchall=True)
+    foods = catalog_service.list_catalog('foods', user_id)
     return render_template('alimenti.html', title='Database Alimenti', foods=foods, is_superuser=is_superuser)
 
 @nutrition_bp.route('/macros', methods=['GET', 'POST'])
@@ -685,5 +741,13 @@ def macros():
 
     targets = _fetch_macro_targets(user_id)
     calcs = _calculate_macro_overview(latest_weight, targets)
+    adherence = adherence_service.build_adherence_report(user_id, targets, series_days=0)
 
-    return render_template('macros.html', title='Macros', targets=targets, latest_weight=latest_weight, calcs=calcs)
\ No newline at end of file
+    return render_template(
+        'macros.html',
+        title='Macros',
+        targets=targets,
+        latest_weight=latest_weight,
+        calcs=calcs,
+        adherence=adherence,
+    )
\ No newline at end of file
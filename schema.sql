@@ -164,12 +164,14 @@ CREATE TABLE template_exercises (
 CREATE TABLE workout_sessions (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
-    session_timestamp TEXT NOT NULL UNIQUE,
+    session_timestamp TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
     record_date DATE NOT NULL,
     template_name TEXT,
     duration_minutes INTEGER,
     session_note TEXT,
     session_rating INTEGER CHECK (session_rating BETWEEN 1 AND 10),
+    CONSTRAINT workout_sessions_user_timestamp_key UNIQUE (user_id, session_timestamp),
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
 );
 
@@ -179,23 +181,26 @@ CREATE TABLE workout_log (
     exercise_id INTEGER NOT NULL,
     record_date DATE NOT NULL,
     session_timestamp TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
     set_number INTEGER NOT NULL,
     reps INTEGER NOT NULL,
     weight REAL NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
     FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE,
-    FOREIGN KEY (session_timestamp) REFERENCES workout_sessions(session_timestamp) ON DELETE CASCADE
+    FOREIGN KEY (session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
 );
 
 CREATE TABLE workout_session_comments (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
     session_timestamp TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
     exercise_id INTEGER NOT NULL,
     comment TEXT,
     UNIQUE(user_id, session_timestamp, exercise_id),
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-    FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE
+    FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE,
+    FOREIGN KEY (session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS privacy_settings (
@@ -223,6 +228,191 @@ CREATE INDEX IF NOT EXISTS idx_daily_data_user_date ON daily_data(user_id, recor
 CREATE INDEX IF NOT EXISTS idx_diet_log_user_date ON diet_log(user_id, log_date);
 CREATE INDEX IF NOT EXISTS idx_cardio_log_user_date ON cardio_log(user_id, record_date);
 CREATE INDEX IF NOT EXISTS idx_workout_log_user_date ON workout_log(user_id, record_date);
-CREATE INDEX IF NOT EXISTS idx_workout_log_user_exercise ON workout_log(user_id, exercise_id);
 CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date ON workout_sessions(user_id, record_date);
-CREATE INDEX IF NOT EXISTS idx_user_login_activity_user_time ON user_login_activity(user_id, login_at DESC);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_user_login_activity_user_time ON user_login_activity(user_id, login_at DESC);
+CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date_id ON workout_sessions(user_id, record_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_workout_log_user_date_id ON workout_log(user_id, record_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_cardio_log_user_date_id ON cardio_log(user_id, record_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_diet_log_user_date_id ON diet_log(user_id, log_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_intake_log_user_date_id ON intake_log(user_id, record_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_daily_data_user_date_id ON daily_data(user_id, record_date DESC, id DESC);
+
+-- Registro delle modifiche per la sincronizzazione (trigger creati dalla migrazione 0010)
+CREATE TABLE IF NOT EXISTS sync_changes (
+    version BIGSERIAL PRIMARY KEY,
+    user_id INTEGER,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    op CHAR(1) NOT NULL CHECK (op IN ('U', 'D')),
+    changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    tombstone_horizon BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO sync_state (id, tombstone_horizon) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_sync_changes_user_version ON sync_changes(user_id, version);
+CREATE INDEX IF NOT EXISTS idx_sync_changes_global_version ON sync_changes(version) WHERE user_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_sync_changes_row ON sync_changes(table_name, row_id, version);
+
+-- Versioni dei cataloghi (trigger creati dalla migrazione 0012; scope_id 0 = catalogo globale)
+CREATE SEQUENCE IF NOT EXISTS catalog_version_seq;
+
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    resource TEXT NOT NULL,
+    scope_id INTEGER NOT NULL,
+    version BIGINT NOT NULL,
+    PRIMARY KEY (resource, scope_id)
+);
+
+-- Ricerca nei cataloghi: foods.name_search ed exercises.name_search (colonne generate
+-- con logbook_search_normalize) e i relativi indici pg_trgm sono creati dalla migrazione 0013.
+
+-- Pasti salvati (migrazione 0014)
+CREATE TABLE IF NOT EXISTS saved_meals (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS saved_meal_items (
+    id SERIAL PRIMARY KEY,
+    meal_id INTEGER NOT NULL REFERENCES saved_meals (id) ON DELETE CASCADE,
+    food_id INTEGER NOT NULL REFERENCES foods (id) ON DELETE CASCADE,
+    weight REAL NOT NULL CHECK (weight > 0),
+    position INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_meal_items_meal ON saved_meal_items(meal_id, position);
+CREATE INDEX IF NOT EXISTS idx_saved_meal_items_food ON saved_meal_items(food_id);
+
+-- Riepiloghi nutrizionali settimanali e mensili (trigger su daily_data creati dalla migrazione 0015)
+CREATE TABLE IF NOT EXISTS nutrition_rollups (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    period TEXT NOT NULL CHECK (period IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    total_protein DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_carbs DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_fat DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_calories BIGINT NOT NULL DEFAULT 0,
+    logged_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period, period_start)
+);
+
+-- Diario alimentare paginato (migrazione 0016)
+CREATE INDEX IF NOT EXISTS idx_daily_data_user_logged_date ON daily_data(user_id, record_date DESC)
+    WHERE total_protein > 0 OR total_carbs > 0 OR total_fat > 0 OR calories > 0;
+
+-- Importazione dei dump di alimenti (migrazione 0017)
+CREATE UNLOGGED TABLE IF NOT EXISTS food_dump_staging (
+    source TEXT NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    line BIGINT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    ref_weight REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    calories REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_food_dump_staging_source ON food_dump_staging(source, chunk_no);
+
+CREATE TABLE IF NOT EXISTS food_dump_chunks (
+    source TEXT NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    staged INTEGER NOT NULL,
+    invalid INTEGER NOT NULL,
+    loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, chunk_no)
+);
+
+-- Ricette (migrazione 0018): alimenti i cui macro sono calcolati dagli ingredienti
+CREATE TABLE IF NOT EXISTS recipes (
+    food_id INTEGER PRIMARY KEY REFERENCES foods (id) ON DELETE CASCADE,
+    cooked_weight REAL CHECK (cooked_weight IS NULL OR cooked_weight > 0)
+);
+
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    id SERIAL PRIMARY KEY,
+    recipe_id INTEGER NOT NULL REFERENCES recipes (food_id) ON DELETE CASCADE,
+    ingredient_id INTEGER NOT NULL REFERENCES foods (id) ON DELETE CASCADE,
+    weight REAL NOT NULL CHECK (weight > 0),
+    position INTEGER NOT NULL DEFAULT 0,
+    CHECK (recipe_id <> ingredient_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe ON recipe_ingredients(recipe_id, position);
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient ON recipe_ingredients(ingredient_id);
+
+-- Bozze delle sessioni di palestra in corso (migrazione 0019)
+CREATE TABLE IF NOT EXISTS workout_draft_sets (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    session_timestamp TEXT NOT NULL,
+    exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+    set_number INTEGER NOT NULL CHECK (set_number > 0),
+    record_date DATE NOT NULL,
+    reps TEXT NOT NULL DEFAULT '',
+    weight TEXT NOT NULL DEFAULT '',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, session_timestamp, exercise_id, set_number)
+);
+
+CREATE TABLE IF NOT EXISTS workout_draft_comments (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    session_timestamp TEXT NOT NULL,
+    exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+    record_date DATE NOT NULL,
+    comment TEXT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, session_timestamp, exercise_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_workout_draft_sets_user_date ON workout_draft_sets(user_id, record_date);
+
+-- Record personali per esercizio (migrazione 0020); mantenuti dai trigger su workout_log
+CREATE TABLE IF NOT EXISTS exercise_records (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+    e1rm_epley REAL,
+    e1rm_epley_date DATE,
+    e1rm_brzycki REAL,
+    e1rm_brzycki_date DATE,
+    best_volume DOUBLE PRECISION,
+    best_volume_date DATE,
+    PRIMARY KEY (user_id, exercise_id)
+);
+
+CREATE TABLE IF NOT EXISTS exercise_rep_records (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+    reps INTEGER NOT NULL CHECK (reps > 0),
+    weight REAL NOT NULL,
+    record_date DATE NOT NULL,
+    PRIMARY KEY (user_id, exercise_id, reps)
+);
+
+-- Progressione per esercizio (migrazione 0021, sostituisce idx_workout_log_user_exercise)
+CREATE INDEX IF NOT EXISTS idx_workout_log_user_exercise_date ON workout_log(user_id, exercise_id, record_date DESC, session_timestamp DESC);
+
+-- Diario palestra paginato (migrazione 0022)
+CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date_ts ON workout_sessions(user_id, record_date DESC, session_timestamp DESC);
+
+-- Ultime sessioni per esercizio (migrazione 0023); mantenute dai trigger su workout_log e workout_session_comments
+CREATE TABLE IF NOT EXISTS exercise_last_sessions (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    exercise_id INTEGER NOT NULL REFERENCES exercises (id) ON DELETE CASCADE,
+    sessions JSONB NOT NULL,
+    complete BOOLEAN NOT NULL,
+    PRIMARY KEY (user_id, exercise_id)
+);
+
+-- Chiavi di sessione per utente (migrazione 0024)
+CREATE INDEX IF NOT EXISTS idx_workout_log_session ON workout_log(session_id);
+CREATE INDEX IF NOT EXISTS idx_workout_session_comments_session ON workout_session_comments(session_id);
@@ -0,0 +1,199 @@
+"""Macro adherence report computed over a user's whole nutrition history."""
+
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+
+from extensions import db
+
+# A day is adherent when protein, carbs and fat are all within this fraction
+# of the day's target.
+ADHERENCE_TOLERANCE = 0.10
+ROLLING_WINDOWS = (7, 28)
+DEFAULT_SERIES_DAYS = 28
+MAX_SERIES_DAYS = 366
+
+_MACROS = ('protein', 'carbs', 'fat')
+_TARGET_KEYS = {'protein': 'p', 'carbs': 'c', 'fat': 'f'}
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last non-NaN value forward; leading NaNs stay NaN."""
+
+    positions = np.where(np.isnan(values), 0, np.arange(values.size))
+    np.maximum.accumulate(positions, out=positions)
+    return values[positions]
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    totals = np.cumsum(values, dtype=np.float64)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+
+def _streaks(flags: np.ndarray) -> np.ndarray:
+    """Length of the run of ``True`` ending at each position."""
+
+    counts = np.cumsum(flags)
+    resets = np.maximum.accumulate(np.where(flags, 0, counts))
+    return counts - resets
+
+
+def _rate(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _scalar(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 3)
+
+
+def compute_adherence(
+    dates: Sequence,
+    protein: Sequence,
+    carbs: Sequence,
+    fat: Sequence,
+    weight: Sequence,
+    day_types: Sequence,
+    targets: Mapping[str, float],
+    *,
+    tolerance: float = ADHERENCE_TOLERANCE,
+    series_days: int = DEFAULT_SERIES_DAYS,
+) -> Dict[str, object]:
+    """Compare daily intake with the ON/OFF targets, vectorized over all days.
+
+    The inputs are the sparse ``daily_data`` rows in date order. They are
+    spread over a dense day range ending at the last logged day; body weight
+    is forward-filled and days without a type count as ON, as on ``/dieta``.
+    Days are evaluated once they have logged macros and a known weight.
+    """
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    macros = {
+        'protein': np.asarray(protein, dtype=np.float64),
+        'carbs': np.asarray(carbs, dtype=np.float64),
+        'fat': np.asarray(fat, dtype=np.float64),
+    }
+    logged_rows = np.nan_to_num(macros['protein'] + macros['carbs'] + macros['fat']) > 0
+    if not logged_rows.any():
+        return {'days_evaluated': 0}
+
+    start = dates[0]
+    end = dates[logged_rows][-1]
+    size = int((end - start).astype(np.int64)) + 1
+    keep = dates <= end
+    positions = (dates[keep] - start).astype(np.int64)
+
+    def dense(values: np.ndarray, fill: float) -> np.ndarray:
+        out = np.full(size, fill, dtype=np.float64)
+        out[positions] = values[keep]
+        return out
+
+    actual = {name: np.nan_to_num(dense(values, 0.0)) for name, values in macros.items()}
+    body_weight = _forward_fill(dense(np.asarray(weight, dtype=np.float64), np.nan))
+    is_off = np.zeros(size, dtype=bool)
+    is_off[positions] = np.asarray(day_types, dtype=object)[keep] == 'OFF'
+
+    target = {
+        name: np.where(is_off, targets[f'{key}_off'], targets[f'{key}_on']) * body_weight
+        for name, key in _TARGET_KEYS.items()
+    }
+    actual['calories'] = actual['protein'] * 4 + actual['carbs'] * 4 + actual['fat'] * 9
+    target['calories'] = target['protein'] * 4 + target['carbs'] * 4 + target['fat'] * 9
+    delta = {name: actual[name] - target[name] for name in actual}
+
+    logged = (actual['protein'] + actual['carbs'] + actual['fat']) > 0
+    evaluated = logged & ~np.isnan(body_weight)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        within = [
+            np.abs(delta[name]) <= tolerance * target[name]
+            for name in _MACROS
+        ]
+    adherent = evaluated & np.logical_and.reduce(within)
+
+    rolling = {
+        window: _rate(_rolling_sum(adherent, window), _rolling_sum(evaluated, window))
+        for window in ROLLING_WINDOWS
+    }
+    streaks = _streaks(adherent)
+
+    evaluated_count = int(evaluated.sum())
+    report: Dict[str, object] = {
+        'start': str(start),
+        'end': str(end),
+        'tolerance': tolerance,
+        'days_tracked': size,
+        'days_evaluated': evaluated_count,
+        'days_adherent': int(adherent.sum()),
+        'adherence_rate': _scalar(adherent.sum() / evaluated_count) if evaluated_count else None,
+        'rolling': {str(window): _scalar(values[-1]) for window, values in rolling.items()},
+        'current_streak': int(streaks[-1]),
+        'longest_streak': int(streaks.max()),
+        'average_delta': {
+            name: _scalar(values[evaluated].mean()) if evaluated_count else None
+            for name, values in delta.items()
+        },
+    }
+
+    day_numbers = np.arange(max(size - series_days, 0), size)
+    series: List[Dict[str, object]] = []
+    for index in day_numbers[evaluated[day_numbers]]:
+        series.append({
+            'date': str(start + index),
+            'day_type': 'OFF' if is_off[index] else 'ON',
+            'actual': {name: round(float(values[index]), 1) for name, values in actual.items()},
+            'target': {name: round(float(values[index]), 1) for name, values in target.items()},
+            'adherent': bool(adherent[index]),
+            'rolling': {str(window): _scalar(values[index]) for window, values in rolling.items()},
+        })
+    report['series'] = series
+    return report
+
+
+def build_adherence_report(
+    user_id: int,
+    targets: Mapping[str, float],
+    *,
+    series_days: object = DEFAULT_SERIES_DAYS,
+) -> Dict[str, object]:
+    """Load the user's full ``daily_data`` history and compute the report."""
+
+    try:
+        series_days = int(series_days)
+    except (TypeError, ValueError):
+        raise ValueError('Numero di giorni non valido.') from None
+    if not 0 <= series_days <= MAX_SERIES_DAYS:
+        raise ValueError(f'Il numero di giorni deve essere tra 0 e {MAX_SERIES_DAYS}.')
+
+    # Dates come back as day numbers since the epoch: converting integers to
+    # ``datetime64[D]`` is much cheaper than converting ``datetime.date`` objects.
+    rows = db.session.execute(
+        text(
+            """
+            SELECT record_date - DATE '1970-01-01' AS day_number,
+                   total_protein, total_carbs, total_fat, weight, day_type
+            FROM daily_data
+            WHERE user_id = :uid
+            ORDER BY record_date
+            """
+        ),
+        {'uid': user_id},
+    ).all()
+    if not rows:
+        return {'days_evaluated': 0}
+
+    day_numbers, protein, carbs, fat, weight, day_types = zip(*rows)
+    return compute_adherence(
+        np.asarray(day_numbers, dtype=np.int64).astype('datetime64[D]'),
+        protein,
+        carbs,
+        fat,
+        weight,
+        day_types,
+        targets,
+        series_days=series_days,
+    )
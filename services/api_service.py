@@ -0,0 +1,252 @@
+"""Keyset-paginated read access to the user diaries for the JSON API."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from utils import execute_query
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Each resource maps public field names to SQL expressions. ``record_date`` and
+# ``id`` are always the keyset columns, so every definition must expose them.
+_RESOURCES: Dict[str, Dict[str, object]] = {
+    'workouts': {
+        'source': 'workout_sessions ws',
+        'owner': 'ws.user_id',
+        'fields': {
+            'id': 'ws.id',
+            'record_date': 'ws.record_date',
+            'session_timestamp': 'ws.session_timestamp',
+            'started_at': 'ws.started_at',
+            'template_name': 'ws.template_name',
+            'duration_minutes': 'ws.duration_minutes',
+            'session_note': 'ws.session_note',
+            'session_rating': 'ws.session_rating',
+        },
+    },
+    'workout_sets': {
+        'source': 'workout_log wl JOIN exercises e ON e.id = wl.exercise_id',
+        'owner': 'wl.user_id',
+        'fields': {
+            'id': 'wl.id',
+            'record_date': 'wl.record_date',
+            'session_timestamp': 'wl.session_timestamp',
+            'session_id': 'wl.session_id',
+            'exercise_id': 'wl.exercise_id',
+            'exercise_name': 'e.name',
+            'set_number': 'wl.set_number',
+            'reps': 'wl.reps',
+            'weight': 'wl.weight',
+        },
+    },
+    'cardio': {
+        'source': 'cardio_log cl',
+        'owner': 'cl.user_id',
+        'fields': {
+            'id': 'cl.id',
+            'record_date': 'cl.record_date',
+            'location': 'cl.location',
+            'activity_type': 'cl.activity_type',
+            'distance_km': 'cl.distance_km',
+            'duration_min': 'cl.duration_min',
+            'incline': 'cl.incline',
+        },
+    },
+    'diet': {
+        'source': 'diet_log dl JOIN foods f ON f.id = dl.food_id',
+        'owner': 'dl.user_id',
+        'fields': {
+            'id': 'dl.id',
+            'record_date': 'dl.log_date',
+            'food_id': 'dl.food_id',
+            'food_name': 'f.name',
+            'weight': 'dl.weight',
+            'protein': 'dl.protein',
+            'carbs': 'dl.carbs',
+            'fat': 'dl.fat',
+            'calories': 'dl.calories',
+        },
+    },
+    'intake': {
+        'source': 'intake_log il',
+        'owner': 'il.user_id',
+        'fields': {
+            'id': 'il.id',
+            'record_date': 'il.record_date',
+            'tracker_type': 'il.tracker_type',
+            'amount': 'il.amount',
+            'unit': 'il.unit',
+            'note': 'il.note',
+            'created_at': 'il.created_at',
+        },
+    },
+    'metrics': {
+        'source': 'daily_data dd',
+        'owner': 'dd.user_id',
+        'fields': {
+            'id': 'dd.id',
+            'record_date': 'dd.record_date',
+            'weight': 'dd.weight',
+            'weight_time': 'dd.weight_time',
+            'sleep': 'dd.sleep',
+            'sleep_quality': 'dd.sleep_quality',
+            'neck': 'dd.neck',
+            'waist': 'dd.waist',
+            'hip': 'dd.hip',
+            'measure_time': 'dd.measure_time',
+            'bfp_manual': 'dd.bfp_manual',
+            'total_protein': 'dd.total_protein',
+            'total_carbs': 'dd.total_carbs',
+            'total_fat': 'dd.total_fat',
+            'calories': 'dd.calories',
+            'day_type': 'dd.day_type',
+        },
+    },
+}
+
+RESOURCE_NAMES: Tuple[str, ...] = tuple(_RESOURCES)
+
+
+def encode_cursor(record_date: date, row_id: int) -> str:
+    """Return an opaque cursor pointing after ``(record_date, row_id)``."""
+
+    payload = json.dumps([record_date.isoformat(), int(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Decode a cursor created by :func:`encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        raw_date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return date.fromisoformat(raw_date), int(row_id)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as exc:
+        raise ValueError('Cursore non valido.') from exc
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Parse an optional ``YYYY-MM-DD`` filter value."""
+
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError as exc:
+        raise ValueError(f'Data non valida: {value!r}.') from exc
+
+
+def _select_fields(definition: Mapping[str, object], requested: Optional[Sequence[str]]) -> List[str]:
+    available: Mapping[str, str] = definition['fields']  # type: ignore[assignment]
+    if not requested:
+        return list(available)
+
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValueError(f"Campi non supportati: {', '.join(sorted(unknown))}.")
+
+    # The keyset columns are always returned so that clients can build cursors.
+    selected = ['id', 'record_date']
+    selected.extend(name for name in requested if name not in selected)
+    return selected
+
+
+def _serialise_value(value: object) -> object:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def serialise_row(row: Mapping[str, object]) -> Dict[str, object]:
+    """Return a JSON-friendly copy of ``row`` with ISO formatted dates."""
+
+    return {key: _serialise_value(value) for key, value in row.items()}
+
+
+def fetch_page(
+    resource: str,
+    user_id: int,
+    *,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    ascending: bool = False,
+) -> Dict[str, object]:
+    """Return one keyset page of ``resource`` rows owned by ``user_id``.
+
+    Rows are ordered by ``(record_date, id)`` (newest first unless
+    ``ascending``) and the returned ``next_cursor`` resumes strictly after the
+    last row of the page, so the cost of a page never depends on its offset.
+
+    Raises:
+        ValueError: For unknown resources, fields or malformed cursors.
+    """
+
+    definition = _RESOURCES.get(resource)
+    if definition is None:
+        raise ValueError(f'Risorsa non supportata: {resource!r}.')
+
+    columns = _select_fields(definition, fields)
+    expressions: Mapping[str, str] = definition['fields']  # type: ignore[assignment]
+    date_expr = expressions['record_date']
+    id_expr = expressions['id']
+
+    try:
+        page_size = int(limit)
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+
+    conditions = [f"{definition['owner']} = :uid"]
+    params: Dict[str, object] = {'uid': user_id, 'limit': page_size + 1}
+
+    if date_from is not None:
+        conditions.append(f'{date_expr} >= :date_from')
+        params['date_from'] = date_from
+    if date_to is not None:
+        conditions.append(f'{date_expr} <= :date_to')
+        params['date_to'] = date_to
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        comparator = '>' if ascending else '<'
+        conditions.append(f'({date_expr}, {id_expr}) {comparator} (:cursor_date, :cursor_id)')
+        params['cursor_date'] = cursor_date
+        params['cursor_id'] = cursor_id
+
+    direction = 'ASC' if ascending else 'DESC'
+    select_list = ', '.join(f'{expressions[name]} AS {name}' for name in columns)
+    rows = execute_query(
+        f"""
+        SELECT {select_list}
+        FROM {definition['source']}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {date_expr} {direction}, {id_expr} {direction}
+        LIMIT :limit
+        """,
+        params,
+        fetchall=True,
+    ) or []
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last['record_date'], last['id'])
+
+    return {
+        'data': [{name: _serialise_value(row[name]) for name in columns} for row in rows],
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,185 @@
+"""Read helpers for the food and exercise catalogs."""
+
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from utils import execute_query
+
+_TABLE_MAP = {
+    'foods': 'foods',
+    'exercises': 'exercises',
+}
+
+# Numeric columns kept for each catalog besides ``id`` and ``name``.
+_NUMERIC_COLUMNS = {
+    'foods': ('ref_weight', 'protein', 'carbs', 'fat', 'calories'),
+    'exercises': (),
+}
+
+# Mutations made by this process invalidate the cache immediately; other
+# workers notice the new global version within this many seconds.
+GLOBAL_CATALOG_REVALIDATE_SECONDS = 30.0
+
+
+def _table_for(resource: str) -> str:
+    table_name = _TABLE_MAP.get(resource)
+    if table_name is None:
+        raise ValueError(f'Unsupported catalog resource: {resource!r}')
+    return table_name
+
+
+def _sort_key(row: Dict[str, object]):
+    name = str(row['name'])
+    return (name.lower(), name)
+
+
+class GlobalCatalog:
+    """Immutable snapshot of the global rows of one catalog.
+
+    Rows are stored column-wise in name order (``array`` for ids and numeric
+    columns) and materialised as dictionaries only when a caller asks for them.
+    """
+
+    __slots__ = ('resource', 'version', 'ids', 'names', 'columns', 'checked_at')
+
+    def __init__(self, resource: str, version: int, rows: Iterable[Dict[str, object]]) -> None:
+        ordered = sorted(rows, key=_sort_key)
+        self.resource = resource
+        self.version = version
+        self.ids = array('q', (int(row['id']) for row in ordered))
+        self.names = tuple(str(row['name']) for row in ordered)
+        self.columns = {
+            column: array('d', (float(row[column] or 0) for row in ordered))
+            for column in _NUMERIC_COLUMNS[resource]
+        }
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, position: int) -> Dict[str, object]:
+        row: Dict[str, object] = {'id': self.ids[position], 'name': self.names[position], 'user_id': None}
+        for column, values in self.columns.items():
+            row[column] = values[position]
+        return row
+
+    def rows(self) -> List[Dict[str, object]]:
+        return [self.row(position) for position in range(len(self.ids))]
+
+
+_global_lock = threading.Lock()
+_global_catalogs: Dict[str, GlobalCatalog] = {}
+
+
+def _global_version(table_name: str) -> int:
+    row = execute_query(
+        "SELECT version FROM catalog_versions WHERE resource = :resource AND scope_id = 0",
+        {'resource': table_name},
+        fetchone=True,
+    )
+    return int(row['version']) if row else 0
+
+
+def get_global_catalog(resource: str, *, revalidate: bool = False) -> GlobalCatalog:
+    """Return the cached global catalog, reloading it when its version moved.
+
+    ``revalidate`` forces the version check even inside the revalidation
+    window, for responses that clients cache under a version token.
+    """
+
+    table_name = _table_for(resource)
+    with _global_lock:
+        catalog = _global_catalogs.get(resource)
+        now = time.monotonic()
+        fresh = catalog is not None and now - catalog.checked_at < GLOBAL_CATALOG_REVALIDATE_SECONDS
+        if fresh and not revalidate:
+            return catalog
+
+        version = _global_version(table_name)
+        if catalog is not None and catalog.version == version:
+            catalog.checked_at = now
+            return catalog
+
+        columns = ', '.join(('id', 'name') + _NUMERIC_COLUMNS[resource])
+        rows = execute_query(
+            f"SELECT {columns} FROM {table_name} WHERE user_id IS NULL",
+            fetchall=True,
+        ) or []
+        catalog = _global_catalogs[resource] = GlobalCatalog(resource, version, rows)
+        return catalog
+
+
+def invalidate_global_catalog(resource: Optional[str] = None) -> None:
+    """Drop the cached global catalog after an admin or superuser mutation."""
+
+    with _global_lock:
+        if resource is None:
+            _global_catalogs.clear()
+        else:
+            _global_catalogs.pop(resource, None)
+
+
+def fetch_personal_items(resource: str, user_id: int) -> List[Dict[str, object]]:
+    """Return the user's own catalog rows, in name order."""
+
+    columns = ', '.join(('id', 'name', 'user_id') + _NUMERIC_COLUMNS[resource])
+    rows = execute_query(
+        f"SELECT {columns} FROM {_table_for(resource)} WHERE user_id = :uid",
+        {'uid': user_id},
+        fetchall=True,
+    ) or []
+    return sorted(rows, key=_sort_key)
+
+
+def list_catalog(resource: str, user_id: int) -> List[Dict[str, object]]:
+    """Return global and personal rows merged in name order."""
+
+    merged = get_global_catalog(resource).rows() + fetch_personal_items(resource, user_id)
+    merged.sort(key=_sort_key)
+    return merged
+
+
+def get_catalog_version(resource: str, user_id: int) -> str:
+    """Return an opaque token that changes whenever the visible catalog does.
+
+    Triggers on the catalog tables bump one version per scope. The token is
+    ``<user_id>.<global>.<personal>``: both scopes are kept, because versions
+    taken from the shared sequence commit out of order, and a personal bump
+    can be lower than the global version already seen. The user id is part
+    of the token because the personal items differ between users sharing a
+    browser.
+    """
+
+    row = execute_query(
+        """
+        SELECT COALESCE(MAX(version) FILTER (WHERE scope_id = 0), 0) AS global_version,
+               COALESCE(MAX(version) FILTER (WHERE scope_id = :uid), 0) AS personal_version
+        FROM catalog_versions
+        WHERE resource = :resource AND scope_id IN (0, :uid)
+        """,
+        {'resource': _table_for(resource), 'uid': user_id},
+        fetchone=True,
+    ) or {}
+    return f"{user_id}.{row.get('global_version', 0)}.{row.get('personal_version', 0)}"
+
+
+def fetch_catalog(resource: str, user_id: int) -> List[Dict[str, object]]:
+    """Return ``id``/``name``/``is_global`` for every item the user can pick.
+
+    Global items come first, then personal ones, each in name order.
+    """
+
+    global_catalog = get_global_catalog(resource, revalidate=True)
+    items = [
+        {'id': item_id, 'name': name, 'is_global': True}
+        for item_id, name in zip(global_catalog.ids, global_catalog.names)
+    ]
+    items.extend(
+        {'id': row['id'], 'name': row['name'], 'is_global': False}
+        for row in fetch_personal_items(resource, user_id)
+    )
+    return items
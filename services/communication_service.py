@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
-from typing import Final
+from typing import Final, Tuple
 
 from utils import execute_query
+from services.settings_cache import CachedSetting
 
 WELCOME_DEFAULT: Final[str] = (
     "Benvenuto in Logbook! Gli amministratori possono aiutarti a mantenere aggiornati i tuoi dati di allenamento. "
@@ -12,43 +13,27 @@ WELCOME_DEFAULT: Final[str] = (
 )
 
 
-def _ensure_storage() -> None:
-    """Create the storage table and seed row if missing."""
-    execute_query(
-        """
-        CREATE TABLE IF NOT EXISTS communication_settings (
-            id INTEGER PRIMARY KEY DEFAULT 1,
-            welcome_message TEXT NOT NULL DEFAULT '',
-            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
-        )
-        """,
-        commit=True,
-    )
-    execute_query(
-        """
-        INSERT INTO communication_settings (id, welcome_message)
-        VALUES (1, :welcome_message)
-        ON CONFLICT (id) DO NOTHING
-        """,
-        {"welcome_message": WELCOME_DEFAULT},
-        commit=True,
+def _load_welcome_message() -> Tuple[str, str]:
+    row = execute_query(
+        "SELECT welcome_message, updated_at FROM communication_settings WHERE id = 1",
+        fetchone=True,
     )
+    if not row:
+        return WELCOME_DEFAULT, ""
+    version = row["updated_at"].isoformat() if row.get("updated_at") else ""
+    return row.get("welcome_message") or WELCOME_DEFAULT, version
+
+
+_welcome_cache = CachedSetting(_load_welcome_message)
 
 
 def get_welcome_message() -> str:
     """Return the configured welcome message, falling back to the default."""
-    _ensure_storage()
-    row = execute_query(
-        "SELECT welcome_message FROM communication_settings WHERE id = 1",
-        fetchone=True,
-    )
-    message = row.get("welcome_message") if row else None
-    return message or WELCOME_DEFAULT
+    return _welcome_cache.get()[0]
 
 
 def update_welcome_message(message: str) -> None:
     """Persist a new welcome message."""
-    _ensure_storage()
     execute_query(
         """
         INSERT INTO communication_settings (id, welcome_message, updated_at)
@@ -60,3 +45,4 @@ def update_welcome_message(message: str) -> None:
         {"message": message},
         commit=True,
     )
+    _welcome_cache.invalidate()
@@ -0,0 +1,351 @@
+"""Resumable, parallel import of large food-composition dumps into ``foods``.
+
+The dump (Open Food Facts-style JSON Lines or CSV/TSV, optionally gzip, bz2
+or xz compressed) is read record by record in the main process and split into
+fixed-size chunks of records: JSON lines, or rows already parsed by
+``csv.reader`` so that quoted fields spanning several lines are never cut in
+two. Worker processes parse, map and validate each chunk and ``COPY`` it into
+``food_dump_staging``, recording the chunk in ``food_dump_chunks`` in the
+same transaction; that table is the checkpoint a restarted import skips over. A final set-based merge deduplicates by
+normalized name and inserts the new global foods.
+"""
+
+from __future__ import annotations
+
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import json
+import lzma
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, TextIO, Tuple
+
+import psycopg2
+from sqlalchemy import text
+
+from extensions import db
+from services import sync_service
+from services.food_import_service import normalize_food_record
+
+DEFAULT_CHUNK_LINES = 20000
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Tolerance on "macros per 100 g cannot exceed 100 g" for rounded label values.
+MAX_MACROS_PER_100G = 105.0
+
+_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# Preferred name fields, Italian first.
+_NAME_FIELDS = ('product_name_it', 'product_name', 'generic_name_it', 'generic_name')
+_NUTRIENT_FIELDS = {
+    'protein': 'proteins_100g',
+    'carbs': 'carbohydrates_100g',
+    'fat': 'fat_100g',
+}
+
+_STAGING_COLUMNS = (
+    'source', 'chunk_no', 'line', 'name', 'name_key', 'ref_weight', 'protein', 'carbs', 'fat', 'calories',
+)
+
+
+def open_dump(path: str) -> TextIO:
+    """Open a dump for streaming text reads, decompressing by extension."""
+
+    opener = _OPENERS.get(os.path.splitext(path)[1].lower())
+    if opener is None:
+        return open(path, encoding='utf-8', errors='replace', newline='')
+    return opener(path, 'rt', encoding='utf-8', errors='replace', newline='')
+
+
+def dump_format(path: str) -> str:
+    """Return ``'jsonl'`` or ``'csv'`` from the name, ignoring the compression suffix."""
+
+    base, extension = os.path.splitext(path.lower())
+    if extension in _OPENERS:
+        base, extension = os.path.splitext(base)
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if extension in ('.csv', '.tsv'):
+        return 'csv'
+    raise ValueError('Formato non supportato: usa un file .jsonl o .csv (anche compresso).')
+
+
+def source_key(path: str, chunk_lines: int) -> str:
+    """Identify a dump file and chunking so that checkpoints are never mixed."""
+
+    stat = os.stat(path)
+    return f'{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}:{chunk_lines}'
+
+
+def map_dump_record(record: Mapping[str, object]) -> Optional[Dict[str, object]]:
+    """Map an Open Food Facts-style record to the food import fields.
+
+    Nutrients are read per 100 g (``ref_weight`` 100), either from a nested
+    ``nutriments`` object (JSON) or from flat ``*_100g`` columns (CSV).
+    Returns ``None`` when the record has no usable name or macros.
+    """
+
+    name = next((str(record[field]).strip() for field in _NAME_FIELDS if record.get(field)), '')
+    if not name:
+        return None
+    nutriments = record.get('nutriments')
+    source = nutriments if isinstance(nutriments, Mapping) else record
+    mapped: Dict[str, object] = {'name': name, 'ref_weight': 100}
+    for column, field in _NUTRIENT_FIELDS.items():
+        value = source.get(field)
+        if value in (None, ''):
+            return None
+        mapped[column] = value
+    return mapped
+
+
+def read_records(stream: TextIO, fmt: str) -> Tuple[Optional[List[str]], Iterable]:
+    """Return the CSV header (``None`` for JSON Lines) and an iterator of records.
+
+    JSON records are raw lines; CSV records are rows from ``csv.reader`` over
+    the whole stream, so a quoted value containing newlines stays one record.
+    """
+
+    if fmt == 'jsonl':
+        return None, stream
+    first = stream.readline()
+    delimiter = '\t' if '\t' in first else ','
+    reader = csv.reader(itertools.chain([first], stream), delimiter=delimiter)
+    header = [name.strip().lower() for name in next(reader, [])]
+    return header, reader
+
+
+def _parse_records(records: Sequence, fmt: str, header: Optional[List[str]]) -> Iterator[Tuple[int, object]]:
+    """Yield ``(offset, record)``; offsets count blank lines too, so they stay aligned."""
+
+    if fmt == 'jsonl':
+        for offset, line in enumerate(records):
+            if not line.strip():
+                continue
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                yield offset, None
+    else:
+        for offset, row in enumerate(records):
+            yield offset, dict(zip(header or (), row))
+
+
+def stage_rows(
+    source: str,
+    chunk_no: int,
+    first_line: int,
+    records: Sequence,
+    fmt: str,
+    header: Optional[List[str]] = None,
+) -> Tuple[List[tuple], int]:
+    """Parse, map and validate one chunk; return the staging rows and invalid count.
+
+    ``records`` are JSON lines or CSV rows as produced by :func:`read_records`.
+    """
+
+    rows: List[tuple] = []
+    invalid = 0
+    for offset, record in _parse_records(records, fmt, header):
+        mapped = map_dump_record(record) if isinstance(record, Mapping) else None
+        try:
+            if mapped is None:
+                raise ValueError('record senza nome o macronutrienti')
+            staged = normalize_food_record(mapped, first_line + offset)
+        except ValueError:
+            invalid += 1
+            continue
+        # staged = (line, name, name_key, ref_weight, protein, carbs, fat, calories)
+        if sum(staged[4:7]) > MAX_MACROS_PER_100G:
+            invalid += 1
+            continue
+        rows.append((source, chunk_no) + staged)
+    return rows, invalid
+
+
+_worker_connection = None
+
+
+def _init_worker(dsn: str) -> None:
+    global _worker_connection
+    _worker_connection = psycopg2.connect(dsn)
+
+
+def _load_chunk(source, chunk_no, first_line, records, fmt, header) -> Tuple[int, int, int]:
+    """Worker task: stage one chunk and record its checkpoint atomically."""
+
+    rows, invalid = stage_rows(source, chunk_no, first_line, records, fmt, header)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with _worker_connection, _worker_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY food_dump_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        cursor.execute(
+            "INSERT INTO food_dump_chunks (source, chunk_no, staged, invalid) VALUES (%s, %s, %s, %s)",
+            (source, chunk_no, len(rows), invalid),
+        )
+    return chunk_no, len(rows), invalid
+
+
+def iter_chunks(
+    records: Iterable,
+    chunk_lines: int,
+    done: Set[int],
+) -> Iterator[Tuple[int, int, List]]:
+    """Yield ``(chunk_no, first_line, records)`` for chunks not in ``done``.
+
+    Chunks hold ``chunk_lines`` records each; ``first_line`` numbers records,
+    not physical lines. Records of completed chunks are read and dropped
+    without being mapped or staged.
+    """
+
+    iterator = iter(records)
+    chunk_no = 0
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_lines))
+        if not chunk:
+            return
+        if chunk_no not in done:
+            yield chunk_no, chunk_no * chunk_lines + 1, chunk
+        chunk_no += 1
+
+
+def _database_dsn() -> str:
+    return db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+def _completed_chunks(source: str) -> Set[int]:
+    rows = db.session.execute(
+        text("SELECT chunk_no FROM food_dump_chunks WHERE source = :source"),
+        {'source': source},
+    ).scalars()
+    return set(rows)
+
+
+def _merge_staged(source: str) -> Dict[str, int]:
+    try:
+        db.session.execute(text("LOCK TABLE foods IN SHARE ROW EXCLUSIVE MODE"))
+        sync_service.begin_bulk_changes()
+        row = db.session.execute(
+            text(
+                """
+                WITH staged AS (
+                    SELECT DISTINCT ON (name_key) name, name_key, ref_weight, protein, carbs, fat, calories
+                    FROM food_dump_staging
+                    WHERE source = :source
+                    ORDER BY name_key, chunk_no, line
+                ),
+                inserted AS (
+                    INSERT INTO foods (user_id, name, ref_weight, protein, carbs, fat, calories)
+                    SELECT NULL, s.name, s.ref_weight, s.protein, s.carbs, s.fat, s.calories
+                    FROM staged s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM foods f WHERE f.user_id IS NULL AND f.name_search = s.name_key
+                    )
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM staged) AS distinct_names,
+                       (SELECT COUNT(*) FROM inserted) AS inserted
+                """
+            ),
+            {'source': source},
+        ).mappings().one()
+        if row['inserted']:
+            sync_service.record_bulk_change('foods')
+        totals = db.session.execute(
+            text(
+                """
+                SELECT COALESCE(SUM(staged), 0) AS staged, COALESCE(SUM(invalid), 0) AS invalid
+                FROM food_dump_chunks WHERE source = :source
+                """
+            ),
+            {'source': source},
+        ).mappings().one()
+        db.session.execute(text("DELETE FROM food_dump_staging WHERE source = :source"), {'source': source})
+        db.session.execute(text("DELETE FROM food_dump_chunks WHERE source = :source"), {'source': source})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'staged': int(totals['staged']),
+        'invalid': int(totals['invalid']),
+        'distinct_names': int(row['distinct_names']),
+        'inserted': int(row['inserted']),
+    }
+
+
+def reset_checkpoint(source: str) -> None:
+    """Forget staged chunks of a dump so the next run starts from the beginning."""
+
+    try:
+        db.session.execute(text("DELETE FROM food_dump_staging WHERE source = :source"), {'source': source})
+        db.session.execute(text("DELETE FROM food_dump_chunks WHERE source = :source"), {'source': source})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def import_food_dump(
+    path: str,
+    *,
+    workers: int = DEFAULT_WORKERS,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> Dict[str, int]:
+    """Stage every chunk of ``path`` in parallel, then merge into global foods.
+
+    Memory stays bounded: at most ``2 * workers`` chunks are in flight.
+    ``progress(chunk_no, staged, invalid)`` is called as chunks complete.
+    """
+
+    fmt = dump_format(path)
+    source = source_key(path, chunk_lines)
+    done = _completed_chunks(source)
+    # Workers open their own connections; release this process's pool first.
+    db.session.close()
+    db.engine.dispose()
+
+    csv.field_size_limit(1 << 30)
+    with open_dump(path) as stream:
+        header, records = read_records(stream, fmt)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(_database_dsn(),),
+        ) as executor:
+            pending: Set[Future] = set()
+            for chunk_no, first_line, chunk in iter_chunks(records, chunk_lines, done):
+                if header is not None:
+                    first_line += 1
+                pending.add(executor.submit(
+                    _load_chunk, source, chunk_no, first_line, chunk, fmt, header,
+                ))
+                if len(pending) >= 2 * max(1, workers):
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        if progress:
+                            progress(*result)
+            for future in pending:
+                result = future.result()
+                if progress:
+                    progress(*result)
+
+    report = _merge_staged(source)
+    report['resumed_chunks'] = len(done)
+    return report
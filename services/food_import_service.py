@@ -0,0 +1,302 @@
+"""Bulk import of foods from CSV or JSON through a COPY-loaded staging table."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple
+
+from sqlalchemy import text
+
+from extensions import db
+from services import sync_service
+from utils import normalize_search_text
+
+COPY_CHUNK_ROWS = 10000
+MAX_NAME_LENGTH = 200
+MAX_REPORTED_ERRORS = 20
+MAX_REPORTED_CONFLICTS = 50
+IMPORT_FORMATS = ('csv', 'json')
+
+# Accepted column names, Italian or English, for each staging column.
+_COLUMN_ALIASES = {
+    'name': ('name', 'nome', 'alimento'),
+    'ref_weight': ('ref_weight', 'peso_riferimento', 'peso'),
+    'protein': ('protein', 'proteine'),
+    'carbs': ('carbs', 'carboidrati'),
+    'fat': ('fat', 'grassi'),
+}
+
+_STAGING_COLUMNS = ('line', 'name', 'name_key', 'ref_weight', 'protein', 'carbs', 'fat', 'calories')
+
+StagedFood = Tuple[int, str, str, float, float, float, float, float]
+
+
+def detect_format(filename: Optional[str]) -> str:
+    """Guess the import format from a file name (``.csv`` or ``.json``/``.jsonl``)."""
+
+    lowered = (filename or '').lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    raise ValueError('Formato non supportato: usa un file .csv o .json.')
+
+
+def _iter_json_records(stream: TextIO, chunk_size: int = 65536) -> Iterator[object]:
+    """Yield objects from a JSON array or from JSON Lines without loading the file."""
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    in_array: Optional[bool] = None
+
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or (in_array and buffer[position] == ',')):
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                break
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        if in_array is None:
+            in_array = buffer[position] == '['
+            if in_array:
+                position += 1
+            continue
+        if in_array and buffer[position] == ']':
+            break
+
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('Il file JSON non è valido.') from None
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+
+def iter_food_records(stream: TextIO, fmt: str) -> Iterator[Mapping[str, object]]:
+    """Yield raw records from a CSV (with header) or JSON text stream."""
+
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield {(key or '').strip().lower(): value for key, value in row.items()}
+    elif fmt == 'json':
+        for record in _iter_json_records(stream):
+            yield {str(key).strip().lower(): value for key, value in record.items()} if isinstance(record, dict) else record
+    else:
+        raise ValueError(f'Formato non supportato: {fmt!r}.')
+
+
+def _field(record: Mapping[str, object], column: str) -> object:
+    for alias in _COLUMN_ALIASES[column]:
+        value = record.get(alias)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _number(record: Mapping[str, object], column: str, default: Optional[float] = None) -> float:
+    raw = _field(record, column)
+    if raw is None:
+        if default is None:
+            raise ValueError(f"valore mancante per '{column}'")
+        return default
+    try:
+        value = float(str(raw).strip().replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"valore non numerico per '{column}'") from None
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f"valore non valido per '{column}'")
+    return value
+
+
+def normalize_food_record(record: object, line: int) -> StagedFood:
+    """Validate one raw record and return the staging row.
+
+    Macros are per ``ref_weight`` grams (default 100). Calories are derived
+    from the macros, as for foods added from the forms.
+    """
+
+    if not isinstance(record, Mapping):
+        raise ValueError('riga non valida')
+    name = ' '.join(str(_field(record, 'name') or '').split())
+    if not name:
+        raise ValueError('nome mancante')
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f'nome più lungo di {MAX_NAME_LENGTH} caratteri')
+
+    ref_weight = _number(record, 'ref_weight', 100.0)
+    if ref_weight <= 0:
+        raise ValueError("valore non valido per 'ref_weight'")
+    protein = _number(record, 'protein')
+    carbs = _number(record, 'carbs')
+    fat = _number(record, 'fat')
+    calories = protein * 4 + carbs * 4 + fat * 9
+    return (line, name, normalize_search_text(name), ref_weight, protein, carbs, fat, calories)
+
+
+def _copy_chunk(cursor, rows: List[StagedFood]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY food_import_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def stage_food_records(records: Iterable[object], report: Dict[str, object]) -> None:
+    """Validate records and COPY them into the staging table in chunks.
+
+    Must run inside the import transaction: the staging table is dropped on
+    commit. Invalid rows are counted and reported, not staged.
+    """
+
+    dbapi_connection = db.session.connection().connection
+    chunk: List[StagedFood] = []
+    with dbapi_connection.cursor() as cursor:
+        for line, record in enumerate(records, start=1):
+            report['read'] += 1
+            try:
+                chunk.append(normalize_food_record(record, line))
+            except ValueError as exc:
+                report['invalid'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append(f'Riga {line}: {exc}.')
+                continue
+            if len(chunk) >= COPY_CHUNK_ROWS:
+                _copy_chunk(cursor, chunk)
+                chunk = []
+        if chunk:
+            _copy_chunk(cursor, chunk)
+
+
+# Within a file the last row for a name wins; rows whose name already exists
+# in the target scope are conflicts, updated only when requested.
+_MERGE_STAGED_FOODS = """
+    WITH staged AS (
+        SELECT DISTINCT ON (name_key) line, name, name_key, ref_weight, protein, carbs, fat, calories
+        FROM food_import_staging
+        ORDER BY name_key, line DESC
+    ),
+    existing AS (
+        SELECT DISTINCT ON (f.name_search) f.id, f.name_search
+        FROM foods f
+        JOIN staged s ON s.name_key = f.name_search
+        WHERE f.user_id IS NOT DISTINCT FROM CAST(:uid AS INTEGER)
+        ORDER BY f.name_search, f.id
+    ),
+    updated AS (
+        UPDATE foods f
+        SET ref_weight = s.ref_weight, protein = s.protein, carbs = s.carbs, fat = s.fat, calories = s.calories
+        FROM existing e
+        JOIN staged s ON s.name_key = e.name_search
+        WHERE f.id = e.id AND :update_existing
+        RETURNING f.id
+    ),
+    inserted AS (
+        INSERT INTO foods (user_id, name, ref_weight, protein, carbs, fat, calories)
+        SELECT CAST(:uid AS INTEGER), s.name, s.ref_weight, s.protein, s.carbs, s.fat, s.calories
+        FROM staged s
+        WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.name_search = s.name_key)
+        ORDER BY s.line
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM food_import_staging) AS staged_rows,
+        (SELECT COUNT(*) FROM staged) AS distinct_rows,
+        (SELECT COUNT(*) FROM existing) AS conflicts,
+        (SELECT COUNT(*) FROM inserted) AS inserted,
+        (SELECT COUNT(*) FROM updated) AS updated,
+        (
+            SELECT array_agg(name ORDER BY line)
+            FROM (
+                SELECT s.name, s.line
+                FROM staged s
+                JOIN existing e ON e.name_search = s.name_key
+                ORDER BY s.line
+                LIMIT :max_conflicts
+            ) listed
+        ) AS conflict_names
+"""
+
+
+def import_foods(
+    records: Iterable[object],
+    *,
+    user_id: Optional[int] = None,
+    update_existing: bool = False,
+) -> Dict[str, object]:
+    """Import foods into the global catalog (``user_id=None``) or a user's own.
+
+    Records are validated and streamed into a temporary staging table with
+    ``COPY``; a single statement then merges them into ``foods``. Names are
+    compared in normalized form (``foods.name_search``). Returns counters and
+    the first conflicts and validation errors.
+    """
+
+    report: Dict[str, object] = {
+        'read': 0,
+        'invalid': 0,
+        'duplicates': 0,
+        'inserted': 0,
+        'updated': 0,
+        'conflicts': 0,
+        'conflict_names': [],
+        'errors': [],
+    }
+
+    try:
+        db.session.execute(
+            text(
+                """
+                CREATE TEMP TABLE food_import_staging (
+                    line INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    name_key TEXT NOT NULL,
+                    ref_weight REAL NOT NULL,
+                    protein REAL NOT NULL,
+                    carbs REAL NOT NULL,
+                    fat REAL NOT NULL,
+                    calories REAL NOT NULL
+                ) ON COMMIT DROP
+                """
+            )
+        )
+        stage_food_records(records, report)
+        # Imports are rare and short: serialize them against other catalog
+        # writes so the existence check and the insert see the same rows.
+        db.session.execute(text("LOCK TABLE foods IN SHARE ROW EXCLUSIVE MODE"))
+        sync_service.begin_bulk_changes()
+        row = db.session.execute(
+            text(_MERGE_STAGED_FOODS),
+            {'uid': user_id, 'update_existing': update_existing, 'max_conflicts': MAX_REPORTED_CONFLICTS},
+        ).mappings().one()
+        if row['inserted'] or row['updated']:
+            sync_service.record_bulk_change('foods', user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report['duplicates'] = int(row['staged_rows']) - int(row['distinct_rows'])
+    report['conflicts'] = int(row['conflicts'])
+    report['inserted'] = int(row['inserted'])
+    report['updated'] = int(row['updated'])
+    report['conflict_names'] = list(row['conflict_names'] or [])
+    return report
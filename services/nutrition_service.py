@@ -0,0 +1,538 @@
+"""Helpers around the nutrition tables shared by routes and CLI commands."""
+
+from __future__ import annotations
+
+import math
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from extensions import db
+
+# Totals are REAL columns updated by deltas; differences below this are noise.
+TOTALS_TOLERANCE = 0.01
+
+MAX_BATCH_ITEMS = 50
+
+# Daily intake trackers shown on the nutrition page and summarized by the API.
+TRACKER_DEFINITIONS = [
+    {
+        'key': 'water',
+        'label': 'Acqua',
+        'unit': 'ml',
+        'unit_singular': 'ml',
+        'unit_plural': 'ml',
+        'icon': 'bi-droplet',
+        'description': 'Monitora rapidamente quanta acqua bevi durante la giornata.',
+        'quick_add': [250, 500, 750],
+        'input_step': 50,
+        'placeholder': 'Quantità in ml',
+        'goal_hint': 'Suggerimento: punta a 2-3 litri al giorno.'
+    },
+    {
+        'key': 'coffee',
+        'label': 'Caffè',
+        'unit': 'tazze',
+        'unit_singular': 'tazza',
+        'unit_plural': 'tazze',
+        'icon': 'bi-cup-hot',
+        'description': 'Tieni sotto controllo il numero di caffè che assumi.',
+        'quick_add': [1, 2],
+        'input_step': 1,
+        'placeholder': 'Numero di tazze',
+        'goal_hint': 'Suggerimento: limita il consumo serale.'
+    },
+    {
+        'key': 'supplements',
+        'label': 'Integratori',
+        'unit': 'dosi',
+        'unit_singular': 'dose',
+        'unit_plural': 'dosi',
+        'icon': 'bi-capsule',
+        'description': 'Segna se hai assunto i tuoi integratori quotidiani.',
+        'quick_add': [1],
+        'input_step': 1,
+        'placeholder': 'Numero di dosi',
+        'goal_hint': 'Aggiungi una nota per ricordare quali integratori hai preso.'
+    },
+]
+
+TRACKER_LOOKUP = {tracker['key']: tracker for tracker in TRACKER_DEFINITIONS}
+
+_DRIFT_CTE = """
+    WITH actual AS (
+        SELECT user_id, log_date AS record_date,
+               SUM(protein) AS p, SUM(carbs) AS c, SUM(fat) AS f
+        FROM diet_log
+        WHERE (CAST(:uid AS INTEGER) IS NULL OR user_id = :uid)
+        GROUP BY user_id, log_date
+    ),
+    stored AS (
+        SELECT user_id, record_date, total_protein, total_carbs, total_fat, calories
+        FROM daily_data
+        WHERE (CAST(:uid AS INTEGER) IS NULL OR user_id = :uid)
+    ),
+    expected AS (
+        SELECT COALESCE(a.user_id, s.user_id) AS user_id,
+               COALESCE(a.record_date, s.record_date) AS record_date,
+               COALESCE(a.p, 0) AS p, COALESCE(a.c, 0) AS c, COALESCE(a.f, 0) AS f,
+               s.total_protein, s.total_carbs, s.total_fat, s.calories,
+               s.user_id IS NULL AS missing
+        FROM actual a
+        FULL JOIN stored s ON s.user_id = a.user_id AND s.record_date = a.record_date
+    ),
+    drift AS (
+        SELECT user_id, record_date, p, c, f, ROUND(p * 4 + c * 4 + f * 9) AS cal
+        FROM expected
+        WHERE missing
+           OR ABS(COALESCE(total_protein, 0) - p) > :tol
+           OR ABS(COALESCE(total_carbs, 0) - c) > :tol
+           OR ABS(COALESCE(total_fat, 0) - f) > :tol
+           OR COALESCE(calories, 0) <> ROUND(p * 4 + c * 4 + f * 9)
+    )
+"""
+
+
+def reconcile_daily_totals(user_id: Optional[int] = None, *, repair: bool = True) -> Dict[str, int]:
+    """Compare ``daily_data`` totals with ``diet_log`` and optionally fix them.
+
+    The totals are kept up to date by triggers on ``diet_log``; this is the
+    safety net for drift caused by manual edits or restored backups.
+    """
+
+    params = {'uid': user_id, 'tol': TOTALS_TOLERANCE}
+    if not repair:
+        row = db.session.execute(text(_DRIFT_CTE + "SELECT COUNT(*) AS drifted FROM drift"), params).mappings().one()
+        return {'drifted': int(row['drifted']), 'repaired': 0}
+
+    try:
+        row = db.session.execute(
+            text(
+                _DRIFT_CTE
+                + """
+                , repaired AS (
+                    INSERT INTO daily_data (user_id, record_date, total_protein, total_carbs, total_fat, calories)
+                    SELECT user_id, record_date, p, c, f, cal FROM drift
+                    ON CONFLICT (user_id, record_date) DO UPDATE SET
+                        total_protein = EXCLUDED.total_protein,
+                        total_carbs = EXCLUDED.total_carbs,
+                        total_fat = EXCLUDED.total_fat,
+                        calories = EXCLUDED.calories
+                    RETURNING 1
+                )
+                SELECT COUNT(*) AS repaired FROM repaired
+                """
+            ),
+            params,
+        ).mappings().one()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    repaired = int(row['repaired'])
+    return {'drifted': repaired, 'repaired': repaired}
+
+
+# ``calories`` is always derived from the macros, as for single entries.
+_INSERT_DIET_ENTRIES = """
+    INSERT INTO diet_log (user_id, food_id, weight, protein, carbs, fat, calories, log_date)
+    SELECT :uid, f.id, i.weight, m.p, m.c, m.f, m.p * 4 + m.c * 4 + m.f * 9, :ld
+    FROM {source}
+    JOIN foods f ON f.id = i.food_id AND (f.user_id IS NULL OR f.user_id = :uid)
+    CROSS JOIN LATERAL (
+        SELECT f.protein * i.weight / f.ref_weight AS p,
+               f.carbs * i.weight / f.ref_weight AS c,
+               f.fat * i.weight / f.ref_weight AS f
+    ) m
+    ORDER BY i.position
+    RETURNING id
+"""
+
+
+def parse_meal_items(raw_items: Iterable[object]) -> List[Tuple[int, float]]:
+    """Validate ``[{"food_id": ..., "weight": ...}, ...]`` into typed pairs."""
+
+    items: List[Tuple[int, float]] = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            raise ValueError('Elemento del pasto non valido.')
+        try:
+            food_id = int(raw.get('food_id'))
+            weight = float(raw.get('weight'))
+        except (TypeError, ValueError):
+            raise ValueError('Alimento o peso non validi.') from None
+        if not math.isfinite(weight):
+            raise ValueError('Alimento o peso non validi.')
+        if weight <= 0:
+            raise ValueError('Il peso deve essere maggiore di zero.')
+        items.append((food_id, weight))
+
+    if not items:
+        raise ValueError('Aggiungi almeno un alimento.')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f'Puoi aggiungere al massimo {MAX_BATCH_ITEMS} alimenti alla volta.')
+    return items
+
+
+def add_diet_entries(user_id: int, log_date: str, items: List[Tuple[int, float]]) -> int:
+    """Log several foods with one statement; totals are updated once by trigger.
+
+    Foods the user cannot see are skipped. Returns the number of rows inserted.
+    """
+
+    source = (
+        "unnest(CAST(:food_ids AS INTEGER[]), CAST(:weights AS REAL[])) "
+        "WITH ORDINALITY AS i(food_id, weight, position)"
+    )
+    try:
+        inserted = db.session.execute(
+            text(_INSERT_DIET_ENTRIES.format(source=source)),
+            {
+                'uid': user_id,
+                'ld': log_date,
+                'food_ids': [food_id for food_id, _ in items],
+                'weights': [weight for _, weight in items],
+            },
+        ).fetchall()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(inserted)
+
+
+def log_saved_meal(user_id: int, meal_id: int, log_date: str) -> int:
+    """Copy every item of a saved meal into the diet log in one statement."""
+
+    source = (
+        "saved_meal_items i "
+        "JOIN saved_meals sm ON sm.id = i.meal_id AND sm.id = :meal_id AND sm.user_id = :uid"
+    )
+    try:
+        inserted = db.session.execute(
+            text(_INSERT_DIET_ENTRIES.format(source=source)),
+            {'uid': user_id, 'ld': log_date, 'meal_id': meal_id},
+        ).fetchall()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(inserted)
+
+
+def copy_diet_day(
+    user_id: int,
+    source_date: str,
+    target_date: str,
+    food_ids: Optional[Iterable[int]] = None,
+) -> int:
+    """Copy a day's diet log entries to another date with one statement.
+
+    The logged weights and macros are copied as they are, optionally only for
+    the given foods. The diet_log triggers update the target day's totals in
+    the same statement. Returns the number of entries copied.
+    """
+
+    if source_date == target_date:
+        raise ValueError('Scegli un giorno diverso da quello corrente.')
+    try:
+        inserted = db.session.execute(
+            text(
+                """
+                INSERT INTO diet_log (user_id, food_id, weight, protein, carbs, fat, calories, log_date)
+                SELECT dl.user_id, dl.food_id, dl.weight, dl.protein, dl.carbs, dl.fat, dl.calories, :target
+                FROM diet_log dl
+                WHERE dl.user_id = :uid
+                  AND dl.log_date = :source
+                  AND (CAST(:food_ids AS INTEGER[]) IS NULL OR dl.food_id = ANY(CAST(:food_ids AS INTEGER[])))
+                ORDER BY dl.id
+                """
+            ),
+            {
+                'uid': user_id,
+                'source': source_date,
+                'target': target_date,
+                'food_ids': list(food_ids) if food_ids is not None else None,
+            },
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inserted
+
+
+def list_saved_meals(user_id: int) -> List[Dict[str, object]]:
+    """Return the user's saved meals with their items and macro totals."""
+
+    rows = db.session.execute(
+        text(
+            """
+            SELECT sm.id AS meal_id, sm.name AS meal_name,
+                   f.id AS food_id, f.name AS food_name, i.weight,
+                   f.protein * i.weight / f.ref_weight AS protein,
+                   f.carbs * i.weight / f.ref_weight AS carbs,
+                   f.fat * i.weight / f.ref_weight AS fat
+            FROM saved_meals sm
+            LEFT JOIN saved_meal_items i ON i.meal_id = sm.id
+            LEFT JOIN foods f ON f.id = i.food_id
+            WHERE sm.user_id = :uid
+            ORDER BY LOWER(sm.name), sm.id, i.position, i.id
+            """
+        ),
+        {'uid': user_id},
+    ).mappings().all()
+
+    meals: Dict[int, Dict[str, object]] = {}
+    for row in rows:
+        meal = meals.setdefault(
+            row['meal_id'],
+            {'id': row['meal_id'], 'name': row['meal_name'], 'items': [], 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0},
+        )
+        if row['food_id'] is None:
+            continue
+        meal['items'].append({'food_id': row['food_id'], 'name': row['food_name'], 'weight': row['weight']})
+        for macro in ('protein', 'carbs', 'fat'):
+            meal[macro] += row[macro] or 0
+    for meal in meals.values():
+        meal['calories'] = meal['protein'] * 4 + meal['carbs'] * 4 + meal['fat'] * 9
+    return list(meals.values())
+
+
+def save_meal_from_entries(user_id: int, name: str, entry_ids: Iterable[int]) -> Optional[int]:
+    """Create (or replace) a saved meal from diet log entries of the user.
+
+    Returns the meal id, or ``None`` when none of the entries belong to the user.
+    """
+
+    ids = [int(entry_id) for entry_id in entry_ids]
+    try:
+        meal = db.session.execute(
+            text(
+                """
+                INSERT INTO saved_meals (user_id, name) VALUES (:uid, :name)
+                ON CONFLICT (user_id, name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id
+                """
+            ),
+            {'uid': user_id, 'name': name},
+        ).mappings().one()
+        db.session.execute(text("DELETE FROM saved_meal_items WHERE meal_id = :meal_id"), {'meal_id': meal['id']})
+        inserted = db.session.execute(
+            text(
+                """
+                INSERT INTO saved_meal_items (meal_id, food_id, weight, position)
+                SELECT :meal_id, dl.food_id, dl.weight, ROW_NUMBER() OVER (ORDER BY dl.id)
+                FROM diet_log dl
+                WHERE dl.user_id = :uid AND dl.id = ANY(:ids) AND dl.weight > 0
+                """
+            ),
+            {'meal_id': meal['id'], 'uid': user_id, 'ids': ids},
+        ).rowcount
+        if not inserted:
+            db.session.rollback()
+            return None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return meal['id']
+
+
+def delete_saved_meal(user_id: int, meal_id: int) -> bool:
+    """Delete a saved meal owned by the user; the diet log is not touched."""
+
+    try:
+        deleted = db.session.execute(
+            text("DELETE FROM saved_meals WHERE id = :id AND user_id = :uid"),
+            {'id': meal_id, 'uid': user_id},
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return bool(deleted)
+
+
+ROLLUP_PERIODS = ('week', 'month')
+DEFAULT_ROLLUP_BUCKETS = 12
+
+
+def rollup_period_start(period: str, day: date) -> date:
+    """Return the first day of the week (Monday) or month containing ``day``."""
+
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Periodo non valido: {period!r}.')
+
+
+def _shift_buckets(period: str, start: date, count: int) -> date:
+    if period == 'week':
+        return start - timedelta(weeks=count)
+    months = start.year * 12 + start.month - 1 - count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def fetch_nutrition_rollups(
+    user_id: int,
+    period: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> List[Dict[str, object]]:
+    """Return weekly or monthly macro sums and per-day averages for a range.
+
+    Reads only ``nutrition_rollups`` (maintained by triggers on ``daily_data``),
+    one row per bucket. Without ``date_from`` the last
+    ``DEFAULT_ROLLUP_BUCKETS`` buckets up to ``date_to`` (default today) are
+    returned. Buckets without logged days are omitted.
+    """
+
+    end = rollup_period_start(period, date_to or date.today())
+    if date_from is None:
+        start = _shift_buckets(period, end, DEFAULT_ROLLUP_BUCKETS - 1)
+    else:
+        start = rollup_period_start(period, date_from)
+    if start > end:
+        raise ValueError("L'intervallo di date non è valido.")
+
+    rows = db.session.execute(
+        text(
+            """
+            SELECT period_start, total_protein, total_carbs, total_fat, total_calories, logged_days
+            FROM nutrition_rollups
+            WHERE user_id = :uid AND period = :period
+              AND period_start BETWEEN :start AND :end
+              AND logged_days > 0
+            ORDER BY period_start
+            """
+        ),
+        {'uid': user_id, 'period': period, 'start': start, 'end': end},
+    ).mappings().all()
+
+    buckets = []
+    for row in rows:
+        days = row['logged_days']
+        totals = {
+            'protein': float(row['total_protein']),
+            'carbs': float(row['total_carbs']),
+            'fat': float(row['total_fat']),
+            'calories': int(row['total_calories']),
+        }
+        buckets.append({
+            'period_start': row['period_start'].isoformat(),
+            'logged_days': days,
+            'totals': totals,
+            'averages': {name: round(value / days, 1) for name, value in totals.items()},
+        })
+    return buckets
+
+
+DEFAULT_INTAKE_SUMMARY_DAYS = 7
+MAX_INTAKE_SUMMARY_DAYS = 90
+
+
+def fetch_intake_totals(user_id: int, record_date: str, tracker_keys: Iterable[str]) -> Dict[str, float]:
+    """Return the day's total per tracker, summed by the database."""
+
+    totals = {key: 0.0 for key in tracker_keys}
+    rows = db.session.execute(
+        text(
+            """
+            SELECT tracker_type, SUM(amount) AS total
+            FROM intake_log
+            WHERE user_id = :uid AND record_date = :rd
+            GROUP BY tracker_type
+            """
+        ),
+        {'uid': user_id, 'rd': record_date},
+    ).mappings().all()
+    for row in rows:
+        if row['tracker_type'] in totals:
+            totals[row['tracker_type']] = float(row['total'] or 0)
+    return totals
+
+
+def fetch_intake_summary(
+    user_id: int,
+    tracker_keys: Iterable[str],
+    days: object = DEFAULT_INTAKE_SUMMARY_DAYS,
+    date_to: Optional[date] = None,
+) -> Dict[str, object]:
+    """Return per-day tracker totals for the ``days`` days ending at ``date_to``.
+
+    Built from a single ``GROUP BY record_date, tracker_type`` query; days
+    without entries are reported with zero totals.
+    """
+
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        raise ValueError('Numero di giorni non valido.') from None
+    if not 1 <= days <= MAX_INTAKE_SUMMARY_DAYS:
+        raise ValueError(f'Il numero di giorni deve essere tra 1 e {MAX_INTAKE_SUMMARY_DAYS}.')
+
+    keys = list(tracker_keys)
+    end = date_to or date.today()
+    start = end - timedelta(days=days - 1)
+    rows = db.session.execute(
+        text(
+            """
+            SELECT record_date, tracker_type, SUM(amount) AS total
+            FROM intake_log
+            WHERE user_id = :uid AND record_date BETWEEN :start AND :end
+              AND tracker_type = ANY(:keys)
+            GROUP BY record_date, tracker_type
+            """
+        ),
+        {'uid': user_id, 'start': start, 'end': end, 'keys': keys},
+    ).mappings().all()
+
+    by_day = {start + timedelta(days=offset): {key: 0.0 for key in keys} for offset in range(days)}
+    for row in rows:
+        by_day[row['record_date']][row['tracker_type']] = float(row['total'] or 0)
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': [{'date': day.isoformat(), 'totals': totals} for day, totals in by_day.items()],
+    }
+
+
+DIARY_PAGE_SIZE = 30
+
+# Must match the partial index created by migration 0016.
+LOGGED_DAY_PREDICATE = "(total_protein > 0 OR total_carbs > 0 OR total_fat > 0 OR calories > 0)"
+
+
+def fetch_diary_page(
+    user_id: int,
+    before: Optional[date] = None,
+    limit: int = DIARY_PAGE_SIZE,
+) -> Tuple[List[Dict[str, object]], Optional[str]]:
+    """Return one page of logged days, newest first, and the next cursor.
+
+    The cursor is the ``record_date`` of the last row; each page is an index
+    range scan on ``idx_daily_data_user_logged_date`` whatever the history size.
+    """
+
+    keyset = "AND record_date < :before" if before is not None else ""
+    rows = db.session.execute(
+        text(
+            f"""
+            SELECT record_date, total_protein, total_carbs, total_fat, calories, day_type
+            FROM daily_data
+            WHERE user_id = :uid AND {LOGGED_DAY_PREDICATE} {keyset}
+            ORDER BY record_date DESC
+            LIMIT :limit
+            """
+        ),
+        {'uid': user_id, 'before': before, 'limit': limit + 1},
+    ).mappings().all()
+
+    page = [dict(row) for row in rows[:limit]]
+    next_cursor = page[-1]['record_date'].isoformat() if len(rows) > limit else None
+    return page, next_cursor
@@ -1,45 +1,37 @@
 """Utility functions to manage privacy content."""
 
+from typing import Tuple
+
 from utils import execute_query
+from services.settings_cache import CachedSetting
 
 
-def _ensure_storage() -> None:
-    """Create the backing table and seed row if they are missing."""
-    execute_query(
-        """
-        CREATE TABLE IF NOT EXISTS privacy_settings (
-            id INTEGER PRIMARY KEY DEFAULT 1,
-            content TEXT NOT NULL DEFAULT '',
-            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
-        )
-        """,
-        commit=True,
-    )
-    execute_query(
-        """
-        INSERT INTO privacy_settings (id, content)
-        VALUES (1, '')
-        ON CONFLICT (id) DO NOTHING
-        """,
-        commit=True,
+def _load_privacy_text() -> Tuple[str, str]:
+    row = execute_query(
+        "SELECT content, updated_at FROM privacy_settings WHERE id = 1",
+        fetchone=True,
     )
+    if not row:
+        return "", ""
+    version = row["updated_at"].isoformat() if row.get("updated_at") else ""
+    return row.get("content") or "", version
+
+
+_privacy_cache = CachedSetting(_load_privacy_text)
 
 
 def get_privacy_text() -> str:
     """Return the privacy text configured by the administrator."""
-    _ensure_storage()
-    row = execute_query(
-        "SELECT content FROM privacy_settings WHERE id = 1",
-        fetchone=True,
-    )
-    if row and row.get("content"):
-        return row["content"]
-    return ""
+    return _privacy_cache.get()[0]
+
+
+def get_privacy_version() -> str:
+    """Return a token that changes whenever the privacy text is updated."""
+    return _privacy_cache.get()[1]
 
 
 def update_privacy_text(content: str) -> None:
     """Persist a new privacy text in the database."""
-    _ensure_storage()
     execute_query(
         """
         INSERT INTO privacy_settings (id, content, updated_at)
@@ -51,3 +43,4 @@ def update_privacy_text(content: str) -> None:
         {"content": content},
         commit=True,
     )
+    _privacy_cache.invalidate()
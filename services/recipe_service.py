@@ -0,0 +1,237 @@
+"""Recipes: personal foods whose macros are rolled up from ingredient foods.
+
+A recipe is an ordinary ``foods`` row plus a ``recipes`` row and its
+``recipe_ingredients``. Triggers from migration 0018 keep the food's macros
+in sync whenever an ingredient or one of the ingredient foods changes, so
+logging, suggestions and search treat recipes like any other food.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+
+def parse_cooked_weight(raw: object) -> Optional[float]:
+    """Return the optional cooked weight in grams, or ``None`` when blank."""
+
+    if raw in (None, ''):
+        return None
+    try:
+        value = float(str(raw).replace(',', '.'))
+    except ValueError:
+        raise ValueError('Peso cotto non valido.') from None
+    # NaN would pass CHECK (cooked_weight > 0): Postgres sorts it above every number.
+    if not math.isfinite(value):
+        raise ValueError('Peso cotto non valido.')
+    if value <= 0:
+        raise ValueError('Il peso cotto deve essere maggiore di zero.')
+    return value
+
+
+def _create_recipe_food(user_id: int, name: str, cooked_weight: Optional[float]) -> int:
+    try:
+        with db.session.begin_nested():
+            row = db.session.execute(
+                text(
+                    """
+                    INSERT INTO foods (user_id, name, ref_weight, protein, carbs, fat, calories)
+                    VALUES (:uid, :name, COALESCE(:cooked, 100), 0, 0, 0, 0)
+                    RETURNING id
+                    """
+                ),
+                {'uid': user_id, 'name': name, 'cooked': cooked_weight},
+            ).mappings().one()
+    except IntegrityError:
+        raise ValueError(f"Esiste già un alimento chiamato '{name}'.") from None
+
+    db.session.execute(
+        text("INSERT INTO recipes (food_id, cooked_weight) VALUES (:id, :cooked)"),
+        {'id': row['id'], 'cooked': cooked_weight},
+    )
+    return row['id']
+
+
+def _insert_ingredients(user_id: int, recipe_id: int, items: List[Tuple[int, float]]) -> int:
+    """Insert visible ingredient foods; the trigger recomputes the recipe once."""
+
+    return db.session.execute(
+        text(
+            """
+            INSERT INTO recipe_ingredients (recipe_id, ingredient_id, weight, position)
+            SELECT :rid, f.id, i.weight, i.position
+            FROM unnest(CAST(:food_ids AS INTEGER[]), CAST(:weights AS REAL[]))
+                 WITH ORDINALITY AS i(food_id, weight, position)
+            JOIN foods f ON f.id = i.food_id AND (f.user_id IS NULL OR f.user_id = :uid)
+            WHERE f.id <> :rid
+            """
+        ),
+        {
+            'rid': recipe_id,
+            'uid': user_id,
+            'food_ids': [food_id for food_id, _ in items],
+            'weights': [weight for _, weight in items],
+        },
+    ).rowcount
+
+
+def _lock_user_recipes(user_id: int) -> None:
+    """Serialize recipe edits of one user until the transaction ends.
+
+    Recipes only contain global foods and the owner's foods, so a cycle can
+    only form between recipes of one user. Two concurrent updates (A gets B,
+    B gets A) would otherwise both pass the cycle check and both commit.
+    """
+
+    db.session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext('recipes'), :uid)"),
+        {'uid': user_id},
+    )
+
+
+def _would_create_cycle(recipe_id: int, ingredient_ids: Iterable[int]) -> bool:
+    row = db.session.execute(
+        text(
+            """
+            WITH RECURSIVE contained (id) AS (
+                SELECT unnest(CAST(:ids AS INTEGER[]))
+                UNION
+                SELECT ri.ingredient_id
+                FROM recipe_ingredients ri
+                JOIN contained c ON ri.recipe_id = c.id
+            )
+            SELECT EXISTS (SELECT 1 FROM contained WHERE id = :rid) AS cycle
+            """
+        ),
+        {'ids': list(ingredient_ids), 'rid': recipe_id},
+    ).mappings().one()
+    return bool(row['cycle'])
+
+
+def create_recipe(
+    user_id: int,
+    name: str,
+    items: List[Tuple[int, float]],
+    cooked_weight: Optional[float] = None,
+) -> int:
+    """Create a recipe from ``(food_id, weight)`` pairs and return its food id."""
+
+    try:
+        recipe_id = _create_recipe_food(user_id, name, cooked_weight)
+        if _insert_ingredients(user_id, recipe_id, items) != len(items):
+            raise ValueError('Alcuni ingredienti non sono disponibili.')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return recipe_id
+
+
+def update_recipe(
+    user_id: int,
+    recipe_id: int,
+    items: List[Tuple[int, float]],
+    cooked_weight: Optional[float] = None,
+) -> bool:
+    """Replace the ingredients of a recipe owned by the user.
+
+    Returns ``False`` when the recipe does not exist; raises ``ValueError`` for
+    unavailable ingredients or when an ingredient (directly or through nested
+    recipes) already contains this recipe.
+    """
+
+    try:
+        _lock_user_recipes(user_id)
+        owned = db.session.execute(
+            text(
+                """
+                UPDATE recipes r SET cooked_weight = :cooked
+                FROM foods f
+                WHERE r.food_id = :rid AND f.id = r.food_id AND f.user_id = :uid
+                RETURNING r.food_id
+                """
+            ),
+            {'rid': recipe_id, 'uid': user_id, 'cooked': cooked_weight},
+        ).first()
+        if owned is None:
+            db.session.rollback()
+            return False
+        if _would_create_cycle(recipe_id, [food_id for food_id, _ in items]):
+            raise ValueError('Una ricetta non può contenere sé stessa.')
+
+        db.session.execute(text("DELETE FROM recipe_ingredients WHERE recipe_id = :rid"), {'rid': recipe_id})
+        if _insert_ingredients(user_id, recipe_id, items) != len(items):
+            raise ValueError('Alcuni ingredienti non sono disponibili.')
+        # A cooked-weight change alone does not touch the ingredient rows.
+        db.session.execute(text("SELECT refresh_recipe_macros(ARRAY[CAST(:rid AS INTEGER)])"), {'rid': recipe_id})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+
+def create_recipe_from_entries(
+    user_id: int,
+    name: str,
+    entry_ids: Iterable[int],
+    log_date: str,
+    cooked_weight: Optional[float] = None,
+) -> Optional[int]:
+    """Turn diet log entries into a recipe and log it in their place.
+
+    The selected entries become the ingredients and are replaced by a single
+    entry for the whole recipe. That entry carries the sum of the macros
+    stored on the removed entries, not the current macros of their foods, so
+    the day's totals do not change even if a food was edited after being
+    logged. Returns the recipe food id, or ``None`` when none of the entries
+    belong to the user.
+    """
+
+    ids = [int(entry_id) for entry_id in entry_ids]
+    try:
+        recipe_id = _create_recipe_food(user_id, name, cooked_weight)
+        inserted = db.session.execute(
+            text(
+                """
+                INSERT INTO recipe_ingredients (recipe_id, ingredient_id, weight, position)
+                SELECT :rid, dl.food_id, dl.weight, ROW_NUMBER() OVER (ORDER BY dl.id)
+                FROM diet_log dl
+                WHERE dl.user_id = :uid AND dl.log_date = :ld AND dl.id = ANY(:ids) AND dl.weight > 0
+                """
+            ),
+            {'rid': recipe_id, 'uid': user_id, 'ld': log_date, 'ids': ids},
+        ).rowcount
+        if not inserted:
+            db.session.rollback()
+            return None
+
+        db.session.execute(
+            text(
+                """
+                WITH removed AS (
+                    DELETE FROM diet_log
+                    WHERE user_id = :uid AND log_date = :ld AND id = ANY(:ids)
+                    RETURNING protein, carbs, fat, calories
+                )
+                INSERT INTO diet_log (user_id, food_id, weight, protein, carbs, fat, calories, log_date)
+                SELECT :uid, f.id, f.ref_weight,
+                       SUM(r.protein), SUM(r.carbs), SUM(r.fat), SUM(r.calories), :ld
+                FROM foods f
+                CROSS JOIN removed r
+                WHERE f.id = :rid
+                GROUP BY f.id, f.ref_weight
+                """
+            ),
+            {'uid': user_id, 'rid': recipe_id, 'ld': log_date, 'ids': ids},
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return recipe_id
@@ -0,0 +1,42 @@
+"""Process-local cache for single-row settings tables."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+SETTINGS_CACHE_TTL_SECONDS = 60.0
+
+
+class CachedSetting(Generic[T]):
+    """Hold the last loaded ``(value, version)`` pair for a settings row.
+
+    Updates made by this process call :meth:`invalidate`; other workers pick up
+    the change once ``ttl`` expires.
+    """
+
+    def __init__(self, loader: Callable[[], Tuple[T, str]], ttl: float = SETTINGS_CACHE_TTL_SECONDS) -> None:
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entry: Optional[Tuple[float, T, str]] = None
+
+    def get(self) -> Tuple[T, str]:
+        entry = self._entry
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], entry[2]
+            value, version = self._loader()
+            self._entry = (time.monotonic() + self._ttl, value, version)
+            return value, version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
@@ -2,15 +2,221 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, List, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from utils import execute_query
+from sqlalchemy import text
+
+from extensions import db
+from utils import execute_query, normalize_search_text
 
 _TABLE_MAP: Dict[str, str] = {
     'exercises': 'exercises',
     'foods': 'foods',
 }
 
+# Results are shared between identical lookups for a few seconds only: catalog
+# mutations in this process clear the cache explicitly, other workers converge
+# once the entry expires.
+SUGGESTION_CACHE_TTL_SECONDS = 15.0
+SUGGESTION_CACHE_MAX_ENTRIES = 1024
+
+_CacheKey = Tuple[str, int, int, str]
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[List[Dict[str, object]]] = None
+        self.error: Optional[BaseException] = None
+
+
+class _SingleFlight:
+    """Let concurrent callers with the same key share a single execution."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[_CacheKey, _Flight] = {}
+
+    def run(self, key: _CacheKey, func: Callable[[], List[Dict[str, object]]]) -> List[Dict[str, object]]:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result or []
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+class _SuggestionCache:
+    """Short-lived LRU of suggestion results keyed by normalized term."""
+
+    def __init__(self, max_entries: int) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_CacheKey, Tuple[float, List[Dict[str, object]], bool]] = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, key: _CacheKey) -> Optional[List[Dict[str, object]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def derive(self, key: _CacheKey) -> Optional[List[Dict[str, object]]]:
+        """Filter the result of a shorter cached prefix, if it is complete.
+
+        A term matching ``name`` also matches every prefix of the term, so an
+        untruncated prefix result already holds every row the longer term can
+        return; only the ranking has to be recomputed. When none of them match,
+        ``None`` is returned so the database query runs its fuzzy fallback.
+        """
+
+        resource, user_id, limit, term = key
+        now = time.monotonic()
+        with self._lock:
+            for length in range(len(term) - 1, 0, -1):
+                entry = self._entries.get((resource, user_id, limit, term[:length]))
+                if entry is None or entry[0] <= now or entry[2]:
+                    continue
+                matches = [row for row in entry[1] if term in normalize_search_text(str(row['name']))]
+                return _rank(matches, term) if matches else None
+        return None
+
+    def put(self, key: _CacheKey, rows: List[Dict[str, object]], truncated: bool) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + SUGGESTION_CACHE_TTL_SECONDS, rows, truncated)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, resource: Optional[str] = None, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if resource is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == resource and user_id in (None, key[1])]:
+                del self._entries[key]
+
+
+_flights = _SingleFlight()
+_cache = _SuggestionCache(SUGGESTION_CACHE_MAX_ENTRIES)
+
+
+def invalidate_suggestion_cache(resource: Optional[str] = None, user_id: Optional[int] = None) -> None:
+    """Drop cached suggestions after a catalog mutation.
+
+    Pass ``user_id`` for personal items; omit it when a global entry changed,
+    since global rows appear in every user's results.
+    """
+
+    _cache.invalidate(resource, user_id)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _trigrams(value: str) -> set:
+    # Mirrors pg_trgm: every alphanumeric word is padded with two leading
+    # spaces and one trailing space before being split into trigrams.
+    grams = set()
+    for word in re.findall(r'[^\W_]+', value.lower()):
+        padded = f'  {word} '
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def _similarity(left: str, right: str) -> float:
+    left_grams, right_grams = _trigrams(left), _trigrams(right)
+    if not left_grams or not right_grams:
+        return 0.0
+    shared = len(left_grams & right_grams)
+    return shared / (len(left_grams) + len(right_grams) - shared)
+
+
+def _rank(rows: List[Dict[str, object]], normalized: str) -> List[Dict[str, object]]:
+    """Order rows like the SQL query: prefix matches, then similarity, then name."""
+
+    def sort_key(row: Dict[str, object]):
+        name = str(row['name'])
+        searchable = normalize_search_text(name)
+        return (not searchable.startswith(normalized), -_similarity(searchable, normalized), name.lower(), name)
+
+    return sorted(rows, key=sort_key)
+
+
+_SUBSTRING_FILTER = "name_search LIKE :pattern ESCAPE '\\'"
+# Typo tolerance: only used when nothing contains the term, through the same
+# trigram index (``%`` honours ``pg_trgm.similarity_threshold``).
+_FUZZY_FILTER = "name_search % :term"
+
+
+def _query_suggestions(
+    table_name: str,
+    user_id: int,
+    normalized: str,
+    limit: int,
+    *,
+    fuzzy: bool = False,
+) -> List[Dict[str, object]]:
+    # ``name_search`` is the accent-free, lower-case name maintained by the
+    # database (migration 0013); both filters are served by its trigram index.
+    rows: Iterable[Dict[str, object]] = execute_query(
+        f"""
+        SELECT id, name, user_id IS NULL AS is_global
+        FROM {table_name}
+        WHERE (user_id IS NULL OR user_id = :uid)
+          AND {_FUZZY_FILTER if fuzzy else _SUBSTRING_FILTER}
+        ORDER BY name_search LIKE :prefix ESCAPE '\\' DESC,
+                 similarity(name_search, :term) DESC,
+                 LOWER(name) ASC,
+                 name ASC
+        LIMIT :limit
+        """,
+        {
+            'uid': user_id,
+            'term': normalized,
+            'pattern': f"%{_escape_like(normalized)}%",
+            'prefix': f"{_escape_like(normalized)}%",
+            'limit': limit,
+        },
+        fetchall=True,
+    ) or []
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'is_global': bool(row['is_global']),
+        }
+        for row in rows
+    ]
+
 
 def get_catalog_suggestions(
     resource: str,
@@ -47,39 +253,93 @@ def get_catalog_suggestions(
     if limit_value <= 0:
         limit_value = 5
 
-    normalized = sanitized.lower()
-    pattern = f"%{normalized}%"
+    normalized = normalize_search_text(sanitized)
+    if not normalized:
+        return []
+    key: _CacheKey = (resource, user_id, limit_value, normalized)
 
-    # ``LOWER`` keeps the lookup portable across SQLite/PostgreSQL while still
-    # providing a case-insensitive match. Results are ordered with global entries
-    # (``user_id`` NULL) first, then alphabetically by name.
-    rows: Iterable[Dict[str, object]] = execute_query(
-        f"""
-        SELECT id, name, user_id IS NULL AS is_global
-        FROM {table_name}
-        WHERE (user_id IS NULL OR user_id = :uid)
-          AND LOWER(name) LIKE :pattern
-        ORDER BY CASE WHEN user_id IS NULL THEN 0 ELSE 1 END,
-                 LOWER(name) ASC,
-                 name ASC
-        LIMIT :limit
-        """,
-        {
-            'uid': user_id,
-            'pattern': pattern,
-            'limit': limit_value,
-        },
-        fetchall=True,
-    ) or []
+    cached = _cache.get(key)
+    if cached is None:
+        cached = _cache.derive(key)
+        if cached is not None:
+            _cache.put(key, cached, False)
+    if cached is None:
+        def load() -> List[Dict[str, object]]:
+            rows = _query_suggestions(table_name, user_id, normalized, limit_value)
+            truncated = len(rows) >= limit_value
+            if not rows:
+                rows = _query_suggestions(table_name, user_id, normalized, limit_value, fuzzy=True)
+                # Fuzzy matches for a prefix say nothing about longer terms.
+                truncated = True
+            _cache.put(key, rows, truncated)
+            return rows
 
-    return [
-        {
-            'id': row['id'],
-            'name': row['name'],
-            'is_global': bool(row['is_global']),
-        }
-        for row in rows
-    ]
+        cached = _flights.run(key, load)
+
+    # Callers get their own copies: cached rows are shared across requests.
+    return [dict(row) for row in cached]
+
+
+BENCHMARK_TERMS = ('pa', 'pasta', 'caffe', 'riso int', 'pomodoro', 'spagheti')
+
+_BENCHMARK_NAMES = """
+    INSERT INTO suggestion_benchmark (id, user_id, name, ref_weight, protein, carbs, fat, calories)
+    SELECT g, NULL,
+           (ARRAY['Pane', 'Pasta', 'Riso', 'Caffè', 'Mela', 'Pollo', 'Tonno', 'Yogurt',
+                  'Formaggio', 'Crème', 'Prosciutto', 'Spaghetti'])[1 + g % 12]
+           || ' ' ||
+           (ARRAY['integrale', 'bianco', 'al pomodoro', 'light', 'bio', 'fresco',
+                  'greco', 'cotto', 'crudo', 'brûlée'])[1 + (g / 12) % 10]
+           || ' ' || g,
+           100, 10, 20, 5, 165
+    FROM generate_series(1, :rows) AS g
+"""
+
+
+def benchmark_suggestions(
+    sizes: Iterable[int],
+    *,
+    terms: Iterable[str] = BENCHMARK_TERMS,
+    repeats: int = 20,
+) -> List[Dict[str, object]]:
+    """Time suggestion queries against synthetic catalogs of the given sizes.
+
+    Each catalog lives in a temporary copy of ``foods`` (same generated column
+    and indexes) that is discarded with the transaction, so the real tables are
+    never touched.
+    """
+
+    results: List[Dict[str, object]] = []
+    for size in sizes:
+        try:
+            db.session.execute(
+                text("CREATE TEMP TABLE suggestion_benchmark (LIKE foods INCLUDING ALL EXCLUDING DEFAULTS)")
+            )
+            db.session.execute(text(_BENCHMARK_NAMES), {'rows': size})
+            db.session.execute(text('ANALYZE suggestion_benchmark'))
+
+            for term in terms:
+                normalized = normalize_search_text(term)
+                timings = []
+                for _ in range(max(repeats, 1)):
+                    started = time.perf_counter()
+                    rows = _query_suggestions('suggestion_benchmark', 0, normalized, 5)
+                    if not rows:
+                        _query_suggestions('suggestion_benchmark', 0, normalized, 5, fuzzy=True)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                results.append(
+                    {
+                        'rows': size,
+                        'term': term,
+                        'p50_ms': timings[len(timings) // 2],
+                        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+                    }
+                )
+        finally:
+            db.session.rollback()
+
+    return results
 
 
 def resolve_catalog_item(
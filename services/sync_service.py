@@ -0,0 +1,249 @@
+"""Delta synchronisation backed by the ``sync_changes`` log."""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from extensions import db
+from services.api_service import serialise_row
+from utils import execute_query
+
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 2000
+
+# A cursor is ``<txid>_<version>``. Changes are read in (txid, version) order
+# and only from transactions older than the oldest one still running, so a
+# long transaction that commits late can never land behind a client cursor.
+SyncCursor = Tuple[int, int]
+
+# Ownership predicate used when reading the current state of a changed row.
+_TABLE_SCOPES: Dict[str, str] = {
+    'workout_sessions': 'user_id = :uid',
+    'workout_log': 'user_id = :uid',
+    'workout_session_comments': 'user_id = :uid',
+    'cardio_log': 'user_id = :uid',
+    'diet_log': 'user_id = :uid',
+    'intake_log': 'user_id = :uid',
+    'daily_data': 'user_id = :uid',
+    'foods': '(user_id IS NULL OR user_id = :uid)',
+    'exercises': '(user_id IS NULL OR user_id = :uid)',
+    'workout_templates': 'user_id = :uid',
+    'template_exercises': 'template_id IN (SELECT id FROM workout_templates WHERE user_id = :uid)',
+}
+
+# Global catalog rows (``user_id IS NULL``) are visible to every user.
+_SHARED_TABLES: Tuple[str, ...] = ('foods', 'exercises')
+
+SYNC_TABLES: Tuple[str, ...] = tuple(_TABLE_SCOPES)
+
+
+def parse_since(value: Optional[str]) -> Optional[SyncCursor]:
+    """Parse the ``since`` cursor supplied by the client.
+
+    ``0`` (or nothing) starts from the beginning. A bare positive integer is a
+    cursor from before the transaction watermark and returns ``None``: the
+    client must resync from ``0``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+
+    if value in (None, '', '0'):
+        return 0, 0
+    txid, separator, version = str(value).partition('_')
+    try:
+        cursor = (int(txid), int(version)) if separator else (0, int(txid))
+    except ValueError as exc:
+        raise ValueError('Cursore di sincronizzazione non valido.') from exc
+    if min(cursor) < 0:
+        raise ValueError('Cursore di sincronizzazione non valido.')
+    return cursor if separator else None
+
+
+def format_cursor(cursor: SyncCursor) -> str:
+    return f'{cursor[0]}_{cursor[1]}' if cursor != (0, 0) else '0'
+
+
+def _tombstone_horizon() -> SyncCursor:
+    row = execute_query(
+        'SELECT tombstone_horizon_txid, tombstone_horizon FROM sync_state WHERE id = 1',
+        fetchone=True,
+    )
+    return (int(row['tombstone_horizon_txid']), int(row['tombstone_horizon'])) if row else (0, 0)
+
+
+def begin_bulk_changes() -> None:
+    """Stop per-row change logging for the rest of the current transaction.
+
+    Bulk writers call this before touching many rows and then
+    :func:`record_bulk_change` once per affected table.
+    """
+
+    db.session.execute(text("SET LOCAL logbook.bulk_sync = 'on'"))
+
+
+def record_bulk_change(table_name: str, user_id: Optional[int] = None) -> None:
+    """Log one change telling clients to fetch ``table_name`` again in full."""
+
+    db.session.execute(
+        text("INSERT INTO sync_changes (user_id, table_name, row_id, op) VALUES (:uid, :table, 0, 'C')"),
+        {'uid': user_id, 'table': table_name},
+    )
+
+
+def get_changes(user_id: int, since: Optional[SyncCursor], *, limit: int = DEFAULT_SYNC_LIMIT) -> Dict[str, object]:
+    """Return upserts and deletions visible to ``user_id`` after ``since``.
+
+    Several changes to the same row inside one page collapse to the latest
+    state; tables written in bulk are listed in ``refresh`` and must be fetched
+    again in full. When ``since`` predates the compaction horizon (or is an
+    old-style cursor) the tombstones the client would need are gone, so
+    ``reset`` is set and the client must restart from cursor ``0``.
+    """
+
+    try:
+        page_size = int(limit)
+    except (TypeError, ValueError):
+        page_size = DEFAULT_SYNC_LIMIT
+    page_size = min(max(page_size, 1), MAX_SYNC_LIMIT)
+
+    if since is None or (0, 0) < since < _tombstone_horizon():
+        return {'reset': True, 'upserts': {}, 'deletions': {}, 'refresh': [], 'next_cursor': '0', 'has_more': True}
+
+    changes = execute_query(
+        """
+        SELECT txid, version, table_name, row_id, op
+        FROM sync_changes
+        WHERE (txid, version) > (:since_txid, :since_version)
+          AND txid < txid_snapshot_xmin(txid_current_snapshot())
+          AND (user_id = :uid OR (user_id IS NULL AND table_name = ANY(:shared)))
+        ORDER BY txid, version
+        LIMIT :limit
+        """,
+        {
+            'uid': user_id,
+            'since_txid': since[0],
+            'since_version': since[1],
+            'shared': list(_SHARED_TABLES),
+            'limit': page_size + 1,
+        },
+        fetchall=True,
+    ) or []
+
+    has_more = len(changes) > page_size
+    changes = changes[:page_size]
+
+    latest_ops: Dict[str, Dict[int, str]] = {}
+    refresh: List[str] = []
+    for change in changes:
+        if change['table_name'] not in _TABLE_SCOPES:
+            continue
+        if change['op'] == 'C':
+            if change['table_name'] not in refresh:
+                refresh.append(change['table_name'])
+        else:
+            latest_ops.setdefault(change['table_name'], {})[change['row_id']] = change['op']
+
+    upserts: Dict[str, List[Dict[str, object]]] = {}
+    deletions: Dict[str, List[int]] = {}
+    for table_name, ops in latest_ops.items():
+        deleted_ids = {row_id for row_id, op in ops.items() if op == 'D'}
+        upsert_ids = [row_id for row_id, op in ops.items() if op == 'U']
+
+        if upsert_ids:
+            rows = execute_query(
+                f'SELECT * FROM {table_name} WHERE id = ANY(:ids) AND {_TABLE_SCOPES[table_name]} ORDER BY id',
+                {'ids': upsert_ids, 'uid': user_id},
+                fetchall=True,
+            ) or []
+            if rows:
+                upserts[table_name] = [serialise_row(row) for row in rows]
+            # Rows that vanished after the change was logged are reported as deleted.
+            found = {row['id'] for row in rows}
+            deleted_ids.update(row_id for row_id in upsert_ids if row_id not in found)
+
+        if deleted_ids:
+            deletions[table_name] = sorted(deleted_ids)
+
+    last = (changes[-1]['txid'], changes[-1]['version']) if changes else since
+    return {
+        'reset': False,
+        'upserts': upserts,
+        'deletions': deletions,
+        'refresh': refresh,
+        'next_cursor': format_cursor(last),
+        'has_more': has_more,
+    }
+
+
+def compact_change_log(retention_days: int) -> Dict[str, int]:
+    """Drop superseded changes and tombstones older than ``retention_days``.
+
+    Only the latest change per row is needed to rebuild a client, so older
+    versions of the same row are always removed. Tombstones are kept for the
+    retention window; removing them raises the horizon below which clients are
+    told to perform a full resync.
+    """
+
+    try:
+        superseded = db.session.execute(
+            text(
+                """
+                DELETE FROM sync_changes sc
+                USING sync_changes newer
+                WHERE newer.table_name = sc.table_name
+                  AND newer.row_id = sc.row_id
+                  AND newer.user_id IS NOT DISTINCT FROM sc.user_id
+                  AND (newer.txid, newer.version) > (sc.txid, sc.version)
+                """
+            )
+        ).rowcount
+        orphaned = db.session.execute(
+            text(
+                """
+                DELETE FROM sync_changes
+                WHERE user_id IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM users u WHERE u.id = sync_changes.user_id)
+                """
+            )
+        ).rowcount
+        expired_row = db.session.execute(
+            text(
+                """
+                WITH expired AS (
+                    DELETE FROM sync_changes
+                    WHERE op = 'D' AND changed_at < clock_timestamp() - make_interval(days => :days)
+                    RETURNING txid, version
+                )
+                SELECT (SELECT COUNT(*) FROM expired) AS removed, newest.txid, newest.version
+                FROM (SELECT 1) one
+                LEFT JOIN LATERAL (
+                    SELECT txid, version FROM expired ORDER BY txid DESC, version DESC LIMIT 1
+                ) newest ON true
+                """
+            ),
+            {'days': max(retention_days, 0)},
+        ).mappings().first()
+        if expired_row and expired_row['txid'] is not None:
+            db.session.execute(
+                text(
+                    """
+                    UPDATE sync_state
+                    SET tombstone_horizon_txid = :txid, tombstone_horizon = :version
+                    WHERE id = 1 AND (tombstone_horizon_txid, tombstone_horizon) < (:txid, :version)
+                    """
+                ),
+                {'txid': expired_row['txid'], 'version': expired_row['version']},
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'superseded': superseded or 0,
+        'orphaned': orphaned or 0,
+        'expired_tombstones': int(expired_row['removed']) if expired_row else 0,
+    }
@@ -2,12 +2,29 @@
 
 from __future__ import annotations
 
+import re
 from collections import defaultdict
-from datetime import date
-from typing import Dict, Iterable, List
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
+from sqlalchemy import text
+
+from extensions import db
 from utils import execute_query
 
+# Weight values that stand for the user's latest body weight.
+BODYWEIGHT_ALIASES = ('io', 'me')
+
+# (exercise_id, set_number, reps, weight, uses_bodyweight)
+WorkoutSet = Tuple[int, int, int, float, bool]
+
+SESSION_TIMESTAMP_PATTERN = re.compile(r'^\d{14}$')
+PROGRESSION_BUCKETS = ('week', 'month')
+EXERCISE_SESSIONS_PAGE_SIZE = 10
+GYM_DIARY_PAGE_SIZE = 20
+MAX_DRAFT_VALUE_LENGTH = 20
+MAX_DRAFT_COMMENT_LENGTH = 1000
+
 
 def _fetch_templates(user_id: int) -> List[Dict]:
     templates_raw = execute_query(
@@ -53,17 +70,20 @@ def _fetch_recent_sessions(
     history_rows = execute_query(
         """
         WITH ranked_sessions AS (
-            SELECT DISTINCT exercise_id,
-                            session_timestamp,
-                            record_date,
-                            ROW_NUMBER() OVER (
-                                PARTITION BY exercise_id
-                                ORDER BY record_date DESC, session_timestamp DESC
-                            ) AS session_rank
-            FROM workout_log
-            WHERE user_id = :user_id
-              AND exercise_id = ANY(:exercise_ids)
-              AND record_date < :record_date
+            SELECT exercise_id,
+                   session_timestamp,
+                   record_date,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY exercise_id
+                       ORDER BY record_date DESC, session_timestamp DESC
+                   ) AS session_rank
+            FROM (
+                SELECT DISTINCT exercise_id, session_timestamp, record_date
+                FROM workout_log
+                WHERE user_id = :user_id
+                  AND exercise_id = ANY(:exercise_ids)
+                  AND record_date < :record_date
+            ) sessions
         ), limited_sessions AS (
             SELECT exercise_id, session_timestamp, record_date
             FROM ranked_sessions
@@ -103,17 +123,20 @@ def _fetch_recent_comments(
     comment_rows = execute_query(
         """
         WITH ranked_sessions AS (
-            SELECT DISTINCT exercise_id,
-                            session_timestamp,
-                            record_date,
-                            ROW_NUMBER() OVER (
-                                PARTITION BY exercise_id
-                                ORDER BY record_date DESC, session_timestamp DESC
-                            ) AS session_rank
-            FROM workout_log
-            WHERE user_id = :user_id
-              AND exercise_id = ANY(:exercise_ids)
-              AND record_date < :record_date
+            SELECT exercise_id,
+                   session_timestamp,
+                   record_date,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY exercise_id
+                       ORDER BY record_date DESC, session_timestamp DESC
+                   ) AS session_rank
+            FROM (
+                SELECT DISTINCT exercise_id, session_timestamp, record_date
+                FROM workout_log
+                WHERE user_id = :user_id
+                  AND exercise_id = ANY(:exercise_ids)
+                  AND record_date < :record_date
+            ) sessions
         ), limited_sessions AS (
             SELECT exercise_id, session_timestamp, record_date
             FROM ranked_sessions
@@ -141,6 +164,59 @@ def _fetch_recent_comments(
     return latest_comments
 
 
+def _fetch_last_sessions(
+    user_id: int,
+    exercise_ids: Iterable[int],
+    before_date: date,
+) -> Tuple[Dict[int, List[Dict]], Dict[int, Dict]]:
+    """Read history and comments from the ``exercise_last_sessions`` snapshot.
+
+    The snapshot holds the newest sessions of each exercise. When a backdated
+    page needs older sessions than it keeps, those exercises fall back to the
+    window queries over ``workout_log``.
+    """
+
+    if not exercise_ids:
+        return {}, {}
+
+    snapshot_rows = execute_query(
+        'SELECT exercise_id, sessions, complete FROM exercise_last_sessions '
+        'WHERE user_id = :user_id AND exercise_id = ANY(:exercise_ids)',
+        {'user_id': user_id, 'exercise_ids': list(exercise_ids)},
+        fetchall=True,
+    )
+
+    history_by_exercise: Dict[int, List[Dict]] = defaultdict(list)
+    latest_comments: Dict[int, Dict] = {}
+    stale: List[int] = []
+    for row in snapshot_rows or []:
+        sessions = [
+            snapshot for snapshot in row['sessions']
+            if date.fromisoformat(snapshot['record_date']) < before_date
+        ]
+        if len(sessions) < 2 and not row['complete']:
+            stale.append(row['exercise_id'])
+            continue
+        for snapshot in sessions[:2]:
+            record_date = date.fromisoformat(snapshot['record_date'])
+            for set_row in snapshot['sets'] or []:
+                history_by_exercise[row['exercise_id']].append({
+                    'exercise_id': row['exercise_id'],
+                    'session_timestamp': snapshot['session_timestamp'],
+                    'record_date': record_date,
+                    'set_number': set_row['set_number'],
+                    'reps': set_row['reps'],
+                    'weight': float(set_row['weight']),
+                })
+            if snapshot['comment'] and row['exercise_id'] not in latest_comments:
+                latest_comments[row['exercise_id']] = {'comment': snapshot['comment'], 'record_date': record_date}
+
+    if stale:
+        history_by_exercise.update(_fetch_recent_sessions(user_id, stale, before_date))
+        latest_comments.update(_fetch_recent_comments(user_id, stale, before_date))
+    return history_by_exercise, latest_comments
+
+
 def get_templates_with_history(user_id: int, before_date: date) -> List[Dict]:
     """Return templates enriched with history and comments."""
 
@@ -149,8 +225,7 @@ def get_templates_with_history(user_id: int, before_date: date) -> List[Dict]:
         return []
 
     exercise_ids = {ex['exercise_id'] for tpl in templates for ex in tpl['exercises']}
-    history_map = _fetch_recent_sessions(user_id, exercise_ids, before_date)
-    comment_map = _fetch_recent_comments(user_id, exercise_ids, before_date)
+    history_map, comment_map = _fetch_last_sessions(user_id, exercise_ids, before_date)
 
     for template in templates:
         for exercise in template['exercises']:
@@ -175,14 +250,276 @@ def get_templates_with_history(user_id: int, before_date: date) -> List[Dict]:
     return templates
 
 
+def get_exercise_records(user_id: int, exercise_id: int) -> Dict[str, object]:
+    """Return the personal records kept in ``exercise_records`` for one exercise.
+
+    ``summary`` holds the best estimated 1RMs (Epley and Brzycki) and the best
+    session volume with their dates; ``rep_records`` lists the best weight per
+    rep count. The records are maintained by triggers on ``workout_log``.
+    """
+
+    summary = execute_query(
+        'SELECT e1rm_epley, e1rm_epley_date, e1rm_brzycki, e1rm_brzycki_date, best_volume, best_volume_date '
+        'FROM exercise_records WHERE user_id = :user_id AND exercise_id = :exercise_id',
+        {'user_id': user_id, 'exercise_id': exercise_id},
+        fetchone=True,
+    )
+    rep_records = execute_query(
+        'SELECT reps, weight, record_date FROM exercise_rep_records '
+        'WHERE user_id = :user_id AND exercise_id = :exercise_id ORDER BY reps',
+        {'user_id': user_id, 'exercise_id': exercise_id},
+        fetchall=True,
+    )
+    return {'summary': dict(summary) if summary else None, 'rep_records': [dict(row) for row in rep_records or []]}
+
+
+def fetch_exercise_progression(
+    user_id: int,
+    exercise_id: int,
+    *,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    bucket: Optional[str] = None,
+) -> List[Dict[str, object]]:
+    """Per-session (or per week/month) aggregates of one exercise, oldest first.
+
+    Each point has the top set (heaviest weight and its reps), total volume,
+    total reps, the best Epley estimated 1RM from sets of 1-12 reps and the
+    number of sessions. Everything is aggregated in SQL.
+    """
+
+    if bucket is not None and bucket not in PROGRESSION_BUCKETS:
+        raise ValueError('Raggruppamento non valido: usa week o month.')
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("La data iniziale deve precedere quella finale.")
+
+    filters = ''
+    if date_from:
+        filters += ' AND record_date >= :date_from'
+    if date_to:
+        filters += ' AND record_date <= :date_to'
+
+    if bucket:
+        select = """
+            SELECT CAST(date_trunc(:bucket, record_date) AS DATE) AS period_start,
+                   MAX(top_weight) AS top_weight,
+                   (array_agg(top_reps ORDER BY top_weight DESC, top_reps DESC))[1] AS top_reps,
+                   SUM(volume) AS volume,
+                   SUM(total_reps) AS total_reps,
+                   MAX(e1rm) AS e1rm,
+                   COUNT(*) AS sessions
+            FROM per_session
+            GROUP BY 1
+            ORDER BY 1
+        """
+    else:
+        select = """
+            SELECT record_date AS period_start, top_weight, top_reps, volume, total_reps, e1rm, 1 AS sessions
+            FROM per_session
+            ORDER BY record_date, session_timestamp
+        """
+
+    rows = execute_query(
+        f"""
+        WITH per_session AS (
+            SELECT record_date,
+                   session_timestamp,
+                   MAX(weight) AS top_weight,
+                   (array_agg(reps ORDER BY weight DESC, reps DESC))[1] AS top_reps,
+                   SUM(CAST(weight AS DOUBLE PRECISION) * reps) AS volume,
+                   SUM(reps) AS total_reps,
+                   MAX(weight * (1 + reps / 30.0)) FILTER (WHERE reps BETWEEN 1 AND 12 AND weight > 0) AS e1rm
+            FROM workout_log
+            WHERE user_id = :user_id AND exercise_id = :exercise_id{filters}
+            GROUP BY record_date, session_timestamp
+        )
+        {select}
+        """,
+        {'user_id': user_id, 'exercise_id': exercise_id, 'date_from': date_from, 'date_to': date_to, 'bucket': bucket},
+        fetchall=True,
+    )
+
+    return [
+        {
+            'period_start': row['period_start'].isoformat(),
+            'top_weight': round(float(row['top_weight']), 2),
+            'top_reps': int(row['top_reps']),
+            'volume': round(float(row['volume']), 1),
+            'total_reps': int(row['total_reps']),
+            'e1rm': round(float(row['e1rm']), 1) if row['e1rm'] is not None else None,
+            'sessions': int(row['sessions']),
+        }
+        for row in rows or []
+    ]
+
+
+def parse_session_cursor(raw: Optional[str]) -> Optional[Tuple[date, str]]:
+    """Decode a ``<record_date>_<session_timestamp>`` page cursor."""
+
+    if not raw:
+        return None
+    record_date, _, session_timestamp = raw.partition('_')
+    if not SESSION_TIMESTAMP_PATTERN.match(session_timestamp):
+        raise ValueError('Cursore non valido.')
+    return datetime.strptime(record_date, '%Y-%m-%d').date(), session_timestamp
+
+
+def fetch_exercise_sessions_page(
+    user_id: int,
+    exercise_id: int,
+    before: Optional[Tuple[date, str]] = None,
+    limit: int = EXERCISE_SESSIONS_PAGE_SIZE,
+) -> Tuple[List[Dict[str, object]], Optional[str]]:
+    """Return one page of sessions with their sets, newest first, and the next cursor.
+
+    Sessions are paged by ``(record_date, session_timestamp)`` on the
+    ``idx_workout_log_user_exercise_date`` index; only the sets of the page
+    are read.
+    """
+
+    keyset = 'AND (record_date, session_timestamp) < (:before_date, :before_ts)' if before else ''
+    rows = execute_query(
+        f"""
+        WITH page AS (
+            SELECT DISTINCT record_date, session_timestamp
+            FROM workout_log
+            WHERE user_id = :user_id AND exercise_id = :exercise_id {keyset}
+            ORDER BY record_date DESC, session_timestamp DESC
+            LIMIT :limit
+        )
+        SELECT wl.record_date, wl.session_timestamp, wl.set_number, wl.reps, wl.weight
+        FROM page p
+        JOIN workout_log wl
+          ON wl.user_id = :user_id
+         AND wl.exercise_id = :exercise_id
+         AND wl.record_date = p.record_date
+         AND wl.session_timestamp = p.session_timestamp
+        ORDER BY wl.record_date DESC, wl.session_timestamp DESC, wl.id
+        """,
+        {
+            'user_id': user_id,
+            'exercise_id': exercise_id,
+            'before_date': before[0] if before else None,
+            'before_ts': before[1] if before else None,
+            'limit': limit + 1,
+        },
+        fetchall=True,
+    )
+
+    sessions: List[Dict[str, object]] = []
+    for row in rows or []:
+        if not sessions or sessions[-1]['session_timestamp'] != row['session_timestamp']:
+            sessions.append({
+                'record_date': row['record_date'],
+                'session_timestamp': row['session_timestamp'],
+                'date_formatted': row['record_date'].strftime('%d %b %y'),
+                'sets': [],
+            })
+        sessions[-1]['sets'].append(dict(row))
+
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        next_cursor = f"{last['record_date'].isoformat()}_{last['session_timestamp']}"
+    return sessions, next_cursor
+
+
+def fetch_gym_diary_page(
+    user_id: int,
+    before: Optional[Tuple[date, str]] = None,
+    limit: int = GYM_DIARY_PAGE_SIZE,
+) -> Tuple[List[Dict[str, object]], Optional[str]]:
+    """Return one page of the gym diary grouped by day, newest first, and the next cursor.
+
+    At most ``limit + 1`` sessions are read by ``(record_date,
+    session_timestamp)``, then only the sets of the page. A page ends on a day
+    boundary unless a single day has more than ``limit`` sessions.
+    """
+
+    keyset = 'AND (ws.record_date, ws.session_timestamp) < (:before_date, :before_ts)' if before else ''
+    session_rows = execute_query(
+        f"""
+        SELECT ws.id, ws.record_date, ws.session_timestamp, ws.started_at, ws.duration_minutes,
+               ws.template_name, ws.session_note, ws.session_rating
+        FROM workout_sessions ws
+        WHERE ws.user_id = :user_id {keyset}
+          AND EXISTS (SELECT 1 FROM workout_log wl WHERE wl.session_id = ws.id)
+        ORDER BY ws.record_date DESC, ws.session_timestamp DESC
+        LIMIT :limit
+        """,
+        {
+            'user_id': user_id,
+            'before_date': before[0] if before else None,
+            'before_ts': before[1] if before else None,
+            'limit': limit + 1,
+        },
+        fetchall=True,
+    ) or []
+
+    next_cursor = None
+    if len(session_rows) > limit:
+        overflow_day = session_rows[limit]['record_date']
+        session_rows = session_rows[:limit]
+        if session_rows[0]['record_date'] != overflow_day:
+            session_rows = [row for row in session_rows if row['record_date'] != overflow_day]
+        last = session_rows[-1]
+        next_cursor = f"{last['record_date'].isoformat()}_{last['session_timestamp']}"
+    if not session_rows:
+        return [], None
+
+    set_rows = execute_query(
+        """
+        SELECT wl.session_id, e.name AS exercise_name, wl.set_number, wl.reps, wl.weight
+        FROM workout_log wl
+        JOIN exercises e ON e.id = wl.exercise_id
+        WHERE wl.session_id = ANY(CAST(:session_ids AS INTEGER[]))
+        ORDER BY wl.id
+        """,
+        {'session_ids': [row['id'] for row in session_rows]},
+        fetchall=True,
+    ) or []
+    exercises_by_session: Dict[int, Dict[str, List[Dict[str, object]]]] = {}
+    for row in set_rows:
+        exercises = exercises_by_session.setdefault(row['session_id'], {})
+        exercises.setdefault(row['exercise_name'], []).append(
+            {'set': row['set_number'], 'reps': row['reps'], 'weight': row['weight']}
+        )
+
+    days: List[Dict[str, object]] = []
+    for row in session_rows:
+        if not days or days[-1]['record_date'] != row['record_date']:
+            days.append({
+                'record_date': row['record_date'],
+                'date_formatted': row['record_date'].strftime('%d %b %y'),
+                'template_names': [],
+                'sessions': [],
+            })
+        day = days[-1]
+        template_name = row['template_name'] or 'Allenamento Libero'
+        if template_name not in day['template_names']:
+            day['template_names'].append(template_name)
+        day['sessions'].append({
+            'session_timestamp': row['session_timestamp'],
+            'time_formatted': row['started_at'].strftime('%H:%M'),
+            'duration': row['duration_minutes'],
+            'template_name': template_name,
+            'session_note': row['session_note'],
+            'session_rating': row['session_rating'],
+            'exercises': exercises_by_session.get(row['id'], {}),
+        })
+    return days, next_cursor
+
+
 def get_session_log_data(user_id: int, session_timestamp: str) -> Dict[str, Dict]:
     log_data: Dict[str, Dict] = {}
     if not session_timestamp:
         return log_data
 
     log_rows = execute_query(
-        'SELECT exercise_id, set_number, reps, weight FROM workout_log '
-        'WHERE user_id = :user_id AND session_timestamp = :timestamp',
+        'SELECT wl.exercise_id, wl.set_number, wl.reps, wl.weight FROM workout_sessions ws '
+        'JOIN workout_log wl ON wl.session_id = ws.id '
+        'WHERE ws.user_id = :user_id AND ws.session_timestamp = :timestamp',
         {'user_id': user_id, 'timestamp': session_timestamp},
         fetchall=True,
     )
@@ -190,8 +527,9 @@ def get_session_log_data(user_id: int, session_timestamp: str) -> Dict[str, Dict
         log_data[f"{row['exercise_id']}_{row['set_number']}"] = {'reps': row['reps'], 'weight': row['weight']}
 
     comment_rows = execute_query(
-        'SELECT exercise_id, comment FROM workout_session_comments '
-        'WHERE user_id = :user_id AND session_timestamp = :timestamp',
+        'SELECT c.exercise_id, c.comment FROM workout_sessions ws '
+        'JOIN workout_session_comments c ON c.session_id = ws.id '
+        'WHERE ws.user_id = :user_id AND ws.session_timestamp = :timestamp',
         {'user_id': user_id, 'timestamp': session_timestamp},
         fetchall=True,
     )
@@ -211,3 +549,385 @@ def get_session_log_data(user_id: int, session_timestamp: str) -> Dict[str, Dict
             log_data['session_rating'] = session_details['session_rating']
 
     return log_data
+
+
+def parse_workout_form(form: Mapping[str, str]) -> Tuple[List[WorkoutSet], List[Tuple[int, str]]]:
+    """Turn the session form into validated sets and per-exercise comments.
+
+    Sets come from ``reps_<exercise>_<set>`` / ``weight_<exercise>_<set>``
+    pairs and are kept when reps are positive; an unreadable weight counts as
+    0 and ``io``/``me`` is resolved to body weight when the batch is saved.
+    """
+
+    sets: List[WorkoutSet] = []
+    comments: List[Tuple[int, str]] = []
+    for key, value in form.items():
+        parts = key.split('_')
+        if parts[0] == 'reps' and len(parts) == 3 and value:
+            try:
+                exercise_id, set_number, reps = int(parts[1]), int(parts[2]), int(value)
+            except ValueError:
+                continue
+            if reps <= 0:
+                continue
+            weight_raw = (form.get(f'weight_{exercise_id}_{set_number}') or '').strip().lower()
+            uses_bodyweight = weight_raw in BODYWEIGHT_ALIASES
+            weight = 0.0
+            if not uses_bodyweight:
+                try:
+                    weight = float(weight_raw)
+                except ValueError:
+                    weight = 0.0
+            if weight >= 0:
+                sets.append((exercise_id, set_number, reps, weight, uses_bodyweight))
+        elif parts[0] == 'comment' and len(parts) == 2 and value:
+            try:
+                comments.append((int(parts[1]), value))
+            except ValueError:
+                continue
+    return sets, comments
+
+
+_SESSION_UPDATE = """UPDATE
+                SET template_name = EXCLUDED.template_name,
+                    duration_minutes = EXCLUDED.duration_minutes,
+                    session_note = EXCLUDED.session_note,
+                    session_rating = EXCLUDED.session_rating"""
+
+
+def _session_start(session_timestamp: str) -> Optional[datetime]:
+    """Start time encoded in a ``YYYYMMDDHHMMSS`` key, or ``None`` for legacy keys.
+
+    Like the backfill of migration 0024, sessions without a parsable key start
+    at midnight of their ``record_date``.
+    """
+
+    if not SESSION_TIMESTAMP_PATTERN.match(session_timestamp):
+        return None
+    try:
+        return datetime.strptime(session_timestamp, '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+
+
+def save_workout_session(
+    user_id: int,
+    session_timestamp: str,
+    record_date: str,
+    details: Mapping[str, object],
+    sets: List[WorkoutSet],
+    comments: List[Tuple[int, str]],
+    *,
+    replace: bool = False,
+) -> Optional[int]:
+    """Write a whole session in one transaction with a constant number of statements.
+
+    ``details`` holds ``template_name``, ``duration_minutes``, ``session_note``
+    and ``session_rating``. When ``replace`` is true the session's previous
+    sets and comments are dropped first; otherwise saving a timestamp that is
+    already stored (a resubmitted form or finalize) writes nothing and returns
+    the existing id. Returns the session id, or ``None`` when there is nothing
+    to save; on any error nothing is written.
+    """
+
+    if not sets:
+        return None
+    try:
+        _lock_session_key(user_id, session_timestamp)
+        session_id = db.session.execute(
+            text(
+                """
+                INSERT INTO workout_sessions
+                    (user_id, session_timestamp, started_at, record_date, template_name, duration_minutes, session_note, session_rating)
+                VALUES (:uid, :ts, COALESCE(:started, CAST(:rd AS TIMESTAMP)), :rd, :tn, :dur, :note, :rating)
+                ON CONFLICT (user_id, session_timestamp) DO {conflict}
+                RETURNING id
+                """.format(conflict=_SESSION_UPDATE if replace else 'NOTHING')
+            ),
+            {
+                'uid': user_id,
+                'ts': session_timestamp,
+                'started': _session_start(session_timestamp),
+                'rd': record_date,
+                'tn': details.get('template_name'),
+                'dur': details.get('duration_minutes'),
+                'note': details.get('session_note'),
+                'rating': details.get('session_rating'),
+            },
+        ).scalar()
+        if session_id is None:
+            existing_id = db.session.execute(
+                text("SELECT id FROM workout_sessions WHERE user_id = :uid AND session_timestamp = :ts"),
+                {'uid': user_id, 'ts': session_timestamp},
+            ).scalar()
+            _delete_draft(user_id, session_timestamp)
+            db.session.commit()
+            return existing_id
+
+        if replace:
+            db.session.execute(
+                text(
+                    """
+                    WITH removed_sets AS (
+                        DELETE FROM workout_log WHERE session_id = :sid
+                    )
+                    DELETE FROM workout_session_comments WHERE session_id = :sid
+                    """
+                ),
+                {'sid': session_id},
+            )
+
+        # The body-weight lookup is an uncorrelated subquery: Postgres runs it
+        # once per statement, and only the "io"/"me" rows use it.
+        db.session.execute(
+            text(
+                """
+                INSERT INTO workout_log (user_id, exercise_id, record_date, session_timestamp, session_id, set_number, reps, weight)
+                SELECT :uid, s.exercise_id, :rd, :ts, :sid, s.set_number, s.reps,
+                       CASE WHEN s.bodyweight THEN COALESCE((
+                           SELECT d.weight FROM daily_data d
+                           WHERE d.user_id = :uid AND d.weight IS NOT NULL
+                           ORDER BY d.record_date DESC LIMIT 1
+                       ), 0) ELSE s.weight END
+                FROM unnest(
+                    CAST(:exercise_ids AS INTEGER[]), CAST(:set_numbers AS INTEGER[]),
+                    CAST(:reps AS INTEGER[]), CAST(:weights AS REAL[]), CAST(:bodyweight AS BOOLEAN[])
+                ) AS s(exercise_id, set_number, reps, weight, bodyweight)
+                """
+            ),
+            {
+                'uid': user_id,
+                'rd': record_date,
+                'ts': session_timestamp,
+                'sid': session_id,
+                'exercise_ids': [row[0] for row in sets],
+                'set_numbers': [row[1] for row in sets],
+                'reps': [row[2] for row in sets],
+                'weights': [row[3] for row in sets],
+                'bodyweight': [row[4] for row in sets],
+            },
+        )
+
+        if comments:
+            db.session.execute(
+                text(
+                    """
+                    INSERT INTO workout_session_comments (user_id, session_timestamp, session_id, exercise_id, comment)
+                    SELECT :uid, :ts, :sid, c.exercise_id, c.comment
+                    FROM unnest(CAST(:exercise_ids AS INTEGER[]), CAST(:comments AS TEXT[])) AS c(exercise_id, comment)
+                    ON CONFLICT (user_id, session_timestamp, exercise_id) DO UPDATE SET comment = EXCLUDED.comment
+                    """
+                ),
+                {
+                    'uid': user_id,
+                    'ts': session_timestamp,
+                    'sid': session_id,
+                    'exercise_ids': [exercise_id for exercise_id, _ in comments],
+                    'comments': [comment for _, comment in comments],
+                },
+            )
+        _delete_draft(user_id, session_timestamp)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return session_id
+
+
+def _lock_session_key(user_id: int, session_timestamp: str) -> None:
+    """Serialize saves and autosaves of one session until the transaction ends.
+
+    Under READ COMMITTED an autosave's ``NOT EXISTS`` check cannot see a save
+    that has not committed yet, so without the lock a late autosave could
+    recreate the draft the save has just deleted.
+    """
+
+    db.session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext('workout_session:' || :uid || ':' || :ts))"),
+        {'uid': user_id, 'ts': session_timestamp},
+    )
+
+
+def _delete_draft(user_id: int, session_timestamp: str) -> None:
+    db.session.execute(
+        text(
+            """
+            WITH removed_sets AS (
+                DELETE FROM workout_draft_sets WHERE user_id = :uid AND session_timestamp = :ts
+            )
+            DELETE FROM workout_draft_comments WHERE user_id = :uid AND session_timestamp = :ts
+            """
+        ),
+        {'uid': user_id, 'ts': session_timestamp},
+    )
+
+
+def _draft_text(value: object, limit: int) -> str:
+    value = '' if value is None else str(value).strip()
+    if len(value) > limit:
+        raise ValueError('Valore troppo lungo.')
+    return value
+
+
+_SESSION_NOT_SAVED = """
+    WHERE NOT EXISTS (
+        SELECT 1 FROM workout_sessions WHERE user_id = :uid AND session_timestamp = :ts
+    )
+"""
+
+
+def autosave_draft(user_id: int, session_timestamp: str, record_date: str, change: Mapping[str, object]) -> bool:
+    """Store one set or one comment of an in-progress session.
+
+    ``change`` holds ``exercise_id`` plus either ``set_number``, ``reps`` and
+    ``weight`` or ``comment``. Each call is a single-row upsert, or a delete
+    when the values were cleared. Returns ``False`` without writing when the
+    session has already been saved, so a late autosave cannot revive a draft.
+    """
+
+    try:
+        exercise_id = int(change.get('exercise_id'))
+        set_number = int(change['set_number']) if 'set_number' in change else None
+    except (TypeError, ValueError):
+        raise ValueError('Esercizio o serie non validi.') from None
+    params = {'uid': user_id, 'ts': session_timestamp, 'rd': record_date, 'eid': exercise_id}
+
+    if set_number is not None:
+        if set_number <= 0:
+            raise ValueError('Esercizio o serie non validi.')
+        params.update(
+            set=set_number,
+            reps=_draft_text(change.get('reps'), MAX_DRAFT_VALUE_LENGTH),
+            weight=_draft_text(change.get('weight'), MAX_DRAFT_VALUE_LENGTH),
+        )
+        if params['reps'] or params['weight']:
+            query = """
+                INSERT INTO workout_draft_sets (user_id, session_timestamp, exercise_id, set_number, record_date, reps, weight)
+                SELECT :uid, :ts, :eid, :set, :rd, :reps, :weight
+                """ + _SESSION_NOT_SAVED + """
+                ON CONFLICT (user_id, session_timestamp, exercise_id, set_number) DO UPDATE
+                SET reps = EXCLUDED.reps, weight = EXCLUDED.weight, record_date = EXCLUDED.record_date,
+                    updated_at = CURRENT_TIMESTAMP
+            """
+        else:
+            query = """
+                DELETE FROM workout_draft_sets
+                WHERE user_id = :uid AND session_timestamp = :ts AND exercise_id = :eid AND set_number = :set
+            """
+    elif 'comment' in change:
+        params['comment'] = _draft_text(change.get('comment'), MAX_DRAFT_COMMENT_LENGTH)
+        if params['comment']:
+            query = """
+                INSERT INTO workout_draft_comments (user_id, session_timestamp, exercise_id, record_date, comment)
+                SELECT :uid, :ts, :eid, :rd, :comment
+                """ + _SESSION_NOT_SAVED + """
+                ON CONFLICT (user_id, session_timestamp, exercise_id) DO UPDATE
+                SET comment = EXCLUDED.comment, record_date = EXCLUDED.record_date, updated_at = CURRENT_TIMESTAMP
+            """
+        else:
+            query = """
+                DELETE FROM workout_draft_comments
+                WHERE user_id = :uid AND session_timestamp = :ts AND exercise_id = :eid
+            """
+    else:
+        raise ValueError('Indica una serie o un commento.')
+
+    try:
+        _lock_session_key(user_id, session_timestamp)
+        written = db.session.execute(text(query), params).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Deletes may find nothing to remove; only a skipped upsert means "saved".
+    return written > 0 or query.lstrip().startswith('DELETE')
+
+
+def discard_draft(user_id: int, session_timestamp: str) -> None:
+    """Forget every autosaved value of a session that was not finalized."""
+
+    try:
+        _delete_draft(user_id, session_timestamp)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+_DRAFT_ROWS = """
+    WITH target AS ({target})
+    SELECT s.session_timestamp, s.record_date, s.exercise_id, s.set_number, s.reps, s.weight, NULL AS comment
+    FROM workout_draft_sets s
+    JOIN target t ON t.session_timestamp = s.session_timestamp
+    WHERE s.user_id = :uid
+    UNION ALL
+    SELECT c.session_timestamp, c.record_date, c.exercise_id, NULL, NULL, NULL, c.comment
+    FROM workout_draft_comments c
+    JOIN target t ON t.session_timestamp = c.session_timestamp
+    WHERE c.user_id = :uid
+"""
+
+_LATEST_DRAFT_OF_DAY = """
+    SELECT session_timestamp
+    FROM (
+        SELECT session_timestamp, updated_at FROM workout_draft_sets WHERE user_id = :uid AND record_date = :rd
+        UNION ALL
+        SELECT session_timestamp, updated_at FROM workout_draft_comments WHERE user_id = :uid AND record_date = :rd
+    ) drafts
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+
+
+def _draft_form(rows: Iterable[Mapping[str, object]]) -> Dict[str, str]:
+    """Rebuild the session form fields from draft rows."""
+
+    form: Dict[str, str] = {}
+    for row in rows:
+        if row['set_number'] is None:
+            form[f"comment_{row['exercise_id']}"] = row['comment']
+        else:
+            form[f"reps_{row['exercise_id']}_{row['set_number']}"] = row['reps']
+            form[f"weight_{row['exercise_id']}_{row['set_number']}"] = row['weight']
+    return form
+
+
+def load_open_draft(user_id: int, record_date: str) -> Optional[Tuple[str, Dict[str, object]]]:
+    """Return the most recently edited draft of the day as ``(timestamp, log_data)``.
+
+    ``log_data`` has the shape of :func:`get_session_log_data`, so the session
+    page can show a draft saved from another device.
+    """
+
+    rows = db.session.execute(
+        text(_DRAFT_ROWS.format(target=_LATEST_DRAFT_OF_DAY)),
+        {'uid': user_id, 'rd': record_date},
+    ).mappings().all()
+    if not rows:
+        return None
+
+    log_data: Dict[str, object] = {}
+    for row in rows:
+        if row['set_number'] is None:
+            log_data[f"comment_{row['exercise_id']}"] = row['comment']
+        else:
+            log_data[f"{row['exercise_id']}_{row['set_number']}"] = {'reps': row['reps'], 'weight': row['weight']}
+    return rows[0]['session_timestamp'], log_data
+
+
+def finalize_workout_draft(user_id: int, session_timestamp: str, details: Mapping[str, object]) -> Optional[int]:
+    """Turn an autosaved draft into a saved session without re-sending the sets.
+
+    Returns the session id, or ``None`` when the draft has no valid set.
+    """
+
+    rows = db.session.execute(
+        text(_DRAFT_ROWS.format(target='SELECT CAST(:ts AS TEXT) AS session_timestamp')),
+        {'uid': user_id, 'ts': session_timestamp},
+    ).mappings().all()
+    if not rows:
+        return None
+    sets, comments = parse_workout_form(_draft_form(rows))
+    return save_workout_session(
+        user_id, session_timestamp, str(rows[0]['record_date']), details, sets, comments,
+    )
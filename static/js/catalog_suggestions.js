@@ -107,6 +107,14 @@
         });
     };
 
+    const loadCatalog = (catalogUrl) => fetch(catalogUrl, {
+        credentials: 'same-origin',
+        headers: {'Accept': 'application/json'},
+    })
+        .then((response) => (response.ok ? response.json() : {items: []}))
+        .then((payload) => (Array.isArray(payload.items) ? payload.items : []))
+        .catch(() => []);
+
     const generateId = (prefix) => `${prefix}-${Math.random().toString(36).slice(2, 9)}`;
 
     class SuggestionsField {
@@ -148,6 +156,17 @@
             this.registerEvents();
         }
 
+        setItems(items) {
+            this.localCatalog = buildCatalog(items);
+            if (this.localCatalog.list.length) {
+                this.remoteFetcher = null;
+            }
+
+            if (document.activeElement === this.input) {
+                this.requestSuggestions({allowEmpty: true});
+            }
+        }
+
         registerEvents() {
             const handleInput = () => {
                 this.clearInvalid();
@@ -585,12 +604,19 @@
 
         const items = Array.isArray(config.items) ? config.items : [];
         const endpoint = config.endpoint || null;
+        const catalogUrl = config.catalogUrl || null;
 
-        if (!items.length && !endpoint) {
+        if (!items.length && !endpoint && !catalogUrl) {
             return null;
         }
 
-        return new SuggestionsField(config);
+        const field = new SuggestionsField(config);
+        if (catalogUrl) {
+            // The versioned catalog is served with long-lived caching; until it
+            // arrives the field falls back to the remote endpoint, if any.
+            loadCatalog(catalogUrl).then((catalogItems) => field.setItems(catalogItems));
+        }
+        return field;
     };
 
     const initField = (config) => setupField(config);
@@ -0,0 +1,103 @@
+// static/js/infinite_scroll.js
+
+/**
+ * Scorrimento infinito per le liste paginate lato server.
+ *
+ * Il contenitore ha `data-infinite-scroll`, `data-next-url` (URL del frammento
+ * HTML con la pagina successiva) e `data-infinite-trigger` (selettore del link
+ * "Carica altri", che senza JavaScript porta alla pagina successiva completa).
+ * Il server indica la pagina seguente nell'header `X-Next-Url`.
+ */
+(function () {
+    const FRAGMENT_HEADER = 'X-Logbook-Fragment';
+
+    function setupInfiniteScroll(container) {
+        let nextUrl = container.dataset.nextUrl;
+        const trigger = container.dataset.infiniteTrigger
+            ? document.querySelector(container.dataset.infiniteTrigger)
+            : null;
+        let loading = false;
+        let observer = null;
+
+        const finish = () => {
+            nextUrl = null;
+            if (observer) {
+                observer.disconnect();
+            }
+            if (trigger) {
+                trigger.remove();
+            }
+        };
+
+        const loadMore = () => {
+            if (loading || !nextUrl) {
+                return;
+            }
+            loading = true;
+            if (trigger) {
+                trigger.classList.add('disabled');
+            }
+
+            fetch(nextUrl, {
+                credentials: 'same-origin',
+                headers: { [FRAGMENT_HEADER]: '1' },
+            })
+                .then((response) => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    const following = response.headers.get('X-Next-Url');
+                    return response.text().then((html) => ({ html, following }));
+                })
+                .then(({ html, following }) => {
+                    container.insertAdjacentHTML('beforeend', html);
+                    if (following) {
+                        nextUrl = following;
+                        if (observer && trigger) {
+                            // Ricontrolla subito: il link potrebbe essere ancora visibile.
+                            observer.unobserve(trigger);
+                            observer.observe(trigger);
+                        }
+                    } else {
+                        finish();
+                    }
+                })
+                .catch((error) => {
+                    // Lascia il link come ripiego: porta alla pagina completa successiva.
+                    console.warn('Caricamento pagina successiva non riuscito', error);
+                    if (observer) {
+                        observer.disconnect();
+                    }
+                })
+                .finally(() => {
+                    loading = false;
+                    if (trigger) {
+                        trigger.classList.remove('disabled');
+                    }
+                });
+        };
+
+        if (trigger) {
+            trigger.addEventListener('click', (event) => {
+                if (!nextUrl) {
+                    return;
+                }
+                event.preventDefault();
+                loadMore();
+            });
+        }
+
+        if (trigger && 'IntersectionObserver' in window) {
+            observer = new IntersectionObserver((entries) => {
+                if (entries.some((entry) => entry.isIntersecting)) {
+                    loadMore();
+                }
+            }, { rootMargin: '200px' });
+            observer.observe(trigger);
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-infinite-scroll]').forEach(setupInfiniteScroll);
+    });
+})();
@@ -0,0 +1,138 @@
+// static/js/progression_chart.js
+
+/**
+ * Grafico della progressione di un esercizio.
+ *
+ * Il contenitore ha `data-progression-url` (endpoint JSON con gli aggregati
+ * calcolati dal server) e tre select per valore, raggruppamento e periodo.
+ * Il grafico è un semplice SVG, senza librerie esterne.
+ */
+(function () {
+    const SVG_NS = 'http://www.w3.org/2000/svg';
+    const WIDTH = 600;
+    const HEIGHT = 220;
+    const PADDING = { top: 16, right: 16, bottom: 28, left: 48 };
+    const UNITS = { e1rm: 'kg', top_weight: 'kg', volume: 'kg', total_reps: 'reps' };
+
+    function svgElement(name, attributes) {
+        const element = document.createElementNS(SVG_NS, name);
+        Object.entries(attributes).forEach(([key, value]) => element.setAttribute(key, value));
+        return element;
+    }
+
+    function formatDate(isoDate) {
+        const [year, month, day] = isoDate.split('-');
+        return `${day}/${month}/${year.slice(2)}`;
+    }
+
+    function isoDaysAgo(days) {
+        const date = new Date();
+        date.setDate(date.getDate() - days);
+        return date.toISOString().slice(0, 10);
+    }
+
+    function draw(canvas, series, metric) {
+        const points = series.filter((point) => point[metric] !== null && point[metric] !== undefined);
+        canvas.textContent = '';
+        if (!points.length) {
+            canvas.textContent = 'Nessun dato nel periodo selezionato.';
+            return;
+        }
+
+        const values = points.map((point) => point[metric]);
+        let min = Math.min(...values);
+        let max = Math.max(...values);
+        if (min === max) {
+            min -= 1;
+            max += 1;
+        }
+        const plotWidth = WIDTH - PADDING.left - PADDING.right;
+        const plotHeight = HEIGHT - PADDING.top - PADDING.bottom;
+        const x = (index) => PADDING.left + (points.length === 1 ? plotWidth / 2 : (index * plotWidth) / (points.length - 1));
+        const y = (value) => PADDING.top + plotHeight - ((value - min) / (max - min)) * plotHeight;
+
+        const svg = svgElement('svg', {
+            viewBox: `0 0 ${WIDTH} ${HEIGHT}`,
+            width: '100%',
+            role: 'img',
+            'aria-label': 'Grafico della progressione',
+            class: 'text-light',
+        });
+        svg.appendChild(svgElement('line', {
+            x1: PADDING.left, y1: PADDING.top + plotHeight, x2: WIDTH - PADDING.right, y2: PADDING.top + plotHeight,
+            stroke: 'currentColor', 'stroke-opacity': '0.3',
+        }));
+
+        const labels = [
+            [PADDING.left - 6, y(max) + 4, 'end', `${Math.round(max * 10) / 10}`],
+            [PADDING.left - 6, y(min) + 4, 'end', `${Math.round(min * 10) / 10}`],
+            [PADDING.left, HEIGHT - 8, 'start', formatDate(points[0].period_start)],
+            [WIDTH - PADDING.right, HEIGHT - 8, 'end', formatDate(points[points.length - 1].period_start)],
+        ];
+        labels.forEach(([lx, ly, anchor, text]) => {
+            const label = svgElement('text', { x: lx, y: ly, 'text-anchor': anchor, 'font-size': '11', fill: 'currentColor' });
+            label.textContent = text;
+            svg.appendChild(label);
+        });
+
+        svg.appendChild(svgElement('polyline', {
+            points: points.map((point, index) => `${x(index)},${y(point[metric])}`).join(' '),
+            fill: 'none',
+            stroke: 'currentColor',
+            'stroke-width': '2',
+        }));
+        points.forEach((point, index) => {
+            const dot = svgElement('circle', { cx: x(index), cy: y(point[metric]), r: '3', fill: 'currentColor' });
+            const title = svgElement('title', {});
+            title.textContent = `${formatDate(point.period_start)}: ${point[metric]} ${UNITS[metric]}`
+                + (point.sessions > 1 ? ` (${point.sessions} sessioni)` : '');
+            dot.appendChild(title);
+            svg.appendChild(dot);
+        });
+        canvas.appendChild(svg);
+    }
+
+    function setupChart(container) {
+        const canvas = container.querySelector('[data-progression-canvas]');
+        const metricSelect = container.querySelector('[data-progression-metric]');
+        const bucketSelect = container.querySelector('[data-progression-bucket]');
+        const rangeSelect = container.querySelector('[data-progression-range]');
+        let series = [];
+
+        const render = () => draw(canvas, series, metricSelect.value);
+
+        const load = () => {
+            const url = new URL(container.dataset.progressionUrl, window.location.origin);
+            if (bucketSelect.value) {
+                url.searchParams.set('bucket', bucketSelect.value);
+            }
+            if (rangeSelect.value) {
+                url.searchParams.set('from', isoDaysAgo(Number(rangeSelect.value)));
+            }
+            fetch(url, { credentials: 'same-origin', headers: { Accept: 'application/json' } })
+                .then((response) => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then((payload) => {
+                    series = payload.series || [];
+                    render();
+                })
+                .catch((error) => {
+                    console.warn('Caricamento della progressione non riuscito', error);
+                    canvas.textContent = 'Impossibile caricare il grafico.';
+                });
+        };
+
+        metricSelect.addEventListener('change', render);
+        bucketSelect.addEventListener('change', load);
+        rangeSelect.addEventListener('change', load);
+        load();
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-progression-url]').forEach(setupChart);
+    });
+})();
@@ -8,6 +8,8 @@
 
     const STOPWATCH_UPDATE_MS = 250;
     const RUNNING_TIMER_INTERVAL = 1000;
+    const SESSION_TIMESTAMP_PATTERN = /^\d{14}$/;
+    const AUTOSAVE_FIELD_PATTERN = /^(reps|weight)_(\d+)_(\d+)$|^comment_(\d+)$/;
 
     const DEFAULT_MESSAGES = {
         save: 'Sei sicuro di voler salvare la sessione?',
@@ -28,12 +30,18 @@
             isEditing: false,
             durationMinutes: null,
             initialDurationMinutes: null,
-            cancelUrl: ''
+            cancelUrl: '',
+            sessionTimestamp: '',
+            autosaveUrl: ''
         },
         draftKey: 'workout_draft',
         storageAvailable: true,
         currentDraft: { startTime: null, selectedTemplateId: '', fields: {} },
         initialDraftSnapshot: null,
+        autosave: {
+            pending: new Map(),
+            inFlight: false
+        },
         elements: {
             templateSelector: null,
             workoutSection: null,
@@ -101,6 +109,9 @@
             selectedTemplateId: draft.selectedTemplateId ? String(draft.selectedTemplateId) : '',
             fields: sanitizeFields(draft.fields)
         };
+        if (typeof draft.sessionTs === 'string' && SESSION_TIMESTAMP_PATTERN.test(draft.sessionTs)) {
+            sanitized.sessionTs = draft.sessionTs;
+        }
         return sanitized;
     }
 
@@ -531,6 +542,9 @@
         if (state.elements.templateSelector) {
             state.currentDraft.selectedTemplateId = state.elements.templateSelector.value || '';
         }
+        if (state.context.sessionTimestamp) {
+            state.currentDraft.sessionTs = state.context.sessionTimestamp;
+        }
         ensureStartTime(state.currentDraft);
         persistDraft(state.currentDraft);
     }
@@ -539,6 +553,109 @@
         saveDraftFromInputs();
     }
 
+    function getCsrfToken() {
+        const { workoutForm } = state.elements;
+        const tokenInput = workoutForm ? workoutForm.querySelector('input[name="csrf_token"]') : null;
+        return tokenInput ? tokenInput.value : '';
+    }
+
+    function getAutosaveUrl() {
+        if (!state.context.autosaveUrl || !state.context.sessionTimestamp) {
+            return '';
+        }
+        return state.context.autosaveUrl.replace('SESSION_TS', state.context.sessionTimestamp);
+    }
+
+    function fieldValue(name) {
+        const { workoutSection } = state.elements;
+        const input = workoutSection ? workoutSection.querySelector(`[name="${name}"]`) : null;
+        return input ? input.value : '';
+    }
+
+    function buildAutosavePayload(fieldName) {
+        const match = AUTOSAVE_FIELD_PATTERN.exec(fieldName);
+        if (!match) {
+            return null;
+        }
+        if (match[4]) {
+            return {
+                key: fieldName,
+                body: { record_date: state.context.recordDate, exercise_id: Number(match[4]), comment: fieldValue(fieldName) }
+            };
+        }
+        const exerciseId = match[2];
+        const setNumber = match[3];
+        return {
+            key: `set_${exerciseId}_${setNumber}`,
+            body: {
+                record_date: state.context.recordDate,
+                exercise_id: Number(exerciseId),
+                set_number: Number(setNumber),
+                reps: fieldValue(`reps_${exerciseId}_${setNumber}`),
+                weight: fieldValue(`weight_${exerciseId}_${setNumber}`)
+            }
+        };
+    }
+
+    // Each change is sent as one small PATCH; failed requests stay queued
+    // (one per set or comment, latest value wins) and are retried later.
+    async function flushAutosave() {
+        const url = getAutosaveUrl();
+        if (!url || state.autosave.inFlight || !window.fetch) {
+            return;
+        }
+        state.autosave.inFlight = true;
+        let completed = false;
+        try {
+            for (const [key, body] of Array.from(state.autosave.pending.entries())) {
+                const response = await window.fetch(url, {
+                    method: 'PATCH',
+                    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCsrfToken() },
+                    body: JSON.stringify(body)
+                });
+                if (response.status >= 500) {
+                    return;
+                }
+                if (response.status === 409) {
+                    // La sessione è già stata salvata: niente più bozze per questo timestamp.
+                    state.autosave.pending.clear();
+                    state.context.autosaveUrl = '';
+                    return;
+                }
+                if (state.autosave.pending.get(key) === body) {
+                    state.autosave.pending.delete(key);
+                }
+            }
+            completed = true;
+        } catch (error) {
+            console.warn('Salvataggio automatico non riuscito, nuovo tentativo più tardi', error);
+        } finally {
+            state.autosave.inFlight = false;
+        }
+        if (completed && state.autosave.pending.size) {
+            flushAutosave();
+        }
+    }
+
+    function handleAutosaveChange(event) {
+        const payload = event.target && event.target.name ? buildAutosavePayload(event.target.name) : null;
+        if (!payload || !getAutosaveUrl()) {
+            return;
+        }
+        state.autosave.pending.set(payload.key, payload.body);
+        flushAutosave();
+    }
+
+    function discardServerDraft() {
+        const url = getAutosaveUrl();
+        state.autosave.pending.clear();
+        if (!url || !window.fetch) {
+            return;
+        }
+        window.fetch(url, { method: 'DELETE', headers: { 'X-CSRFToken': getCsrfToken() } })
+            .catch((error) => console.warn('Impossibile eliminare la bozza sul server', error));
+    }
+
     function attachInputListeners() {
         const { workoutSection } = state.elements;
         if (!workoutSection) {
@@ -548,6 +665,7 @@
         inputs.forEach((input) => {
             input.addEventListener('input', handleInputChange);
             input.addEventListener('change', handleInputChange);
+            input.addEventListener('change', handleAutosaveChange);
         });
     }
 
@@ -765,6 +883,11 @@
 
     function handleTemplateChange(event) {
         const templateId = event.target.value || '';
+        const previousTemplateId = state.currentDraft.selectedTemplateId || '';
+        if (previousTemplateId && previousTemplateId !== templateId) {
+            // Switching workout starts over, as for the local draft.
+            discardServerDraft();
+        }
         if (templateId) {
             const matchedTemplate = state.context.templates.find((tpl) => String(tpl.id) === String(templateId));
             state.context.sessionTemplateName = matchedTemplate ? matchedTemplate.name : 'Allenamento Libero';
@@ -774,7 +897,8 @@
         const newDraft = {
             startTime: Date.now(),
             selectedTemplateId: templateId,
-            fields: {}
+            fields: {},
+            sessionTs: state.context.sessionTimestamp
         };
         persistDraft(newDraft);
         if (state.elements.startTimestampInput) {
@@ -801,6 +925,7 @@
     }
 
     function resetToEmptyDraft() {
+        discardServerDraft();
         clearDraftStorage();
         state.currentDraft = createEmptyDraft();
         state.initialDraftSnapshot = deepClone(state.currentDraft);
@@ -874,6 +999,7 @@
             : '';
 
         if (!hasActiveTemplate) {
+            discardServerDraft();
             clearDraftStorage();
             state.currentDraft = createEmptyDraft();
             resetStopwatch();
@@ -921,6 +1047,7 @@
             stopBtn.addEventListener('click', resetStopwatch);
         }
         document.addEventListener('visibilitychange', handleVisibilityChange);
+        window.addEventListener('online', flushAutosave);
     }
 
     function initialize() {
@@ -951,6 +1078,7 @@
         }
         state.context.initialDurationMinutes = state.context.durationMinutes;
         state.context.cancelUrl = dataElement.dataset.cancelUrl || '';
+        state.context.autosaveUrl = dataElement.dataset.autosaveUrl || '';
 
         state.draftKey = state.context.userId && state.context.recordDate
             ? `workout_draft_${state.context.userId}_${state.context.recordDate}`
@@ -960,6 +1088,20 @@
         state.storageAvailable = isLocalStorageAvailable();
 
         state.currentDraft = sanitizeDraft(loadDraftFromStorage());
+        if (!state.context.isEditing) {
+            // A draft restored by the server wins; otherwise keep autosaving
+            // under the timestamp this device already used.
+            const serverTimestamp = dataElement.dataset.sessionTimestamp || '';
+            const restored = dataElement.dataset.draftRestored === '1';
+            state.context.sessionTimestamp = !restored && state.currentDraft.sessionTs
+                ? state.currentDraft.sessionTs
+                : serverTimestamp;
+            state.currentDraft.sessionTs = state.context.sessionTimestamp;
+            const draftSessionInput = document.getElementById('draft-session-input');
+            if (draftSessionInput) {
+                draftSessionInput.value = state.context.sessionTimestamp;
+            }
+        }
         if (state.context.isEditing) {
             state.currentDraft.fields = {};
             state.currentDraft.selectedTemplateId = state.context.selectedTemplateId
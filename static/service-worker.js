@@ -127,8 +127,20 @@ self.addEventListener('fetch', (event) => {
     return;
   }
 
+  // Frammenti HTML delle liste paginate: sempre dalla rete, la cache serve solo offline.
+  if (request.headers.has('X-Logbook-Fragment')) {
+    event.respondWith(networkFirst(request));
+    return;
+  }
+
   const requestUrl = new URL(request.url);
 
+  // Serie di progressione: cambiano a ogni allenamento salvato.
+  if (requestUrl.origin === self.location.origin && requestUrl.pathname.startsWith('/api/exercises/')) {
+    event.respondWith(networkFirst(request));
+    return;
+  }
+
   if (requestUrl.origin === self.location.origin && requestUrl.pathname.startsWith('/static/js/sessione_palestra')) {
     event.respondWith(networkFirst(request));
     return;
@@ -0,0 +1,51 @@
+from datetime import date
+
+from services import adherence_service
+
+TARGETS = {'p_on': 2.0, 'c_on': 4.0, 'f_on': 1.0, 'p_off': 2.0, 'c_off': 2.0, 'f_off': 1.0}
+
+
+def test_weight_is_forward_filled_and_day_types_select_targets():
+    report = adherence_service.compute_adherence(
+        [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)],
+        [160, 160, 160],
+        [320, 160, 100],
+        [80, 80, 80],
+        [80, None, None],
+        [None, 'OFF', 'ON'],
+        TARGETS,
+    )
+
+    assert report['days_evaluated'] == 3
+    assert [day['target']['carbs'] for day in report['series']] == [320.0, 160.0, 320.0]
+    assert [day['adherent'] for day in report['series']] == [True, True, False]
+    assert report['longest_streak'] == 2
+    assert report['current_streak'] == 0
+    assert report['rolling']['7'] == round(2 / 3, 3)
+
+
+def test_days_before_first_weight_and_unlogged_gaps_are_not_evaluated():
+    report = adherence_service.compute_adherence(
+        [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5)],
+        [160, 160, 160],
+        [320, 320, 320],
+        [80, 80, 80],
+        [None, 80, None],
+        ['ON', 'ON', 'ON'],
+        TARGETS,
+    )
+
+    assert report['days_tracked'] == 5
+    assert report['days_evaluated'] == 2
+    assert report['adherence_rate'] == 1.0
+    # The unlogged 3rd and 4th break the streak.
+    assert report['current_streak'] == 1
+    assert [day['date'] for day in report['series']] == ['2024-01-02', '2024-01-05']
+
+
+def test_history_without_logged_macros_yields_empty_report():
+    report = adherence_service.compute_adherence(
+        [date(2024, 1, 1)], [0], [None], [0], [80], ['ON'], TARGETS,
+    )
+
+    assert report == {'days_evaluated': 0}
@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from services.api_service import decode_cursor, encode_cursor, fetch_page
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(date(2024, 3, 9), 815)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (date(2024, 3, 9), 815)
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_fetch_page_builds_keyset_query(monkeypatch):
+    captured = {}
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        captured['query'] = query
+        captured['params'] = params
+        return [
+            {'id': 9, 'record_date': date(2024, 1, 3), 'amount': 250},
+            {'id': 7, 'record_date': date(2024, 1, 2), 'amount': 500},
+            {'id': 4, 'record_date': date(2024, 1, 2), 'amount': 1},
+        ]
+
+    monkeypatch.setattr('services.api_service.execute_query', fake_execute_query)
+
+    cursor = encode_cursor(date(2024, 1, 5), 12)
+    page = fetch_page('intake', 3, cursor=cursor, fields=['amount'], date_from=date(2024, 1, 1), limit=2)
+
+    assert captured['params']['uid'] == 3
+    assert captured['params']['limit'] == 3
+    assert captured['params']['cursor_date'] == date(2024, 1, 5)
+    assert '(il.record_date, il.id) < (:cursor_date, :cursor_id)' in captured['query']
+    assert 'il.record_date >= :date_from' in captured['query']
+    assert page['data'] == [
+        {'id': 9, 'record_date': '2024-01-03', 'amount': 250},
+        {'id': 7, 'record_date': '2024-01-02', 'amount': 500},
+    ]
+    assert decode_cursor(page['next_cursor']) == (date(2024, 1, 2), 7)
+
+
+def test_fetch_page_last_page_has_no_cursor(monkeypatch):
+    monkeypatch.setattr(
+        'services.api_service.execute_query',
+        lambda query, params, *, fetchall=False: [{'id': 1, 'record_date': date(2024, 1, 1)}],
+    )
+
+    page = fetch_page('cardio', 1, fields=['id'], ascending=True)
+
+    assert page['next_cursor'] is None
+
+
+def test_fetch_page_rejects_unknown_fields():
+    with pytest.raises(ValueError):
+        fetch_page('metrics', 1, fields=['password'])
+
+
+def test_fetch_page_rejects_unknown_resource():
+    with pytest.raises(ValueError):
+        fetch_page('users', 1)
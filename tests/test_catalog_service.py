@@ -0,0 +1,96 @@
+from importlib import import_module
+
+import pytest
+
+from services import catalog_service
+from utils import normalize_search_text
+
+
+def test_catalog_version_includes_user_and_scope_version(monkeypatch):
+    captured = {}
+
+    def fake_execute_query(query, params, *, fetchone=False):
+        captured['params'] = params
+        return {'global_version': 42, 'personal_version': 5}
+
+    monkeypatch.setattr(catalog_service, 'execute_query', fake_execute_query)
+
+    assert catalog_service.get_catalog_version('foods', 7) == '7.42.5'
+    assert captured['params'] == {'resource': 'foods', 'uid': 7}
+
+
+def test_search_normalization_matches_the_sql_function():
+    migration = import_module('migrations.versions.0013_add_catalog_search_columns')
+
+    def sql_normalize(value):
+        # lower(btrim(translate(value, ACCENTED, UNACCENTED)))
+        folded = value.translate(str.maketrans(migration.ACCENTED, migration.UNACCENTED))
+        return folded.strip(' ').lower()
+
+    samples = list(migration.ACCENTED) + ['  Caffè Latte ', 'PÂTÉ', 'Łosoś', 'Straße']
+    for value in samples:
+        assert normalize_search_text(value) == sql_normalize(value), value
+
+
+def test_unknown_catalog_resource_is_rejected():
+    with pytest.raises(ValueError):
+        catalog_service.get_catalog_version('users', 1)
+
+
+@pytest.fixture
+def fake_catalog_db(monkeypatch):
+    state = {'version': 1, 'loads': 0}
+
+    def fake_execute_query(query, params=None, *, fetchone=False, fetchall=False):
+        if 'FROM catalog_versions' in query:
+            return {'version': state['version']}
+        if 'user_id IS NULL' in query:
+            state['loads'] += 1
+            return [
+                {'id': 3, 'name': 'Riso', 'ref_weight': 100, 'protein': 7, 'carbs': 78, 'fat': 1, 'calories': 350},
+                {'id': 1, 'name': 'Caffè', 'ref_weight': 100, 'protein': 0, 'carbs': 0, 'fat': 0, 'calories': 2},
+            ]
+        return [{'id': 9, 'name': 'Pane di casa', 'user_id': params['uid'], 'ref_weight': 100,
+                 'protein': 9, 'carbs': 50, 'fat': 3, 'calories': 265}]
+
+    monkeypatch.setattr(catalog_service, 'execute_query', fake_execute_query)
+    catalog_service.invalidate_global_catalog()
+    yield state
+    catalog_service.invalidate_global_catalog()
+
+
+def test_global_catalog_is_loaded_once_in_name_order(fake_catalog_db):
+    first = catalog_service.get_global_catalog('foods')
+    second = catalog_service.get_global_catalog('foods')
+
+    assert first is second
+    assert fake_catalog_db['loads'] == 1
+    assert list(first.ids) == [1, 3]
+    assert first.row(0)['calories'] == 2.0
+
+
+def test_global_catalog_reloads_when_version_changes(fake_catalog_db):
+    catalog_service.get_global_catalog('foods')
+    fake_catalog_db['version'] = 2
+
+    catalog_service.get_global_catalog('foods', revalidate=True)
+
+    assert fake_catalog_db['loads'] == 2
+
+
+def test_list_catalog_merges_personal_items_by_name(fake_catalog_db):
+    rows = catalog_service.list_catalog('foods', 4)
+
+    assert [row['name'] for row in rows] == ['Caffè', 'Pane di casa', 'Riso']
+    assert rows[0]['user_id'] is None
+    assert rows[1]['user_id'] == 4
+
+
+def test_fetch_catalog_lists_global_items_first(fake_catalog_db):
+    items = catalog_service.fetch_catalog('foods', 4)
+
+    assert [(item['name'], item['is_global']) for item in items] == [
+        ('Caffè', True),
+        ('Riso', True),
+        ('Pane di casa', False),
+    ]
@@ -0,0 +1,72 @@
+import threading
+
+from flask import Flask
+
+from concurrency import ConcurrencyClass, concurrency_class, concurrency_snapshot, define_concurrency_class
+
+
+def test_acquire_rejects_when_limit_and_queue_are_full():
+    klass = ConcurrencyClass('test-full', limit=1, queue_size=0, queue_timeout=0)
+
+    assert klass.acquire() is True
+    assert klass.acquire() is False
+
+    klass.release()
+    assert klass.acquire() is True
+    snapshot = klass.snapshot()
+    assert snapshot['admitted'] == 2
+    assert snapshot['rejected'] == 1
+    assert snapshot['active'] == 1
+
+
+def test_queued_request_runs_once_a_slot_is_released():
+    klass = ConcurrencyClass('test-queue', limit=1, queue_size=1, queue_timeout=5)
+    assert klass.acquire() is True
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(klass.acquire()))
+    waiter.start()
+    while klass.snapshot()['waiting'] == 0:
+        pass
+
+    klass.release()
+    waiter.join(timeout=5)
+
+    assert results == [True]
+    assert klass.snapshot()['waiting'] == 0
+
+
+def test_queue_wait_times_out():
+    klass = ConcurrencyClass('test-timeout', limit=1, queue_size=1, queue_timeout=0.01)
+    assert klass.acquire() is True
+
+    assert klass.acquire() is False
+    assert klass.snapshot()['rejected'] == 1
+
+
+def test_decorator_sheds_load_with_retry_after():
+    app = Flask(__name__)
+    entered = threading.Event()
+    release = threading.Event()
+
+    define_concurrency_class('test-view', limit=1)
+
+    @app.route('/slow')
+    @concurrency_class('test-view', retry_after=7)
+    def slow():
+        entered.set()
+        release.wait(timeout=5)
+        return 'ok'
+
+    client = app.test_client()
+    first = threading.Thread(target=lambda: client.get('/slow'))
+    first.start()
+    entered.wait(timeout=5)
+
+    response = app.test_client().get('/slow')
+    release.set()
+    first.join(timeout=5)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+    assert concurrency_snapshot()['test-view']['active'] == 0
@@ -0,0 +1,90 @@
+import gzip
+import io
+
+import pytest
+
+from services import food_dump_service
+
+
+def test_open_dump_decompresses_by_extension(tmp_path):
+    path = tmp_path / 'foods.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as handle:
+        handle.write('{"product_name": "Riso"}\n')
+
+    with food_dump_service.open_dump(str(path)) as stream:
+        assert stream.readline() == '{"product_name": "Riso"}\n'
+    assert food_dump_service.dump_format(str(path)) == 'jsonl'
+    assert food_dump_service.dump_format('foods.tsv.xz') == 'csv'
+    with pytest.raises(ValueError):
+        food_dump_service.dump_format('foods.parquet')
+
+
+def test_map_dump_record_prefers_italian_name_and_nested_nutriments():
+    record = {
+        'product_name': 'Rice',
+        'product_name_it': 'Riso',
+        'nutriments': {'proteins_100g': 7, 'carbohydrates_100g': 78, 'fat_100g': 0.6},
+    }
+
+    assert food_dump_service.map_dump_record(record) == {
+        'name': 'Riso', 'ref_weight': 100, 'protein': 7, 'carbs': 78, 'fat': 0.6,
+    }
+    assert food_dump_service.map_dump_record({'product_name': 'Acqua', 'nutriments': {}}) is None
+
+
+def test_stage_rows_counts_invalid_and_implausible_records():
+    lines = [
+        '{"product_name": "Riso", "nutriments": {"proteins_100g": 7, "carbohydrates_100g": 78, "fat_100g": 1}}\n',
+        'not json\n',
+        '{"product_name": "Errore", "nutriments": {"proteins_100g": 90, "carbohydrates_100g": 90, "fat_100g": 0}}\n',
+        '\n',
+    ]
+
+    rows, invalid = food_dump_service.stage_rows('dump', 3, 61, lines, 'jsonl')
+
+    assert invalid == 2
+    assert rows == [('dump', 3, 61, 'Riso', 'riso', 100.0, 7.0, 78.0, 1.0, 7 * 4 + 78 * 4 + 9)]
+
+
+def test_stage_rows_numbers_records_after_blank_lines():
+    record = '{"product_name": "Riso", "nutriments": {"proteins_100g": 7, "carbohydrates_100g": 78, "fat_100g": 1}}\n'
+
+    rows, invalid = food_dump_service.stage_rows('dump', 0, 10, ['\n', '  \n', record], 'jsonl')
+
+    assert invalid == 0
+    assert rows[0][2] == 12
+
+
+def test_stage_rows_reads_flat_csv_columns():
+    header = ['product_name', 'proteins_100g', 'carbohydrates_100g', 'fat_100g']
+    rows, invalid = food_dump_service.stage_rows('dump', 0, 2, [['Mela', '0.3', '14', '0.2']], 'csv', header)
+
+    assert invalid == 0
+    assert rows[0][3:5] == ('Mela', 'mela')
+
+
+def test_csv_chunks_keep_quoted_multiline_fields_whole():
+    stream = io.StringIO(
+        'product_name,generic_name,proteins_100g,carbohydrates_100g,fat_100g\n'
+        'Mela,"frutto\nfresco",0.3,14,0.2\n'
+        'Pera,"frutto\n\nmaturo",0.4,15,0.1\n'
+        'Riso,,7,78,1\n'
+    )
+
+    header, records = food_dump_service.read_records(stream, 'csv')
+    chunks = list(food_dump_service.iter_chunks(records, 2, done=set()))
+
+    assert header[0] == 'product_name'
+    assert [len(chunk) for _, _, chunk in chunks] == [2, 1]
+    assert chunks[0][2][1][1] == 'frutto\n\nmaturo'
+    rows, invalid = food_dump_service.stage_rows('dump', 0, 2, chunks[0][2], 'csv', header)
+    assert invalid == 0
+    assert [row[3] for row in rows] == ['Mela', 'Pera']
+
+
+def test_iter_chunks_skips_completed_chunks():
+    lines = [f'{number}\n' for number in range(7)]
+
+    chunks = list(food_dump_service.iter_chunks(lines, 3, done={0}))
+
+    assert [(chunk_no, first_line, len(chunk)) for chunk_no, first_line, chunk in chunks] == [(1, 4, 3), (2, 7, 1)]
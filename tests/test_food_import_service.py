@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+from services import food_import_service
+
+
+def test_csv_records_accept_italian_headers_and_decimal_commas():
+    stream = io.StringIO('Nome,Proteine,Carboidrati,Grassi,Peso_riferimento\n"  Pane   integrale ",9,"48,5",3,\n')
+
+    records = list(food_import_service.iter_food_records(stream, 'csv'))
+    staged = food_import_service.normalize_food_record(records[0], 1)
+
+    assert staged == (1, 'Pane integrale', 'pane integrale', 100.0, 9.0, 48.5, 3.0, 9 * 4 + 48.5 * 4 + 3 * 9)
+
+
+def test_json_array_and_json_lines_are_streamed():
+    array = io.StringIO('[{"name": "Riso", "protein": 7, "carbs": 78, "fat": 1},\n {"name": "Caffè", "protein": 0, "carbs": 0, "fat": 0}]')
+    lines = io.StringIO('{"name": "Riso", "protein": 7, "carbs": 78, "fat": 1}\n{"name": "Mela", "protein": 0, "carbs": 14, "fat": 0}\n')
+    records = list(food_import_service._iter_json_records(array, chunk_size=8))
+
+    assert [record['name'] for record in records] == ['Riso', 'Caffè']
+    assert [record['name'] for record in food_import_service.iter_food_records(lines, 'json')] == ['Riso', 'Mela']
+
+
+def test_truncated_json_is_rejected():
+    with pytest.raises(ValueError):
+        list(food_import_service.iter_food_records(io.StringIO('[{"name": "Riso", '), 'json'))
+
+
+@pytest.mark.parametrize(
+    'record',
+    [
+        {'name': '', 'protein': 1, 'carbs': 1, 'fat': 1},
+        {'name': 'Riso', 'protein': 'molto', 'carbs': 1, 'fat': 1},
+        {'name': 'Riso', 'protein': -1, 'carbs': 1, 'fat': 1},
+        {'name': 'Riso', 'carbs': 1, 'fat': 1},
+        {'name': 'Riso', 'protein': 1, 'carbs': 1, 'fat': 1, 'ref_weight': 0},
+        ['Riso', 1, 1, 1],
+    ],
+)
+def test_invalid_records_are_rejected(record):
+    with pytest.raises(ValueError):
+        food_import_service.normalize_food_record(record, 1)
+
+
+def test_detect_format_from_extension():
+    assert food_import_service.detect_format('alimenti.CSV') == 'csv'
+    assert food_import_service.detect_format('alimenti.jsonl') == 'json'
+    with pytest.raises(ValueError):
+        food_import_service.detect_format('alimenti.xlsx')
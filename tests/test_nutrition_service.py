@@ -0,0 +1,156 @@
+from datetime import date
+
+import pytest
+
+from services import nutrition_service
+
+
+def test_parse_meal_items_returns_typed_pairs():
+    items = nutrition_service.parse_meal_items([
+        {'food_id': '3', 'weight': '120'},
+        {'food_id': 5, 'weight': 40.5},
+    ])
+
+    assert items == [(3, 120.0), (5, 40.5)]
+
+
+@pytest.mark.parametrize(
+    'raw_items',
+    [
+        [],
+        ['riso'],
+        [{'food_id': 'x', 'weight': 10}],
+        [{'food_id': 1, 'weight': 0}],
+        [{'food_id': 1, 'weight': 'NaN'}],
+        [{'food_id': 1, 'weight': float('inf')}],
+        [{'food_id': 1, 'weight': 10}] * (nutrition_service.MAX_BATCH_ITEMS + 1),
+    ],
+)
+def test_parse_meal_items_rejects_invalid_payloads(raw_items):
+    with pytest.raises(ValueError):
+        nutrition_service.parse_meal_items(raw_items)
+
+
+def test_rollup_period_start_uses_monday_and_first_of_month():
+    day = date(2024, 3, 14)  # Thursday
+
+    assert nutrition_service.rollup_period_start('week', day) == date(2024, 3, 11)
+    assert nutrition_service.rollup_period_start('month', day) == date(2024, 3, 1)
+
+
+def test_fetch_nutrition_rollups_defaults_to_recent_buckets(monkeypatch):
+    captured = {}
+
+    class FakeResult:
+        def mappings(self):
+            return self
+
+        def all(self):
+            return [{
+                'period_start': date(2024, 1, 1), 'total_protein': 300.0, 'total_carbs': 600.0,
+                'total_fat': 150.0, 'total_calories': 5000, 'logged_days': 2,
+            }]
+
+    def fake_execute(query, params):
+        captured.update(params)
+        return FakeResult()
+
+    monkeypatch.setattr(nutrition_service.db.session, 'execute', fake_execute)
+
+    buckets = nutrition_service.fetch_nutrition_rollups(1, 'month', date_to=date(2024, 3, 20))
+
+    assert captured['start'] == date(2023, 4, 1)
+    assert captured['end'] == date(2024, 3, 1)
+    assert buckets[0]['period_start'] == '2024-01-01'
+    assert buckets[0]['averages'] == {'protein': 150.0, 'carbs': 300.0, 'fat': 75.0, 'calories': 2500.0}
+
+
+def test_fetch_nutrition_rollups_rejects_inverted_range():
+    with pytest.raises(ValueError):
+        nutrition_service.fetch_nutrition_rollups(1, 'week', date(2024, 3, 20), date(2024, 3, 1))
+
+
+class _FakeRows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+def test_fetch_intake_summary_fills_missing_days(monkeypatch):
+    captured = {}
+
+    def fake_execute(query, params):
+        captured.update(params)
+        return _FakeRows([
+            {'record_date': date(2024, 5, 2), 'tracker_type': 'water', 'total': 1500.0},
+            {'record_date': date(2024, 5, 3), 'tracker_type': 'coffee', 'total': 2.0},
+        ])
+
+    monkeypatch.setattr(nutrition_service.db.session, 'execute', fake_execute)
+
+    summary = nutrition_service.fetch_intake_summary(1, ['water', 'coffee'], days='3', date_to=date(2024, 5, 3))
+
+    assert captured['start'] == date(2024, 5, 1)
+    assert summary['from'] == '2024-05-01'
+    assert [day['totals'] for day in summary['days']] == [
+        {'water': 0.0, 'coffee': 0.0},
+        {'water': 1500.0, 'coffee': 0.0},
+        {'water': 0.0, 'coffee': 2.0},
+    ]
+
+
+@pytest.mark.parametrize('days', ['abc', 0, nutrition_service.MAX_INTAKE_SUMMARY_DAYS + 1])
+def test_fetch_intake_summary_rejects_invalid_day_counts(days):
+    with pytest.raises(ValueError):
+        nutrition_service.fetch_intake_summary(1, ['water'], days=days)
+
+
+def test_fetch_diary_page_returns_cursor_only_when_more_rows(monkeypatch):
+    captured = {}
+    rows = [{'record_date': date(2024, 5, day), 'calories': 2000} for day in (9, 8, 7)]
+
+    def fake_execute(query, params):
+        captured['query'] = str(query)
+        captured.update(params)
+        return _FakeRows(rows[:params['limit']])
+
+    monkeypatch.setattr(nutrition_service.db.session, 'execute', fake_execute)
+
+    page, cursor = nutrition_service.fetch_diary_page(1, limit=2)
+    assert [row['record_date'].day for row in page] == [9, 8]
+    assert cursor == '2024-05-08'
+    assert 'record_date < :before' not in captured['query']
+
+    page, cursor = nutrition_service.fetch_diary_page(1, before=date(2024, 5, 10), limit=3)
+    assert len(page) == 3
+    assert cursor is None
+    assert 'record_date < :before' in captured['query']
+
+
+def test_copy_diet_day_runs_a_single_statement(monkeypatch):
+    calls = []
+
+    class FakeResult:
+        rowcount = 4
+
+    def fake_execute(query, params):
+        calls.append(params)
+        return FakeResult()
+
+    monkeypatch.setattr(nutrition_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(nutrition_service.db.session, 'commit', lambda: None)
+
+    copied = nutrition_service.copy_diet_day(1, '2024-03-13', '2024-03-14', (5, 8))
+
+    assert copied == 4
+    assert calls == [{'uid': 1, 'source': '2024-03-13', 'target': '2024-03-14', 'food_ids': [5, 8]}]
+
+
+def test_copy_diet_day_rejects_same_day():
+    with pytest.raises(ValueError):
+        nutrition_service.copy_diet_day(1, '2024-03-14', '2024-03-14')
@@ -0,0 +1,65 @@
+import pytest
+
+from services import recipe_service
+
+
+@pytest.mark.parametrize('raw, expected', [(None, None), ('', None), ('350', 350.0), ('412,5', 412.5)])
+def test_parse_cooked_weight(raw, expected):
+    assert recipe_service.parse_cooked_weight(raw) == expected
+
+
+@pytest.mark.parametrize('raw', ['abc', '0', '-10', 'nan', 'inf'])
+def test_parse_cooked_weight_rejects_invalid_values(raw):
+    with pytest.raises(ValueError):
+        recipe_service.parse_cooked_weight(raw)
+
+
+class _FakeResult:
+    def __init__(self, row=None):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+    def mappings(self):
+        return self
+
+    def one(self):
+        return self.row
+
+
+def test_update_recipe_returns_false_for_foreign_recipe(monkeypatch):
+    calls = []
+
+    def fake_execute(query, params=None):
+        calls.append(str(query))
+        return _FakeResult(None)
+
+    monkeypatch.setattr(recipe_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(recipe_service.db.session, 'rollback', lambda: None)
+
+    assert recipe_service.update_recipe(1, 42, [(3, 100.0)]) is False
+    assert len(calls) == 2 and 'pg_advisory_xact_lock' in calls[0]
+
+
+def test_update_recipe_rejects_cycles(monkeypatch):
+    rolled_back = []
+    queries = []
+
+    def fake_execute(query, params=None):
+        if 'pg_advisory_xact_lock' in str(query):
+            queries.append('lock')
+        if 'WITH RECURSIVE' in str(query):
+            queries.append('cycle')
+            return _FakeResult({'cycle': True})
+        if 'DELETE' in str(query) or 'INSERT' in str(query):
+            raise AssertionError('ingredients must not change when a cycle is detected')
+        return _FakeResult((42,))
+
+    monkeypatch.setattr(recipe_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(recipe_service.db.session, 'rollback', lambda: rolled_back.append(True))
+
+    with pytest.raises(ValueError):
+        recipe_service.update_recipe(1, 42, [(7, 100.0)])
+    assert rolled_back
+    assert queries.index('lock') < queries.index('cycle')
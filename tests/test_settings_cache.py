@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from services import privacy_service
+from services.settings_cache import CachedSetting
+
+
+def test_cached_setting_loads_once_until_invalidated():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return f'value-{len(calls)}', str(len(calls))
+
+    cache = CachedSetting(loader, ttl=60)
+
+    assert cache.get() == ('value-1', '1')
+    assert cache.get() == ('value-1', '1')
+    assert len(calls) == 1
+
+    cache.invalidate()
+    assert cache.get() == ('value-2', '2')
+
+
+def test_cached_setting_reloads_after_ttl():
+    calls = []
+    cache = CachedSetting(lambda: (calls.append(1) or 'x', ''), ttl=0)
+
+    cache.get()
+    cache.get()
+
+    assert len(calls) == 2
+
+
+def test_privacy_update_invalidates_cache_without_ddl(monkeypatch):
+    queries = []
+    stored = {'content': 'v1', 'updated_at': datetime(2024, 1, 1)}
+
+    def fake_execute_query(query, params=None, *, fetchone=False, commit=False):
+        queries.append(query)
+        if commit:
+            stored['content'] = params['content']
+            stored['updated_at'] = datetime(2024, 1, 2)
+            return None
+        return dict(stored)
+
+    monkeypatch.setattr(privacy_service, 'execute_query', fake_execute_query)
+    privacy_service._privacy_cache.invalidate()
+
+    assert privacy_service.get_privacy_text() == 'v1'
+    first_version = privacy_service.get_privacy_version()
+    privacy_service.update_privacy_text('v2')
+
+    assert privacy_service.get_privacy_text() == 'v2'
+    assert privacy_service.get_privacy_version() != first_version
+    assert len(queries) == 3
+    assert not any('CREATE TABLE' in query for query in queries)
+    privacy_service._privacy_cache.invalidate()
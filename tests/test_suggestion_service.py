@@ -1,6 +1,19 @@
+import threading
+
 import pytest
 
-from services.suggestion_service import get_catalog_suggestions, resolve_catalog_item
+from services.suggestion_service import (
+    get_catalog_suggestions,
+    invalidate_suggestion_cache,
+    resolve_catalog_item,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_suggestion_cache():
+    invalidate_suggestion_cache()
+    yield
+    invalidate_suggestion_cache()
 
 
 def test_get_catalog_suggestions_normalizes_input(monkeypatch):
@@ -39,7 +52,8 @@ def test_get_catalog_suggestions_with_custom_limit(monkeypatch):
 
     get_catalog_suggestions('foods', 5, 'mele', limit=10)
 
-    assert observed_limits == [10]
+    # The empty substring result triggers the fuzzy fallback with the same limit.
+    assert observed_limits == [10, 10]
 
 
 def test_get_catalog_suggestions_empty_term(monkeypatch):
@@ -112,3 +126,181 @@ def test_resolve_catalog_item_requires_exact_match(monkeypatch):
 
     assert result is None
     assert calls['suggestions'] == 0
+
+
+def test_get_catalog_suggestions_caches_identical_lookups(monkeypatch):
+    calls = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        calls.append(params['pattern'])
+        return [{'id': 3, 'name': 'Mela', 'is_global': True}]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    first = get_catalog_suggestions('foods', 2, 'Mela')
+    first[0]['name'] = 'mutated by caller'
+    second = get_catalog_suggestions('foods', 2, ' mela ')
+
+    assert calls == ['%mela%']
+    assert second == [{'id': 3, 'name': 'Mela', 'is_global': True}]
+
+
+def test_get_catalog_suggestions_filters_untruncated_prefix(monkeypatch):
+    calls = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        calls.append(params['pattern'])
+        return [
+            {'id': 1, 'name': 'Pane', 'is_global': True},
+            {'id': 2, 'name': 'Panna', 'is_global': True},
+        ]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 2, 'pan')
+    results = get_catalog_suggestions('foods', 2, 'pann')
+
+    assert calls == ['%pan%']
+    assert results == [{'id': 2, 'name': 'Panna', 'is_global': True}]
+
+
+def test_get_catalog_suggestions_queries_when_prefix_truncated(monkeypatch):
+    calls = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        calls.append(params['pattern'])
+        return [{'id': index, 'name': f'Pane {index}', 'is_global': True} for index in range(params['limit'])]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 2, 'pan')
+    get_catalog_suggestions('foods', 2, 'pane')
+
+    assert calls == ['%pan%', '%pane%']
+
+
+def test_get_catalog_suggestions_escapes_like_wildcards(monkeypatch):
+    captured = {}
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        captured['pattern'] = params['pattern']
+        return []
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 2, '100%_')
+
+    assert captured['pattern'] == '%100\\%\\_%'
+
+
+def test_get_catalog_suggestions_coalesces_concurrent_lookups(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        calls.append(params['pattern'])
+        started.set()
+        release.wait(timeout=5)
+        return [{'id': 4, 'name': 'Stacco', 'is_global': False}]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(get_catalog_suggestions('exercises', 9, 'stacco')))
+    leader.start()
+    assert started.wait(timeout=5)
+    follower = threading.Thread(target=lambda: results.append(get_catalog_suggestions('exercises', 9, 'stacco')))
+    follower.start()
+    release.set()
+    leader.join(timeout=5)
+    follower.join(timeout=5)
+
+    assert calls == ['%stacco%']
+    assert results == [[{'id': 4, 'name': 'Stacco', 'is_global': False}]] * 2
+
+
+def test_invalidate_suggestion_cache_for_user(monkeypatch):
+    calls = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        calls.append(params['uid'])
+        return [{'id': 6, 'name': 'Riso', 'is_global': True}]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 1, 'riso')
+    get_catalog_suggestions('foods', 2, 'riso')
+    invalidate_suggestion_cache('foods', 1)
+    get_catalog_suggestions('foods', 1, 'riso')
+    get_catalog_suggestions('foods', 2, 'riso')
+
+    assert calls == [1, 2, 1]
+
+
+def test_get_catalog_suggestions_ignores_accents(monkeypatch):
+    captured = {}
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        captured.update(params)
+        return [{'id': 2, 'name': 'Caffè', 'is_global': True}]
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 1, 'CAFFÈ')
+
+    assert captured['term'] == 'caffe'
+    assert captured['pattern'] == '%caffe%'
+    assert captured['prefix'] == 'caffe%'
+
+
+def test_get_catalog_suggestions_falls_back_to_fuzzy_match(monkeypatch):
+    queries = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        queries.append(query)
+        if 'name_search % :term' in query:
+            return [{'id': 8, 'name': 'Spaghetti', 'is_global': True}]
+        return []
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    results = get_catalog_suggestions('foods', 1, 'spagheti')
+    get_catalog_suggestions('foods', 1, 'spaghetix')
+
+    assert results == [{'id': 8, 'name': 'Spaghetti', 'is_global': True}]
+    # A fuzzy result is never reused to answer a longer term.
+    assert len(queries) == 4
+
+
+def test_derived_suggestions_rank_prefix_matches_first(monkeypatch):
+    monkeypatch.setattr(
+        'services.suggestion_service.execute_query',
+        lambda query, params, *, fetchall=False: [
+            {'id': 1, 'name': 'Crème di riso', 'is_global': True},
+            {'id': 2, 'name': 'Riso basmati', 'is_global': True},
+        ],
+    )
+
+    get_catalog_suggestions('foods', 1, 'ri')
+    results = get_catalog_suggestions('foods', 1, 'ris')
+
+    assert [row['id'] for row in results] == [2, 1]
+
+
+def test_derived_suggestions_without_matches_fall_back_to_fuzzy_search(monkeypatch):
+    queries = []
+
+    def fake_execute_query(query, params, *, fetchall=False):
+        queries.append(query)
+        if 'name_search % :term' in query or params['term'] == 'spag':
+            return [{'id': 3, 'name': 'Spaghetti', 'is_global': True}]
+        return []
+
+    monkeypatch.setattr('services.suggestion_service.execute_query', fake_execute_query)
+
+    get_catalog_suggestions('foods', 1, 'spag')
+    results = get_catalog_suggestions('foods', 1, 'spagheti')
+
+    assert [row['id'] for row in results] == [3]
+    assert 'name_search % :term' in queries[-1]
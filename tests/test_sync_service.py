@@ -0,0 +1,71 @@
+import pytest
+
+from services.sync_service import get_changes, parse_since
+
+
+@pytest.mark.parametrize('raw, expected', [(None, (0, 0)), ('', (0, 0)), ('0', (0, 0)), ('900_42', (900, 42)), ('42', None)])
+def test_parse_since(raw, expected):
+    assert parse_since(raw) == expected
+
+
+@pytest.mark.parametrize('raw', ['-1', 'abc', '900_x', '900_-1'])
+def test_parse_since_rejects_invalid(raw):
+    with pytest.raises(ValueError):
+        parse_since(raw)
+
+
+def test_get_changes_collapses_to_latest_state(monkeypatch):
+    def fake_execute_query(query, params=None, *, fetchone=False, fetchall=False):
+        if 'FROM sync_state' in query:
+            return {'tombstone_horizon_txid': 0, 'tombstone_horizon': 0}
+        if 'FROM sync_changes' in query:
+            assert 'txid_snapshot_xmin' in query
+            assert (params['since_txid'], params['since_version']) == (900, 10)
+            return [
+                {'txid': 900, 'version': 11, 'table_name': 'diet_log', 'row_id': 5, 'op': 'U'},
+                {'txid': 901, 'version': 15, 'table_name': 'diet_log', 'row_id': 6, 'op': 'U'},
+                {'txid': 901, 'version': 16, 'table_name': 'foods', 'row_id': 0, 'op': 'C'},
+                {'txid': 902, 'version': 12, 'table_name': 'diet_log', 'row_id': 5, 'op': 'D'},
+                {'txid': 903, 'version': 14, 'table_name': 'cardio_log', 'row_id': 2, 'op': 'U'},
+            ]
+        if 'FROM diet_log' in query:
+            assert params['ids'] == [6]
+            return [{'id': 6, 'weight': 120.0}]
+        if 'FROM cardio_log' in query:
+            # The row was deleted after the change was logged.
+            return []
+        raise AssertionError(f'Unexpected query: {query}')
+
+    monkeypatch.setattr('services.sync_service.execute_query', fake_execute_query)
+
+    result = get_changes(1, (900, 10), limit=10)
+
+    assert result['reset'] is False
+    assert result['upserts'] == {'diet_log': [{'id': 6, 'weight': 120.0}]}
+    assert result['deletions'] == {'diet_log': [5], 'cardio_log': [2]}
+    assert result['refresh'] == ['foods']
+    assert result['next_cursor'] == '903_14'
+    assert result['has_more'] is False
+
+
+def test_get_changes_requests_reset_behind_horizon(monkeypatch):
+    def fake_execute_query(query, params=None, *, fetchone=False, fetchall=False):
+        if 'FROM sync_state' in query:
+            return {'tombstone_horizon_txid': 950, 'tombstone_horizon': 500}
+        raise AssertionError('Changes must not be read behind the horizon')
+
+    monkeypatch.setattr('services.sync_service.execute_query', fake_execute_query)
+
+    result = get_changes(1, (940, 620))
+
+    assert result['reset'] is True
+    assert result['next_cursor'] == '0'
+
+
+def test_get_changes_resets_old_style_cursors(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('nothing should be read')
+
+    monkeypatch.setattr('services.sync_service.execute_query', fail)
+
+    assert get_changes(1, parse_since('120'))['reset'] is True
@@ -0,0 +1,363 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services import workout_service
+
+
+def test_parse_workout_form_keeps_valid_sets_and_comments():
+    form = {
+        'reps_3_1': '8', 'weight_3_1': '80.5',
+        'reps_3_2': '6', 'weight_3_2': 'IO',
+        'reps_3_3': '0', 'weight_3_3': '80',
+        'reps_4_1': '', 'weight_4_1': '20',
+        'reps_5_1': '10', 'weight_5_1': 'abc',
+        'reps_x_1': '5',
+        'comment_3': 'ultima serie lenta',
+        'comment_4': '',
+    }
+
+    sets, comments = workout_service.parse_workout_form(form)
+
+    assert sets == [(3, 1, 8, 80.5, False), (3, 2, 6, 0.0, True), (5, 1, 10, 0.0, False)]
+    assert comments == [(3, 'ultima serie lenta')]
+
+
+class _FakeResult:
+    def scalar(self):
+        return 7
+
+
+@pytest.mark.parametrize('set_count', [1, 40])
+def test_save_workout_session_uses_constant_statements(monkeypatch, set_count):
+    statements = []
+    committed = []
+
+    def fake_execute(query, params):
+        statements.append(params)
+        return _FakeResult()
+
+    monkeypatch.setattr(workout_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(workout_service.db.session, 'commit', lambda: committed.append(True))
+
+    sets = [(3, number, 5, 100.0, False) for number in range(1, set_count + 1)]
+    session_id = workout_service.save_workout_session(
+        1, '20240314180000', '2024-03-14', {'template_name': 'A'}, sets, [(3, 'ok')], replace=True,
+    )
+
+    assert session_id == 7
+    assert len(statements) == 6
+    assert statements[3]['set_numbers'] == list(range(1, set_count + 1))
+    assert statements[3]['sid'] == statements[4]['sid'] == 7
+    assert committed == [True]
+
+
+def test_save_workout_session_is_idempotent_for_saved_timestamps(monkeypatch):
+    statements = []
+    results = iter([None, 7, None])
+
+    def fake_execute(query, params):
+        statements.append(str(query))
+        return SimpleNamespace(scalar=lambda: next(results))
+
+    monkeypatch.setattr(workout_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(workout_service.db.session, 'commit', lambda: None)
+
+    session_id = workout_service.save_workout_session(
+        1, '20240314180000', '2024-03-14', {}, [(3, 1, 5, 100.0, False)], [],
+    )
+
+    assert session_id == 7
+    assert 'pg_advisory_xact_lock' in statements[0]
+    assert 'DO NOTHING' in statements[1]
+    assert not any('INSERT INTO workout_log' in query for query in statements)
+
+
+@pytest.mark.parametrize('timestamp, started', [
+    ('20240314180000', datetime(2024, 3, 14, 18, 0)),
+    ('1710439200', None),
+    ('20241399000000', None),
+])
+def test_save_workout_session_accepts_legacy_timestamps(monkeypatch, timestamp, started):
+    statements = []
+
+    def fake_execute(query, params):
+        statements.append(params)
+        return _FakeResult()
+
+    monkeypatch.setattr(workout_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(workout_service.db.session, 'commit', lambda: None)
+
+    workout_service.save_workout_session(
+        1, timestamp, '2024-03-14', {}, [(3, 1, 5, 100.0, False)], [], replace=True,
+    )
+
+    assert statements[1]['started'] == started
+
+
+def test_save_workout_session_skips_empty_batches(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('nothing should be written')
+
+    monkeypatch.setattr(workout_service.db.session, 'execute', fail)
+
+    assert workout_service.save_workout_session(1, 'ts', '2024-03-14', {}, [], []) is None
+
+
+def _capture_statements(monkeypatch, rowcount=1):
+    statements = []
+
+    def fake_execute(query, params):
+        statements.append((str(query), params))
+        return SimpleNamespace(rowcount=rowcount)
+
+    monkeypatch.setattr(workout_service.db.session, 'execute', fake_execute)
+    monkeypatch.setattr(workout_service.db.session, 'commit', lambda: None)
+    return statements
+
+
+def test_autosave_draft_upserts_a_single_set(monkeypatch):
+    statements = _capture_statements(monkeypatch)
+
+    saved = workout_service.autosave_draft(
+        1, '20240314180000', '2024-03-14', {'exercise_id': '3', 'set_number': 2, 'reps': '8', 'weight': 'io'},
+    )
+
+    assert saved is True
+    assert len(statements) == 2
+    assert 'pg_advisory_xact_lock' in statements[0][0]
+    query, params = statements[1]
+    assert 'INSERT INTO workout_draft_sets' in query
+    assert params == {
+        'uid': 1, 'ts': '20240314180000', 'rd': '2024-03-14', 'eid': 3, 'set': 2, 'reps': '8', 'weight': 'io',
+    }
+
+
+def test_autosave_draft_skips_sessions_already_saved(monkeypatch):
+    statements = _capture_statements(monkeypatch, rowcount=0)
+
+    saved = workout_service.autosave_draft(1, '20240314180000', '2024-03-14', {'exercise_id': 3, 'comment': 'ok'})
+
+    assert saved is False
+    assert 'NOT EXISTS' in statements[1][0] and 'workout_sessions' in statements[1][0]
+
+
+def test_autosave_draft_deletes_cleared_values(monkeypatch):
+    statements = _capture_statements(monkeypatch)
+
+    workout_service.autosave_draft(1, '20240314180000', '2024-03-14', {'exercise_id': 3, 'comment': '  '})
+
+    assert statements[1][0].strip().startswith('DELETE FROM workout_draft_comments')
+
+
+@pytest.mark.parametrize('change', [{}, {'exercise_id': 3}, {'exercise_id': 3, 'set_number': 0, 'reps': '5'}])
+def test_autosave_draft_rejects_invalid_changes(change):
+    with pytest.raises(ValueError):
+        workout_service.autosave_draft(1, '20240314180000', '2024-03-14', change)
+
+
+def test_draft_rows_rebuild_the_session_form():
+    rows = [
+        {'exercise_id': 3, 'set_number': 1, 'reps': '8', 'weight': '80', 'comment': None},
+        {'exercise_id': 3, 'set_number': None, 'reps': None, 'weight': None, 'comment': 'ok'},
+    ]
+
+    sets, comments = workout_service.parse_workout_form(workout_service._draft_form(rows))
+
+    assert sets == [(3, 1, 8, 80.0, False)]
+    assert comments == [(3, 'ok')]
+
+
+def test_get_exercise_records_reads_only_the_records_tables(monkeypatch):
+    queries = []
+
+    def fake_execute_query(query, params, fetchone=False, fetchall=False):
+        queries.append(query)
+        if fetchone:
+            return {'e1rm_epley': 120.0, 'best_volume': 2400.0}
+        return [{'reps': 1, 'weight': 110.0}, {'reps': 5, 'weight': 95.0}]
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    records = workout_service.get_exercise_records(1, 3)
+
+    assert records['summary']['e1rm_epley'] == 120.0
+    assert [row['reps'] for row in records['rep_records']] == [1, 5]
+    assert not any('workout_log' in query for query in queries)
+
+
+def test_parse_session_cursor():
+    assert workout_service.parse_session_cursor(None) is None
+    assert workout_service.parse_session_cursor('2024-03-14_20240314180000') == (date(2024, 3, 14), '20240314180000')
+    with pytest.raises(ValueError):
+        workout_service.parse_session_cursor('2024-03-14_abc')
+
+
+def test_fetch_exercise_sessions_page_groups_sets_and_returns_cursor(monkeypatch):
+    rows = [
+        {'record_date': date(2024, 3, 14), 'session_timestamp': '20240314180000', 'set_number': 1, 'reps': 5, 'weight': 100.0},
+        {'record_date': date(2024, 3, 14), 'session_timestamp': '20240314180000', 'set_number': 2, 'reps': 5, 'weight': 100.0},
+        {'record_date': date(2024, 3, 11), 'session_timestamp': '20240311180000', 'set_number': 1, 'reps': 5, 'weight': 97.5},
+    ]
+    captured = {}
+
+    def fake_execute_query(query, params, fetchall=False):
+        captured.update(params)
+        return rows
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    sessions, cursor = workout_service.fetch_exercise_sessions_page(1, 3, limit=1)
+
+    assert captured['limit'] == 2
+    assert len(sessions) == 1 and len(sessions[0]['sets']) == 2
+    assert cursor == '2024-03-14_20240314180000'
+
+
+def test_fetch_exercise_progression_rejects_unknown_bucket():
+    with pytest.raises(ValueError):
+        workout_service.fetch_exercise_progression(1, 3, bucket='year')
+
+
+def _diary_session(session_id, day, timestamp, template_name=None):
+    return {
+        'id': session_id, 'record_date': day, 'session_timestamp': timestamp,
+        'started_at': datetime.strptime(timestamp, '%Y%m%d%H%M%S'), 'duration_minutes': 60,
+        'template_name': template_name, 'session_note': None, 'session_rating': None,
+    }
+
+
+def test_fetch_gym_diary_page_ends_on_a_day_boundary(monkeypatch):
+    session_rows = [
+        _diary_session(12, date(2024, 3, 14), '20240314180000', 'Push'),
+        _diary_session(11, date(2024, 3, 12), '20240312190000', 'Pull'),
+        _diary_session(10, date(2024, 3, 12), '20240312070000'),
+    ]
+    set_rows = [
+        {'session_id': 12, 'exercise_name': 'Panca', 'set_number': 1, 'reps': 5, 'weight': 80.0},
+        {'session_id': 12, 'exercise_name': 'Panca', 'set_number': 2, 'reps': 5, 'weight': 80.0},
+    ]
+    calls = []
+
+    def fake_execute_query(query, params, fetchall=False):
+        calls.append(params)
+        return session_rows if len(calls) == 1 else set_rows
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    days, cursor = workout_service.fetch_gym_diary_page(1, limit=2)
+
+    assert calls[0]['limit'] == 3
+    assert calls[1]['session_ids'] == [12]
+    assert len(days) == 1 and days[0]['template_names'] == ['Push']
+    session_data = days[0]['sessions'][0]
+    assert session_data['time_formatted'] == '18:00'
+    assert len(session_data['exercises']['Panca']) == 2
+    assert cursor == '2024-03-14_20240314180000'
+
+
+def test_fetch_gym_diary_page_last_page_has_no_cursor(monkeypatch):
+    calls = []
+
+    def fake_execute_query(query, params, fetchall=False):
+        calls.append(params)
+        return [_diary_session(9, date(2024, 3, 11), '20240311180000')] if len(calls) == 1 else []
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    days, cursor = workout_service.fetch_gym_diary_page(1, before=(date(2024, 3, 12), '20240312070000'))
+
+    assert calls[0]['before_date'] == date(2024, 3, 12)
+    assert days[0]['template_names'] == ['Allenamento Libero']
+    assert cursor is None
+
+
+def _snapshot_session(day, timestamp, weight, comment=None):
+    return {
+        'session_timestamp': timestamp, 'record_date': day, 'comment': comment,
+        'sets': [{'set_number': 1, 'reps': 5, 'weight': weight}],
+    }
+
+
+def test_fetch_last_sessions_reads_the_snapshot(monkeypatch):
+    snapshot = [
+        _snapshot_session('2024-03-14', '20240314180000', 100),
+        _snapshot_session('2024-03-11', '20240311180000', 97.5, 'ultima serie lenta'),
+        _snapshot_session('2024-03-08', '20240308180000', 95),
+    ]
+    queries = []
+
+    def fake_execute_query(query, params, fetchall=False):
+        queries.append(query)
+        return [{'exercise_id': 3, 'sessions': snapshot, 'complete': False}]
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    history, comments = workout_service._fetch_last_sessions(1, {3}, date(2024, 3, 14))
+
+    assert len(queries) == 1 and 'exercise_last_sessions' in queries[0]
+    assert [row['session_timestamp'] for row in history[3]] == ['20240311180000', '20240308180000']
+    assert history[3][0]['weight'] == 97.5
+    assert comments[3] == {'comment': 'ultima serie lenta', 'record_date': date(2024, 3, 11)}
+
+
+def test_fetch_last_sessions_mixes_snapshot_and_window_queries(monkeypatch):
+    snapshot = [
+        _snapshot_session('2024-03-11', '20240311180000', 97.5),
+        _snapshot_session('2024-03-08', '20240308180000', 95),
+    ]
+    older = [
+        {'exercise_id': 4, 'session_timestamp': '20240301180000', 'record_date': date(2024, 3, 1),
+         'set_number': number, 'reps': 5, 'weight': 60.0}
+        for number in (1, 2, 3)
+    ]
+    window_queries = []
+
+    def fake_execute_query(query, params, fetchall=False):
+        if 'exercise_last_sessions' in query:
+            return [
+                {'exercise_id': 3, 'sessions': snapshot, 'complete': False},
+                {'exercise_id': 4, 'sessions': [], 'complete': False},
+            ]
+        window_queries.append(query)
+        assert params['exercise_ids'] == [4]
+        if 'workout_session_comments' in query:
+            return [{'exercise_id': 4, 'comment': 'presa larga', 'record_date': date(2024, 3, 1), 'id': 9}]
+        return older
+
+    monkeypatch.setattr(workout_service, 'execute_query', fake_execute_query)
+
+    history, comments = workout_service._fetch_last_sessions(1, {3, 4}, date(2024, 3, 14))
+
+    assert [row['weight'] for row in history[3]] == [97.5, 95.0]
+    assert history[4] == older
+    assert comments[4]['comment'] == 'presa larga'
+    assert len(window_queries) == 2
+    for query in window_queries:
+        # Sessions are made distinct before they are ranked, so the window
+        # counts sessions rather than their set rows.
+        assert query.index('ROW_NUMBER()') < query.index('SELECT DISTINCT')
+
+
+def test_fetch_last_sessions_falls_back_for_backdated_pages(monkeypatch):
+    snapshot = [_snapshot_session('2024-03-14', '20240314180000', 100)]
+    fallback = {}
+
+    monkeypatch.setattr(
+        workout_service, 'execute_query',
+        lambda query, params, fetchall=False: [{'exercise_id': 3, 'sessions': snapshot, 'complete': False}],
+    )
+    monkeypatch.setattr(
+        workout_service, '_fetch_recent_sessions',
+        lambda user_id, ids, before: fallback.setdefault('sessions', ids) and {3: ['older']},
+    )
+    monkeypatch.setattr(
+        workout_service, '_fetch_recent_comments',
+        lambda user_id, ids, before: fallback.setdefault('comments', ids) and {},
+    )
+
+    history, comments = workout_service._fetch_last_sessions(1, {3}, date(2024, 3, 10))
+
+    assert fallback == {'sessions': [3], 'comments': [3]}
+    assert history[3] == ['older'] and comments == {}
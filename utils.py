@@ -43,4 +43,30 @@ def is_valid_time_format(time_str):
         datetime.strptime(time_str, '%H:%M')
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+
+# Lettere Latin-1 e Latin Extended-A ricondotte alla lettera base: è la stessa
+# tabella di ``translate()`` in ``logbook_search_normalize`` (migrazione 0013).
+SEARCH_ACCENTED = (
+    "ÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝàáâãäåçèéêëìíîïñòóôõöùúûüýÿĀāĂăĄąĆćĈĉĊċČčĎď"
+    "ĒēĔĕĖėĘęĚěĜĝĞğĠġĢģĤĥĨĩĪīĬĭĮįİĴĵĶķĹĺĻļĽľŃńŅņŇňŌōŎŏŐőŔŕŖŗŘřŚśŜŝŞşŠšŢţŤť"
+    "ŨũŪūŬŭŮůŰűŲųŴŵŶŷŸŹźŻżŽž"
+)
+SEARCH_UNACCENTED = (
+    "AAAAAACEEEEIIIINOOOOOUUUUYaaaaaaceeeeiiiinooooouuuuyyAaAaAaCcCcCcCcDd"
+    "EeEeEeEeEeGgGgGgGgHhIiIiIiIiIJjKkLlLlLlNnNnNnOoOoOoRrRrRrSsSsSsSsTtTt"
+    "UuUuUuUuUuUuWwYyYZzZzZz"
+)
+_SEARCH_FOLD = str.maketrans(SEARCH_ACCENTED, SEARCH_UNACCENTED)
+
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Normalizza un testo per la ricerca: senza accenti, minuscolo, senza spazi esterni.
+
+    Replica ``lower(btrim(translate(...)))`` di ``logbook_search_normalize``
+    (migrazione 0013), così i termini cercati coincidono con ``name_search``.
+    """
+    if not value:
+        return ''
+    return str(value).translate(_SEARCH_FOLD).strip(' ').lower()